@@ -1,25 +1,174 @@
 #!/usr/bin/env python3
+# Cue ID stub: bulk cue / animation ids for oscillaScore
+#
+# Applies an id template to every selected element (or inserts a tagged
+# rectangle when nothing is selected).  The template may number elements:
+#
+#   cuePause(N)            → cuePause(1), cuePause(2) ...
+#   o2p(path-N)_osc(1)     → o2p(path-1)_osc(1) ...
+#   rehearsal_{N}          → {N} also works where N would touch other letters
+#
+# N counts from --start in steps of --step, optionally zero padded, in
+# selection order, left to right (x) or top to bottom (y).
+#
+# Collisions are checked against every id in the document, collected in a
+# single pass over the tree before anything changes (no per-element lookups,
+# which is what makes large selections slow in inkex).  On a collision:
+#   next    numbered templates move on to the next free N; fixed templates
+#           get an Inkscape-style -2, -3 ... suffix, which the player ignores
+#   skip    leave that element's id as it was
+#   error   change nothing and report the clashing ids
+
+import re
+
 import inkex
 from lxml import etree
 
-class InsertCueIDStub(inkex.Effect):
+PLACEHOLDER_RE = re.compile(r'\{N\}|(?<![A-Za-z0-9])N(?![A-Za-z0-9])')
+PRESETS = {
+    'custom': None,
+    'pause': 'cuePause(N)',
+    'osc': 'cueOscTrigger(N)',
+    'audio': 'cueAudio(name.wav)',
+    'o2p': 'o2p(path-N)_osc(1)',
+    'rehearsal': 'rehearsal_{N}',
+}
+
+
+class InsertCueIDStub(inkex.EffectExtension):
     def add_arguments(self, pars):
-        pars.add_argument("--id_stub", type=str, help="Cue ID Stub")
+        pars.add_argument("--id_stub", type=str, default="cuePause(N)", help="Id template; N is the counter")
+        pars.add_argument("--preset", type=str, default="custom", help="Template preset (custom uses --id_stub)")
+        pars.add_argument("--attribute", type=str, default="id", help="id or data-id")
+        pars.add_argument("--start", type=int, default=1)
+        pars.add_argument("--step", type=int, default=1)
+        pars.add_argument("--pad", type=int, default=0, help="Zero-pad N to this many digits")
+        pars.add_argument("--order", type=str, default="selection", help="selection | x | y")
+        pars.add_argument("--on_collision", type=str, default="next", help="next | skip | error")
+
+    def template(self):
+        template = PRESETS.get(self.options.preset) or self.options.id_stub
+        return template.strip()
+
+    def format_id(self, template, n):
+        number = str(n).zfill(self.options.pad) if n >= 0 else str(n)
+        return PLACEHOLDER_RE.sub(number, template)
+
+    def ordered_selection(self):
+        elements = list(self.svg.selection.values())
+        if self.options.order in ('x', 'y'):
+            # Boxes in document coordinates: include the layers' and groups'
+            # transforms, composed once per parent
+            parent_transforms = {}
+
+            def position(element):
+                parent = element.getparent()
+                transform = parent_transforms.get(id(parent))
+                if transform is None:
+                    transform = parent_transforms[id(parent)] = parent.composed_transform()
+                box = element.bounding_box(transform)
+                if box is None:
+                    return (0, 0)
+                return (box.left, box.top) if self.options.order == 'x' else (box.top, box.left)
+            elements.sort(key=position)
+        return elements
 
     def effect(self):
-        stub = self.options.id_stub
+        template = self.template()
+        if not template:
+            raise inkex.AbortExtension("The id template is empty.")
+        attribute = self.options.attribute
 
-        if self.svg.selected:
-            for elem in self.svg.selection:
-                elem.set("id", stub)
-        else:
+        if not self.svg.selection:
             new = etree.SubElement(self.svg.get_current_layer(), inkex.addNS('rect', 'svg'))
             new.set("x", "100")
             new.set("y", "100")
             new.set("width", "150")
             new.set("height", "50")
             new.set("style", "fill:#cccccc;stroke:#000000;stroke-width:1")
-            new.set("id", stub)
+            taken = {node.get(attribute) for node in self.document.getroot().iter() if node.get(attribute)}
+            new_id, _, clashed = self.free_id(template, self.options.start, taken)
+            if clashed and self.options.on_collision != 'next':
+                raise inkex.AbortExtension(f"{new_id} already exists in the document.")
+            new.set(attribute, new_id)
+            return
+
+        elements = self.ordered_selection()
+        # One pass over the whole tree; the selection's own ids are about to be replaced
+        selected = {id(element) for element in elements}
+        taken = set()
+        for node in self.document.getroot().iter():
+            value = node.get(attribute)
+            if value and id(node) not in selected:
+                taken.add(value)
+
+        # A skipped element keeps its old id, which then blocks that id for the
+        # rest of the selection too; repeat until no further element is skipped
+        skipped = set()
+        while True:
+            blocked = taken | {element.get(attribute) for element in elements
+                               if id(element) in skipped and element.get(attribute)}
+            assignments, clashes, now_skipped = self.assign(template, elements, blocked, skipped)
+            if now_skipped <= skipped:
+                break
+            skipped |= now_skipped
+
+        if clashes and self.options.on_collision == 'error':
+            shown = ', '.join(clashes[:10]) + (' ...' if len(clashes) > 10 else '')
+            raise inkex.AbortExtension(f"{len(clashes)} ids already exist in the document: {shown}")
+
+        for element, new_id in assignments:
+            element.set(attribute, new_id)
+        message = f"Set {attribute} on {len(assignments)} of {len(elements)} elements"
+        if clashes:
+            action = 'skipped' if self.options.on_collision == 'skip' else 'renumbered'
+            message += f"; {len(clashes)} {action} to avoid duplicate ids"
+        self.msg(message + ".")
+
+    def assign(self, template, elements, taken, skip=()):
+        """
+        One numbering pass: ([(element, new id)], clashing ids, skipped elements).
+        Elements in `skip` (by id()) keep their ids but still use up their N.
+        """
+        taken = set(taken)
+        assignments = []
+        clashes = []
+        skipped = set()
+        n = self.options.start
+        for element in elements:
+            new_id, used_n, clashed = self.free_id(template, n, taken)
+            if id(element) in skip:
+                clashed = True
+            if clashed:
+                clashes.append(self.format_id(template, n))
+                if self.options.on_collision == 'skip':
+                    skipped.add(id(element))
+                    n += self.options.step
+                    continue
+            taken.add(new_id)
+            assignments.append((element, new_id))
+            n = used_n + self.options.step
+        return assignments, clashes, skipped
+
+    def free_id(self, template, n, taken):
+        """(id, N used, clashed) for the first free id at or after counter n."""
+        numbered = PLACEHOLDER_RE.search(template) is not None
+        candidate = self.format_id(template, n)
+        if candidate not in taken:
+            return candidate, n, False
+        if self.options.on_collision != 'next':
+            return candidate, n, True
+        if numbered:
+            step = self.options.step or 1
+            while candidate in taken:
+                n += step
+                candidate = self.format_id(template, n)
+            return candidate, n, True
+        suffix = 2
+        while f"{candidate}-{suffix}" in taken:
+            suffix += 1
+        return f"{candidate}-{suffix}", n, True
+
 
 if __name__ == '__main__':
     InsertCueIDStub().run()
@@ -0,0 +1,307 @@
+# Batch Score Generation
+#
+# Builds many noteheads.py parameter sets in one Python process (abjad is
+# imported once) and compiles the resulting .ly files on a bounded pool of
+# LilyPond workers.  Each job is isolated: a failing build or compile is
+# recorded in the report and the remaining jobs carry on.
+#
+# Usage:
+# python batch.py <manifest.json> [--workers N] [--output-dir DIR] [--timeout SECONDS]
+#                 [--cache-dir DIR] [--cache-size MB]
+#
+# Manifest format (a list of jobs, or an object with "jobs" and defaults):
+#
+#   {
+#     "output_dir": "o/batch",
+#     "formats": ["pdf"],
+#     "jobs": [
+#       {"name": "a", "row_length": 12, "noteheads": "random=[diamond,cross]",
+#        "duration": "fixed", "row_mode": "random", "seed": 7,
+#        "duration_mode": "[fixed=[8]x2,random=[rest=(1,4),16]x3]",
+#        "notehead_mode": "[fixed=[cross]x2,random=[diamond]x5]",
+#        "articulation_mode": "[rotate=[staccato,accent]x2]",
+#        "output": "rotations=both"},
+#       ...
+#     ]
+#   }
+#
+# Job keys mirror the noteheads.py options; "engine": "abjad" builds the
+# score through abjad instead of writing it from note plans (noteplan.py).
+# "formats" may list pdf, svg, png and/or fragment (default pdf); "ly" alone
+# skips LilyPond entirely.
+# "fragment" writes <name>.fragment.svg, a plain SVG with note-* ids ready
+# for oscillaScore scores (see svg_export.py).
+# Multi-page svg and png scores are written one file per page by LilyPond
+# (<name>-1.svg, <name>-page1.png ...); the report lists those files.
+#
+# With a cache directory (--cache-dir or "cache_dir" in the manifest),
+# jobs whose resolved .ly source was rendered before are copied from the
+# render cache instead of recompiled (see render_cache.py).
+#
+# A JSON report with per-job status, timings and outputs is written to
+# <output_dir>/batch_report.json.  The exit status is non-zero if any job
+# failed.
+
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from render_cache import DEFAULT_MAX_BYTES, RenderCache
+import svg_export
+
+LILYPOND = os.environ.get('LILYPOND', 'lilypond')
+
+JOB_DEFAULTS = {
+    'row_length': 12,
+    'noteheads': 'standard',
+    'duration': 'fixed',
+    'row_mode': 'random',
+    'articulation_mode': None,
+    'duration_mode': None,
+    'notehead_mode': None,
+    'output': 'rotations=pitches',
+    'seed': None,
+    'formats': ['pdf'],
+    'engine': 'text',
+}
+
+BACKEND_FLAGS = {
+    'pdf': ['--pdf'],
+    'svg': ['-dbackend=svg'],
+    'png': ['--png'],
+}
+# Multi-page scores get one file per page: <base>-1.svg, <base>-page1.png ...
+PAGE_INFIX = {
+    'svg': '-',
+    'png': '-page',
+}
+
+
+def load_manifest(path):
+    """Read a manifest and return (jobs, defaults) with defaults merged into each job."""
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+
+    defaults = dict(JOB_DEFAULTS)
+    defaults.update({k: v for k, v in manifest.items() if k != 'jobs'})
+
+    jobs = []
+    for index, entry in enumerate(manifest.get('jobs', [])):
+        job = dict(defaults)
+        job.update(entry)
+        job.setdefault('name', f"job{index:03d}")
+        if isinstance(job['formats'], str):
+            job['formats'] = [job['formats']]
+        jobs.append(job)
+    return jobs, defaults
+
+
+def parse_output_mode(output):
+    """'rotations=both' → 'both', 'serial' → 'serial'."""
+    if output.startswith('rotations='):
+        output = output.split('=', 1)[1]
+    if output not in ('pitches', 'percussion', 'both', 'serial'):
+        raise ValueError(f"Unknown output mode: {output}")
+    return output
+
+
+def build_job(job, output_dir):
+    """Build one score and write its .ly file. Returns the .ly path."""
+    import noteheads
+    import noteplan
+
+    row_length = int(job['row_length'])
+    row = noteheads.resolve_row(row_length, job['row_mode'], seed=job['seed'])
+    if row is None:
+        raise RuntimeError(f"No valid row of length {row_length}")
+
+    args = (row, row_length, noteheads.normalize_notehead_mode(job['noteheads']), job['duration'])
+    options = dict(
+        articulation_mode_string=job['articulation_mode'],
+        duration_mode_string=job['duration_mode'],
+        notehead_mode_string=job['notehead_mode'],
+        output_mode=parse_output_mode(job['output']),
+        seed=job['seed'],
+        note_ids='fragment' in job['formats'],
+    )
+
+    ly_path = os.path.join(output_dir, f"{job['name']}.ly")
+    if job['engine'] == 'abjad':
+        import abjad
+        abjad.persist.as_ly(noteheads.build_score(*args, **options), ly_path)
+    else:
+        noteplan.write_ly(noteplan.plan_score(*args, **options), ly_path)
+    return ly_path, row
+
+
+def output_path(output_base, fmt, page=None):
+    """Output file name; `page` gives LilyPond's per-page names (<base>-2.svg, <base>-page2.png)."""
+    if fmt == 'fragment':
+        return f"{output_base}.fragment.svg"
+    if page is not None:
+        return f"{output_base}{PAGE_INFIX[fmt]}{page}.{fmt}"
+    return f"{output_base}.{fmt}"
+
+
+def written_outputs(output_base, fmt, since=0.0):
+    """
+    The file(s) LilyPond wrote for `fmt`: the single output path, or for a
+    multi-page svg / png score the list of page files, in page order.  Files
+    older than `since` (left from an earlier compile) are ignored.
+    """
+    def fresh(path):
+        return os.path.exists(path) and os.path.getmtime(path) >= since
+
+    single = output_path(output_base, fmt)
+    if fresh(single) or fmt not in PAGE_INFIX:
+        return single
+    pattern = re.compile(rf"{re.escape(os.path.basename(output_base))}{re.escape(PAGE_INFIX[fmt])}(\d+)\.{fmt}$")
+    pages = []
+    for name in os.listdir(os.path.dirname(output_base) or '.'):
+        match = pattern.match(name)
+        path = os.path.join(os.path.dirname(output_base), name)
+        if match and fresh(path):
+            pages.append((int(match.group(1)), path))
+    if not pages:
+        raise RuntimeError(f"lilypond produced no {fmt} output for {output_base}")
+    return [path for _, path in sorted(pages)]
+
+
+def compile_ly(ly_path, formats, timeout=None):
+    """Run LilyPond once per requested backend. Returns {format: output path or [page paths]}."""
+    output_base = os.path.splitext(ly_path)[0]
+    outputs = {}
+    for fmt in formats:
+        if fmt == 'ly':
+            continue
+        if fmt == 'fragment':
+            outputs[fmt] = svg_export.render_fragment(ly_path, output_path(output_base, fmt), timeout=timeout)
+            continue
+        if fmt not in BACKEND_FLAGS:
+            raise ValueError(f"Unknown output format: {fmt}")
+        command = [LILYPOND, *BACKEND_FLAGS[fmt], f"--output={output_base}", ly_path]
+        started = time.time() - 1  # mtime resolution
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            tail = '\n'.join(result.stderr.strip().splitlines()[-5:])
+            raise RuntimeError(f"lilypond exited with {result.returncode}: {tail}")
+        outputs[fmt] = written_outputs(output_base, fmt, since=started)
+    return outputs
+
+
+def run_batch(jobs, output_dir, workers=None, timeout=None, cache=None):
+    """
+    Build every job serially and compile them concurrently.
+
+    Compilation starts as soon as a job's .ly file is written, so building
+    the next score overlaps with LilyPond work on the previous ones.
+    Jobs already present in `cache` (a RenderCache) are not recompiled.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    results = []
+    cache_lock = threading.Lock()
+
+    def compile_job(result, ly_path, formats, key):
+        started = time.perf_counter()
+        try:
+            result['outputs'] = compile_ly(ly_path, formats, timeout=timeout)
+            result['status'] = 'ok'
+            if cache is not None:
+                artifacts = dict(result['outputs'], ly=ly_path)
+                with cache_lock:
+                    cache.store(key, artifacts, meta={'name': result['name'], 'row': result['row']})
+        except Exception as e:
+            result['status'] = 'compile_failed'
+            result['error'] = str(e)
+        result['compile_seconds'] = round(time.perf_counter() - started, 3)
+        logging.info(f"[{result['name']}] {result['status']}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for job in jobs:
+            result = {'name': job['name'], 'params': job}
+            results.append(result)
+
+            started = time.perf_counter()
+            try:
+                ly_path, row = build_job(job, output_dir)
+            except Exception as e:
+                result['status'] = 'build_failed'
+                result['error'] = str(e)
+                logging.error(f"[{job['name']}] build failed: {e}")
+                continue
+            finally:
+                result['build_seconds'] = round(time.perf_counter() - started, 3)
+
+            result['row'] = row
+            result['ly'] = ly_path
+
+            key = None
+            if cache is not None:
+                key = cache.key_for_file(ly_path, engine=job['engine'])
+                result['cache_key'] = key
+                formats = [fmt for fmt in job['formats'] if fmt != 'ly']
+                with cache_lock:
+                    outputs = cache.materialize(key, formats, os.path.splitext(ly_path)[0], naming=output_path)
+                if outputs is not None:
+                    result['status'] = 'cached'
+                    result['outputs'] = outputs
+                    logging.info(f"[{job['name']}] cached")
+                    continue
+
+            pending.append(pool.submit(compile_job, result, ly_path, job['formats'], key))
+
+        for future in pending:
+            future.result()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many noteheads.py parameter sets in one run.")
+    parser.add_argument('manifest', help="JSON manifest of jobs")
+    parser.add_argument('--workers', type=int, default=None, help="Concurrent LilyPond processes (default: CPU count)")
+    parser.add_argument('--output-dir', default=None, help="Override the manifest output_dir")
+    parser.add_argument('--timeout', type=float, default=None, help="Per-compile LilyPond timeout in seconds")
+    parser.add_argument('--cache-dir', default=None, help="Render cache directory (reuse identical renders)")
+    parser.add_argument('--cache-size', type=float, default=None, help="Render cache size limit in MB")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    jobs, defaults = load_manifest(args.manifest)
+    output_dir = args.output_dir or defaults.get('output_dir', os.path.join('o', 'batch'))
+
+    cache = None
+    cache_dir = args.cache_dir or defaults.get('cache_dir')
+    if cache_dir:
+        max_bytes = int(args.cache_size * 1024 * 1024) if args.cache_size else DEFAULT_MAX_BYTES
+        cache = RenderCache(cache_dir, max_bytes=max_bytes)
+
+    started = time.perf_counter()
+    results = run_batch(jobs, output_dir, workers=args.workers, timeout=args.timeout, cache=cache)
+    elapsed = time.perf_counter() - started
+
+    report_path = os.path.join(output_dir, 'batch_report.json')
+    with open(report_path, 'w') as f:
+        json.dump({'seconds': round(elapsed, 3), 'jobs': results}, f, indent=2)
+
+    failed = [r for r in results if r['status'] not in ('ok', 'cached')]
+    print(f"{len(results) - len(failed)}/{len(results)} jobs ok in {elapsed:.1f}s — report: {report_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Beaming Group Enumeration
+#
+# A beam grouping of a row is a composition of `row_length` into
+# `group_count` parts, each part holding at least MIN_GROUP_SIZE notes.
+#
+# Subtracting (MIN_GROUP_SIZE - 1) from every part turns these into ordinary
+# compositions of n' = row_length - group_count * (MIN_GROUP_SIZE - 1) into
+# positive parts, which correspond one-to-one with choices of
+# (group_count - 1) split points out of (n' - 1).  That gives:
+#
+#   count     = C(n' - 1, group_count - 1)
+#   enumerate = itertools.combinations over the split points
+#   sample    = rng.sample of the split points (uniform, no enumeration)
+#
+# so long rotation sets (24-96 notes) are handled without building or
+# shuffling the full set of groupings.
+
+import itertools
+import math
+import random
+
+MIN_GROUP_SIZE = 2
+
+
+def _reduced_length(row_length, group_count, min_size):
+    return row_length - group_count * (min_size - 1)
+
+
+def _splits_to_groups(split_points, reduced_length, min_size):
+    bounds = (0,) + tuple(split_points) + (reduced_length,)
+    return tuple(bounds[i + 1] - bounds[i] + min_size - 1 for i in range(len(bounds) - 1))
+
+
+def count_beam_groupings(row_length, group_count, min_size=MIN_GROUP_SIZE):
+    """Number of groupings of `row_length` notes into `group_count` beams."""
+    if group_count < 1:
+        return 0
+    reduced = _reduced_length(row_length, group_count, min_size)
+    if reduced < group_count:
+        return 0
+    return math.comb(reduced - 1, group_count - 1)
+
+
+def iter_beam_groupings(row_length, min_groups=3, max_groups=3, min_size=MIN_GROUP_SIZE):
+    """Yield every valid grouping, ordered by group count then lexicographically."""
+    for group_count in range(min_groups, max_groups + 1):
+        if not count_beam_groupings(row_length, group_count, min_size):
+            continue
+        reduced = _reduced_length(row_length, group_count, min_size)
+        for split_points in itertools.combinations(range(1, reduced), group_count - 1):
+            yield _splits_to_groups(split_points, reduced, min_size)
+
+
+def sample_beam_grouping(row_length, min_groups=3, max_groups=3, min_size=MIN_GROUP_SIZE, rng=None):
+    """
+    Pick one grouping uniformly at random from all valid groupings.
+
+    The group count is drawn in proportion to how many groupings it allows,
+    then the split points are sampled directly.
+
+    Returns:
+        tuple[int] | None: Group sizes summing to `row_length`, or None if
+        no grouping satisfies the constraints.
+    """
+    rng = rng or random
+    counts = [
+        (group_count, count_beam_groupings(row_length, group_count, min_size))
+        for group_count in range(min_groups, max_groups + 1)
+    ]
+    total = sum(count for _, count in counts)
+    if not total:
+        return None
+
+    pick = rng.randrange(total)
+    for group_count, count in counts:
+        if pick < count:
+            break
+        pick -= count
+
+    reduced = _reduced_length(row_length, group_count, min_size)
+    split_points = sorted(rng.sample(range(1, reduced), group_count - 1))
+    return _splits_to_groups(split_points, reduced, min_size)
@@ -0,0 +1,428 @@
+# Score-Fragment Generation Benchmarks
+#
+# Times the noteheads.py pipeline stage by stage across a matrix of row
+# lengths and output modes, with fixed seeds, and stores the results as
+# JSON so runs from different commits can be compared.
+#
+# Benchmarks (each run covers every rotation of the row, as
+# add_rotation_staves does):
+#
+#   python path (no LilyPond)
+#     generate_row                   one row of the given length
+#     parse_{articulation,duration,notehead}_sequence
+#                                    pattern compile + one plan per rotation
+#     sample_beam_grouping           one grouping per rotation
+#     apply_dynamic_beaming          beaming every rotation staff   (abjad)
+#     create_abjad_notes             every rotation staff, per mode (abjad)
+#     add_rotation_staves            full staff build, per mode     (abjad)
+#     plan_score                     text engine: every staff plan, per mode
+#     plan_score_parallel            the same with rotations on every core
+#     format_score                   .ly source from the plans, per mode
+#     write_ly                       .ly file from the plans, per mode
+#   lilypond path (--lilypond)
+#     build_score + persist.as_ly + LilyPond PDF compile, per mode
+#     build_and_compile_text: plan_score + write_ly + LilyPond PDF compile
+#
+# The interval rules allow rows of at most 23 notes (rowgen.MAX_ROW_LENGTH),
+# so generate_row is skipped above that.  The other benchmarks use a tiled
+# row instead: consecutive seeded rows of up to 12 notes, concatenated.
+#
+# Benchmarks that need abjad (or the lilypond executable) are recorded as
+# "skipped" when it is not installed, so result files stay comparable.
+#
+# Each run reseeds `random` and clears the compile_pattern cache, so runs
+# are identical and pattern parsing is included every time.  Timings are
+# min / median / mean over --repeat runs.  Comparisons use the minimum (the
+# least noisy of the three) and ignore differences below --noise seconds.
+#
+# Usage:
+# python benchmark.py [--lengths 8 12 24 48 96] [--modes pitches percussion both]
+#                     [--repeat 5] [--seed 1] [--lilypond] [--lilypond-repeat 1]
+#                     [-o o/benchmarks.json] [--compare OLD.json] [--threshold 1.25]
+#                     [--noise 0.0005]
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from beaming import sample_beam_grouping
+from patterns import ARTICULATION, DURATION, NOTEHEAD, compile_pattern
+from rowgen import MAX_ROW_LENGTH, PITCH_CLASSES, generate_row
+
+DEFAULT_LENGTHS = [8, 12, 24, 48, 96]
+DEFAULT_MODES = ['pitches', 'percussion', 'both']
+DEFAULT_OUTPUT = os.path.join('o', 'benchmarks.json')
+
+PATTERNS = {
+    ARTICULATION: "[fixed=[staccato]x2,random=[accent,tenuto]x3,rotate=[fermata,accent]x2]",
+    DURATION: "[fixed=[8]x2,random=[rest=(1,4),16]x3,rotate=[rest,4]x2]",
+    NOTEHEAD: "[fixed=[cross]x2,random=[diamond]x5]",
+}
+NOTEHEAD_MODE = 'random=[diamond,cross]'
+DURATION_MODE = 'fixed'
+
+
+class Skip(Exception):
+    """Raised by a benchmark that cannot run in this environment."""
+
+
+def _import_abjad():
+    try:
+        import abjad
+        import noteheads
+    except ImportError as e:
+        raise Skip(f"abjad not available ({e})")
+    return abjad, noteheads
+
+
+def benchmark_row(length, seed):
+    """A row of `length` notes: generated directly when possible, tiled otherwise."""
+    if length <= MAX_ROW_LENGTH:
+        return generate_row(length, seed=seed)
+    rng = random.Random(seed)
+    row = []
+    while len(row) < length:
+        row.extend(generate_row(min(PITCH_CLASSES, length - len(row)), rng=rng))
+    return row
+
+
+def _rotations(row):
+    return [row[i:] + row[:i] for i in range(len(row))]
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks: each returns (prepare, run); prepare() is untimed and its
+# result is passed to run().
+# ---------------------------------------------------------------------------
+
+def bench_generate_row(length, mode, seed):
+    if length > MAX_ROW_LENGTH:
+        raise Skip(f"no row longer than {MAX_ROW_LENGTH} satisfies the interval rules")
+    return None, lambda _: generate_row(length, seed=seed)
+
+
+def _bench_parser(kind):
+    def bench(length, mode, seed):
+        try:
+            _, noteheads = _import_abjad()
+            parse = getattr(noteheads, f"parse_{kind}_sequence")
+        except Skip:
+            # The noteheads wrappers are one-liners around compile_pattern
+            def parse(text, total, rotation_index=0):
+                return compile_pattern(text, kind).plan(total, rotation_index)
+
+        def run(_):
+            for i in range(length):
+                parse(PATTERNS[kind], length, rotation_index=i)
+        return None, run
+    return bench
+
+
+def bench_beam_grouping(length, mode, seed):
+    def run(_):
+        rng = random.Random(seed)
+        for _ in range(length):
+            sample_beam_grouping(length, 3, 5, rng=rng)
+    return None, run
+
+
+def _rotation_staves(noteheads, row, length, mode):
+    """Rotation staves for one mode, built as noteheads.build_score does."""
+    staves = []
+    variants = []
+    if mode in ('pitches', 'both'):
+        variants.append({})
+    if mode in ('percussion', 'both'):
+        variants.append({'clef': 'percussion', 'pitch_mapping': noteheads.PERCUSSION_NOTE_MAP})
+    for options in variants:
+        for rotation in _rotations(row):
+            transposed = noteheads.transpose_row_to_start(rotation, row[0])
+            staves.append(noteheads.create_abjad_notes(
+                transposed, [], NOTEHEAD_MODE, DURATION_MODE, [(1, 8)],
+                original_row=row, as_staff=True, **options,
+            ))
+    return staves
+
+
+def bench_create_abjad_notes(length, mode, seed):
+    _, noteheads = _import_abjad()
+    row = benchmark_row(length, seed)
+    return None, lambda _: _rotation_staves(noteheads, row, length, mode)
+
+
+def bench_apply_dynamic_beaming(length, mode, seed):
+    _, noteheads = _import_abjad()
+    row = benchmark_row(length, seed)
+
+    def run(staves):
+        rng = random.Random(seed)
+        for staff in staves:
+            noteheads.apply_dynamic_beaming(staff, length, max_groups=5, rng=rng)
+    return lambda: _rotation_staves(noteheads, row, length, mode), run
+
+
+def _add_rotation_staves(noteheads, score, row, length, mode):
+    common = dict(
+        articulation_mode_string=PATTERNS[ARTICULATION],
+        duration_mode_string=PATTERNS[DURATION],
+        notehead_mode=NOTEHEAD_MODE,
+        notehead_mode_string=PATTERNS[NOTEHEAD],
+        duration_mode=DURATION_MODE,
+        durations_for_rotation=None,
+        row_length=length,
+    )
+    if mode in ('pitches', 'both'):
+        noteheads.add_rotation_staves(score, row, **common)
+    if mode in ('percussion', 'both'):
+        noteheads.add_rotation_staves(score, row, clef='percussion', pitch_mapping=noteheads.PERCUSSION_NOTE_MAP,
+                                      fixed_duration=(1, 8), **common)
+
+
+def bench_add_rotation_staves(length, mode, seed):
+    abjad, noteheads = _import_abjad()
+    row = benchmark_row(length, seed)
+    return None, lambda _: _add_rotation_staves(noteheads, abjad.Score([]), row, length, mode)
+
+
+def _plan_score(length, mode, seed, workers=1):
+    import noteplan
+    row = benchmark_row(length, seed)
+    return noteplan.plan_score(
+        row, length, NOTEHEAD_MODE, DURATION_MODE,
+        articulation_mode_string=PATTERNS[ARTICULATION],
+        duration_mode_string=PATTERNS[DURATION],
+        notehead_mode_string=PATTERNS[NOTEHEAD],
+        output_mode=mode, seed=seed, workers=workers,
+    )
+
+
+def bench_plan_score(length, mode, seed):
+    return None, lambda _: _plan_score(length, mode, seed)
+
+
+def bench_plan_score_parallel(length, mode, seed):
+    """plan_score with rotations on every core (pool startup included)."""
+    return None, lambda _: _plan_score(length, mode, seed, workers=0)
+
+
+def bench_format_score(length, mode, seed):
+    import noteplan
+    return lambda: _plan_score(length, mode, seed), noteplan.format_score
+
+
+def bench_write_ly(length, mode, seed):
+    import noteplan
+    work_dir = os.path.join(tempfile.gettempdir(), 'oscilla-bench')
+    os.makedirs(work_dir, exist_ok=True)
+    ly_path = os.path.join(work_dir, f"text-l{length}-{mode}.ly")
+    return lambda: _plan_score(length, mode, seed), lambda staves: noteplan.write_ly(staves, ly_path)
+
+
+def bench_lilypond_text(length, mode, seed):
+    import batch
+    import noteplan
+    if shutil.which(batch.LILYPOND) is None:
+        raise Skip(f"{batch.LILYPOND} not found")
+    work_dir = os.path.join(tempfile.gettempdir(), 'oscilla-bench')
+    os.makedirs(work_dir, exist_ok=True)
+
+    def run(_):
+        ly_path = os.path.join(work_dir, f"text-l{length}-{mode}.ly")
+        noteplan.write_ly(_plan_score(length, mode, seed), ly_path)
+        batch.compile_ly(ly_path, ['pdf'])
+    return None, run
+
+
+def bench_lilypond(length, mode, seed):
+    abjad, noteheads = _import_abjad()
+    import batch
+    if shutil.which(batch.LILYPOND) is None:
+        raise Skip(f"{batch.LILYPOND} not found")
+    row = benchmark_row(length, seed)
+    work_dir = os.path.join(tempfile.gettempdir(), 'oscilla-bench')
+    os.makedirs(work_dir, exist_ok=True)
+
+    def run(_):
+        score = abjad.Score([])
+        _add_rotation_staves(noteheads, score, row, length, mode)
+        ly_path = os.path.join(work_dir, f"l{length}-{mode}.ly")
+        abjad.persist.as_ly(score, ly_path)
+        batch.compile_ly(ly_path, ['pdf'])
+    return None, run
+
+
+PYTHON_BENCHMARKS = [
+    ('generate_row', bench_generate_row, False),
+    ('parse_articulation_sequence', _bench_parser(ARTICULATION), False),
+    ('parse_duration_sequence', _bench_parser(DURATION), False),
+    ('parse_notehead_sequence', _bench_parser(NOTEHEAD), False),
+    ('sample_beam_grouping', bench_beam_grouping, False),
+    ('apply_dynamic_beaming', bench_apply_dynamic_beaming, True),
+    ('create_abjad_notes', bench_create_abjad_notes, True),
+    ('add_rotation_staves', bench_add_rotation_staves, True),
+    ('plan_score', bench_plan_score, True),
+    ('plan_score_parallel', bench_plan_score_parallel, True),
+    ('format_score', bench_format_score, True),
+    ('write_ly', bench_write_ly, True),
+]
+LILYPOND_BENCHMARKS = [
+    ('build_and_compile', bench_lilypond, True),
+    ('build_and_compile_text', bench_lilypond_text, True),
+]
+
+
+# ---------------------------------------------------------------------------
+# Running and comparing
+# ---------------------------------------------------------------------------
+
+def time_benchmark(bench, length, mode, seed, repeat):
+    """Run one benchmark `repeat` times. Returns a result dict (without its keys)."""
+    try:
+        prepare, run = bench(length, mode, seed)
+    except Skip as e:
+        return {'status': 'skipped', 'reason': str(e)}
+
+    times = []
+    for _ in range(repeat):
+        random.seed(seed)
+        compile_pattern.cache_clear()
+        state = prepare() if prepare else None
+        started = time.perf_counter()
+        try:
+            run(state)
+        except Skip as e:
+            return {'status': 'skipped', 'reason': str(e)}
+        except Exception as e:
+            return {'status': 'failed', 'reason': f"{type(e).__name__}: {e}"}
+        times.append(time.perf_counter() - started)
+    return {
+        'status': 'ok',
+        'runs': [round(t, 6) for t in times],
+        'min': round(min(times), 6),
+        'median': round(statistics.median(times), 6),
+        'mean': round(statistics.fmean(times), 6),
+    }
+
+
+def run_suite(lengths, modes, seed=1, repeat=5, lilypond=False, lilypond_repeat=1):
+    results = []
+    reported_skips = set()
+    suites = [('python', PYTHON_BENCHMARKS, repeat)]
+    if lilypond:
+        suites.append(('lilypond', LILYPOND_BENCHMARKS, lilypond_repeat))
+    for path, benchmarks, count in suites:
+        for name, bench, per_mode in benchmarks:
+            for length in lengths:
+                for mode in (modes if per_mode else [None]):
+                    result = {'name': name, 'path': path, 'length': length, 'mode': mode}
+                    result.update(time_benchmark(bench, length, mode, seed, count))
+                    results.append(result)
+                    label = f"{name} l={length}" + (f" {mode}" if mode else '')
+                    if result['status'] == 'ok':
+                        logging.info(f"{label:<48} {result['median'] * 1000:10.2f} ms")
+                    elif (name, result['reason']) not in reported_skips:
+                        reported_skips.add((name, result['reason']))
+                        logging.info(f"{name:<48} {result['status']}: {result['reason']}")
+    return results
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment(seed, repeat):
+    try:
+        import abjad
+        abjad_version = getattr(abjad, '__version__', 'unknown')
+    except ImportError:
+        abjad_version = None
+    return {
+        'commit': _git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'abjad': abjad_version,
+        'seed': seed,
+        'repeat': repeat,
+    }
+
+
+def _key(result):
+    return (result['name'], result['path'], result['length'], result['mode'])
+
+
+def compare(old_results, new_results, threshold=1.25, noise=0.0005):
+    """Ratios new/old of the fastest runs for benchmarks that ran in both. Returns (rows, regressions)."""
+    old = {_key(r): r for r in old_results if r['status'] == 'ok'}
+    rows, regressions = [], []
+    for result in new_results:
+        before = old.get(_key(result))
+        if before is None or result['status'] != 'ok' or not before['min']:
+            continue
+        ratio = result['min'] / before['min']
+        row = dict(zip(('name', 'path', 'length', 'mode'), _key(result)),
+                   old=before['min'], new=result['min'], ratio=round(ratio, 3))
+        rows.append(row)
+        if ratio > threshold and result['min'] - before['min'] > noise:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark score-fragment generation.")
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS)
+    parser.add_argument('--modes', nargs='+', default=DEFAULT_MODES, choices=DEFAULT_MODES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--lilypond', action='store_true', help="Also time build + LilyPond compile")
+    parser.add_argument('--lilypond-repeat', type=int, default=1)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', metavar='OLD_JSON', help="Compare fastest runs with an earlier result file")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Slowdown ratio that counts as a regression (default 1.25)")
+    parser.add_argument('--noise', type=float, default=0.0005,
+                        help="Ignore slowdowns smaller than this many seconds (default 0.0005)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    results = run_suite(args.lengths, args.modes, seed=args.seed, repeat=args.repeat,
+                        lilypond=args.lilypond, lilypond_repeat=args.lilypond_repeat)
+    report = {'meta': environment(args.seed, args.repeat), 'results': results}
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    temp_path = f"{args.output}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, args.output)
+    print(f"results: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline['results'], results, args.threshold, args.noise)
+        for row in rows:
+            label = f"{row['name']} l={row['length']}" + (f" {row['mode']}" if row['mode'] else '')
+            flag = '  REGRESSION' if row in regressions else ''
+            print(f"{label:<48} {row['old'] * 1000:10.2f} → {row['new'] * 1000:10.2f} ms  x{row['ratio']:.2f}{flag}")
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than x{args.threshold} against {args.compare}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import logging
 import time
 import sys
 
+from rowgen import generate_row
+
 logging.basicConfig(level=logging.INFO)
 
 all_articulations = [
@@ -17,57 +19,6 @@ all_articulations = [
 notehead_shapes = ['cross', 'triangle', 'diamond', 'slash', 'rectangle', 'circle', 'xcircle', 'harmonic', 'harmonic-black']
 
 
-def generate_row(row_length, max_retries=5):
-    """
-    Generate a random row of a specified length (0-11 pitch classes) with interval restrictions and allowing repetition.
-    """
-    allowed_intervals = {1, 2, 3, 6, 9, 10, 11}  # Allowed intervals and their inversions
-    forbidden_intervals = {4, 5, 7, 8}  # Forbidden intervals and their inversions
-
-    for retry in range(max_retries):
-        row = [random.randint(0, 11)]  # Start with a random pitch
-        previous_intervals = []  # Track previously used intervals in sequence
-        attempts = 0
-        max_attempts = 10000  # Limit the number of attempts to prevent infinite loops
-
-        logging.info(f"Attempt {retry+1}: Starting row generation with initial pitch: {row[0]}")
-
-        while len(row) < row_length:
-            attempts += 1
-            if attempts > max_attempts:
-                logging.warning("Max attempts reached. Restarting row generation...")
-                break  # Exit this attempt and try again
-
-            next_pitch = random.randint(0, 11)
-
-            if attempts % 1000 == 0:  # Log progress every 1000 attempts
-                logging.info(f"Attempts: {attempts}, Current Row: {row}")
-
-            if next_pitch not in row:  # Ensure no duplicates
-                interval = (next_pitch - row[-1]) % 12
-                inverse_interval = (row[-1] - next_pitch) % 12
-
-                if len(previous_intervals) > 0 and previous_intervals[-1] in (interval, inverse_interval):
-                    continue  # Prevent direct repetition of the same interval
-
-                if interval in allowed_intervals or inverse_interval in allowed_intervals:
-                    row.append(next_pitch)
-                    previous_intervals.append(interval)
-                    logging.info(f"Added pitch {next_pitch} (Interval: {interval})")
-                elif (interval not in forbidden_intervals) and (inverse_interval not in forbidden_intervals):
-                    # If interval is not forbidden, allow it with a 50% chance
-                    if random.random() > 0.5:
-                        row.append(next_pitch)
-                        previous_intervals.append(interval)
-                        logging.info(f"Added pitch {next_pitch} (Interval: {interval}) by random allowance.")
-
-        if len(row) == row_length:  # Successfully generated a row
-            return row
-
-    logging.error("Failed to generate a valid row after maximum retries.")
-    return None  # Return None if all retries fail
-
-
 def pitch_class_to_note_name(pitch_class):
     """
     Convert a pitch class (0-11) to a note name string with a mix of sharps and flats.
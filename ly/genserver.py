@@ -0,0 +1,465 @@
+# Warm Generator Service
+#
+# A long-running process that builds noteheads.py scores on request, so a
+# session pays Python / abjad startup once instead of per fragment.
+# server.js (or any script) connects over a Unix socket or local TCP port
+# and exchanges newline-delimited JSON:
+#
+#   → {"id": 1, "op": "generate", "params": {"row_length": 12, "seed": 7,
+#        "output": "rotations=both", "formats": ["fragment"]}, "inline": true}
+#   ← {"id": 1, "ok": true, "name": "gen-000001", "row": [...],
+#        "ly": "o/generated/gen-000001.ly",
+#        "outputs": {"fragment": "o/generated/gen-000001.fragment.svg"},
+#        "svg": "<svg ...>", "cached": false, "seconds": {...}}
+#
+#   → {"id": 2, "op": "stats"}      counters, queue depth, uptime
+#   → {"id": 3, "op": "ping"}
+#
+# Live streams (see livestream.py) return one new staff per request instead
+# of a whole score:
+#
+#   → {"id": 4, "op": "next", "stream": "a", "inline": true,
+#        "params": {"row_length": 12, "seed": 7, "output": "serial"}}
+#   ← {"id": 4, "ok": true, "stream": "a", "index": 0, "name": "live-a-0000",
+#        "staves": ["serial-p0"], "row": [...], "fragment": "o/live/live-a-0000.fragment.svg",
+#        "svg": "<svg ...>", "ready": true, "seconds": {"build": ..., "compile": ..., "wait": ...}}
+#   → {"id": 5, "op": "close", "stream": "a"}
+#
+# The first "next" opens the stream; "params" only needs sending again to
+# replace it with a new one.  "index" requests a specific variant instead of
+# the one after the last.  After every "next" the following --prefetch
+# variants are rendered in the background, so when triggers are further
+# apart than a LilyPond run the reply is ready ("ready": true) and costs a
+# file read; "wait" is how long the request actually waited.
+#
+# "params" uses the batch.py job vocabulary, which mirrors the noteheads.py
+# options (row_length, noteheads, duration, row_mode, articulation_mode,
+# duration_mode, notehead_mode, output, seed, engine, formats).  "formats"
+# defaults to ["fragment"]; with "inline": true the SVG text is returned
+# in the reply as well as written to disk.
+#
+# Requests are handled concurrently.  Score building runs on one worker
+# thread (it reseeds the global RNG), as do render cache lookups and stores
+# (disk I/O, kept off the event loop), LilyPond compiles on a bounded pool of
+# --workers.  Backpressure:
+#   - at most --max-pending requests are admitted; beyond that the reply
+#     is {"ok": false, "error": "busy", "retry": true} straight away.
+#     Prefetch renders count as pending until they finish, and no more
+#     are started while the service is at the limit
+#   - each connection has at most PER_CONNECTION requests in flight; the
+#     server stops reading from it until one finishes
+#   - replies wait for the socket to drain before more are written
+#
+# LilyPond has no resident mode, so "warm" applies to the Python side
+# (abjad is imported at startup with --preload-abjad, pattern and render
+# caches persist); compiles are still one lilypond process each.
+#
+# Usage:
+# python genserver.py [--socket o/genserver.sock | --port 8765] [--output-dir o/generated]
+#                     [--workers N] [--max-pending 32] [--timeout SECONDS]
+#                     [--cache-dir DIR] [--preload-abjad] [--live-dir o/live] [--prefetch 3]
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+import livestream
+from render_cache import RenderCache
+
+DEFAULT_SOCKET = os.path.join('o', 'genserver.sock')
+DEFAULT_OUTPUT_DIR = os.path.join('o', 'generated')
+DEFAULT_LIVE_DIR = os.path.join('o', 'live')
+DEFAULT_PREFETCH = 3
+MAX_STREAMS = 16
+DEFAULT_MAX_PENDING = 32
+DEFAULT_FORMATS = ['fragment']
+PER_CONNECTION = 8
+LINE_LIMIT = 1024 * 1024
+
+PARAM_KEYS = set(batch.JOB_DEFAULTS) | {'name'}
+NAME_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class RequestError(ValueError):
+    """A request the service refuses; the message goes back to the client."""
+
+
+class LiveStream:
+    """An open stream: its variants, the next index and renders started so far."""
+
+    def __init__(self, variants, params):
+        self.variants = variants
+        self.params = params
+        self.cursor = 0
+        self.renders = {}  # index → asyncio.Task
+
+    def cancel(self, before=None):
+        for index in [i for i in self.renders if before is None or i < before]:
+            self.renders.pop(index).cancel()
+
+
+class GeneratorService:
+    """Builds and compiles jobs; one instance serves every connection."""
+
+    def __init__(self, output_dir=DEFAULT_OUTPUT_DIR, workers=None, max_pending=DEFAULT_MAX_PENDING,
+                 timeout=None, cache=None, live_dir=DEFAULT_LIVE_DIR, prefetch=DEFAULT_PREFETCH):
+        self.output_dir = output_dir
+        self.live_dir = live_dir
+        self.prefetch = prefetch
+        self.streams = {}
+        self.timeout = timeout
+        self.cache = cache
+        self.max_pending = max_pending
+        self.pending = 0
+        self.started = time.time()
+        self.counter = itertools.count(1)
+        self.stats = {'requests': 0, 'generated': 0, 'cached': 0, 'failed': 0, 'busy': 0,
+                      'live_ready': 0, 'live_waited': 0}
+        self.build_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='build')
+        self.compile_pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                               thread_name_prefix='lilypond')
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(live_dir, exist_ok=True)
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.cancel()
+        self.build_pool.shutdown(wait=False, cancel_futures=True)
+        self.compile_pool.shutdown(wait=False, cancel_futures=True)
+
+    def job_for(self, params):
+        if not isinstance(params, dict):
+            raise RequestError("params must be an object")
+        unknown = set(params) - PARAM_KEYS
+        if unknown:
+            raise RequestError(f"unknown params {sorted(unknown)}; allowed: {sorted(PARAM_KEYS)}")
+        job = dict(batch.JOB_DEFAULTS, formats=list(DEFAULT_FORMATS))
+        job.update(params)
+        if isinstance(job['formats'], str):
+            job['formats'] = [job['formats']]
+        job['name'] = job.get('name') or f"gen-{next(self.counter):06d}"
+        if not NAME_RE.match(str(job['name'])):
+            raise RequestError("name may only contain letters, digits, '-' and '_'")
+        try:
+            batch.parse_output_mode(job['output'])
+            job['row_length'] = int(job['row_length'])
+        except (TypeError, ValueError) as e:
+            raise RequestError(str(e))
+        return job
+
+    def cache_lookup(self, ly_path, job, formats):
+        """(key, outputs or None); runs on the build thread, like every cache access."""
+        key = self.cache.key_for_file(ly_path, engine=job['engine'])
+        return key, self.cache.materialize(key, formats, os.path.splitext(ly_path)[0], naming=batch.output_path)
+
+    async def generate(self, params, inline=False):
+        loop = asyncio.get_running_loop()
+        job = self.job_for(params)
+        seconds = {}
+
+        started = time.perf_counter()
+        try:
+            ly_path, row = await loop.run_in_executor(self.build_pool, batch.build_job, job, self.output_dir)
+        except Exception as e:
+            raise RequestError(f"build failed: {e}")
+        seconds['build'] = round(time.perf_counter() - started, 4)
+
+        output_base = os.path.splitext(ly_path)[0]
+        formats = [fmt for fmt in job['formats'] if fmt != 'ly']
+        outputs, cached, key = None, False, None
+        if self.cache is not None and formats:
+            key, outputs = await loop.run_in_executor(self.build_pool, self.cache_lookup, ly_path, job, formats)
+            cached = outputs is not None
+
+        if outputs is None:
+            started = time.perf_counter()
+            try:
+                outputs = await loop.run_in_executor(
+                    self.compile_pool, batch.compile_ly, ly_path, job['formats'], self.timeout)
+            except Exception as e:
+                raise RequestError(f"compile failed: {e}")
+            seconds['compile'] = round(time.perf_counter() - started, 4)
+            if key is not None:
+                await loop.run_in_executor(self.build_pool, functools.partial(
+                    self.cache.store, key, dict(outputs, ly=ly_path), meta={'name': job['name'], 'row': row}))
+
+        reply = {'name': job['name'], 'row': row, 'ly': ly_path, 'outputs': outputs,
+                 'cached': cached, 'seconds': seconds}
+        if inline:
+            svg_path = outputs.get('fragment') or outputs.get('svg')
+            if isinstance(svg_path, list):  # multi-page: inline the first page
+                svg_path = svg_path[0]
+            if svg_path:
+                with open(svg_path, encoding='utf-8') as f:
+                    reply['svg'] = f.read()
+        return reply
+
+    async def open_stream(self, name, params):
+        if len(self.streams) >= MAX_STREAMS and name not in self.streams:
+            raise RequestError(f"too many open streams (limit {MAX_STREAMS}); close one first")
+        loop = asyncio.get_running_loop()
+        try:
+            variants = await loop.run_in_executor(self.build_pool, livestream.VariantStream, name, params)
+        except (TypeError, ValueError) as e:
+            raise RequestError(str(e))
+        old = self.streams.get(name)
+        if old is not None:
+            old.cancel()
+        stream = self.streams[name] = LiveStream(variants, params)
+        logging.info(f"stream '{name}' opened: row {variants.row}")
+        return stream
+
+    def close_stream(self, name):
+        stream = self.streams.pop(name, None)
+        if stream is not None:
+            stream.cancel()
+        return stream is not None
+
+    async def render_variant(self, variants, index):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        ly_path, staves = await loop.run_in_executor(self.build_pool, variants.write, index, self.live_dir)
+        built = time.perf_counter()
+        svg_path = await loop.run_in_executor(
+            self.compile_pool, livestream.render, ly_path, variants.variant_name(index), self.timeout)
+        return {'index': index, 'name': variants.variant_name(index), 'staves': staves,
+                'ly': ly_path, 'fragment': svg_path,
+                'seconds': {'build': round(built - started, 4),
+                            'compile': round(time.perf_counter() - built, 4)}}
+
+    def schedule(self, stream, index, prefetch=False):
+        """The render task for `index`, started if needed.  Prefetches count toward pending."""
+        task = stream.renders.get(index)
+        if task is not None:
+            return task
+        if prefetch and self.pending >= self.max_pending:
+            return None
+        task = stream.renders[index] = asyncio.ensure_future(self.render_variant(stream.variants, index))
+        name = stream.variants.variant_name(index)
+
+        def finished(task):
+            if prefetch:
+                self.pending -= 1
+            # Read the outcome so a render nobody awaits (cancelled stream,
+            # skipped index) does not log "Task exception was never retrieved".
+            if not task.cancelled() and task.exception() is not None:
+                logging.warning(f"render of {name} failed: {task.exception()}")
+
+        if prefetch:
+            self.pending += 1
+        task.add_done_callback(finished)
+        return task
+
+    async def next_variant(self, request, inline=False):
+        name = str(request.get('stream', 'default'))
+        if not NAME_RE.match(name):
+            raise RequestError("stream may only contain letters, digits, '-' and '_'")
+        params = request.get('params')
+        if params is not None and not isinstance(params, dict):
+            raise RequestError("params must be an object")
+        stream = self.streams.get(name)
+        if stream is None or (params is not None and params != stream.params):
+            stream = await self.open_stream(name, params or {})
+
+        index = request.get('index', stream.cursor)
+        if not isinstance(index, int) or index < 0:
+            raise RequestError("index must be a non-negative integer")
+        stream.cursor = index + 1
+        stream.cancel(before=index)
+
+        task = self.schedule(stream, index)
+        for ahead in range(index + 1, index + 1 + self.prefetch):
+            self.schedule(stream, ahead, prefetch=True)
+
+        ready = task.done()
+        started = time.perf_counter()
+        try:
+            variant = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise RequestError("stream was replaced or closed")
+        except Exception as e:
+            stream.renders.pop(index, None)  # let a retry render it again
+            raise RequestError(f"render failed: {e}")
+        stream.renders.pop(index, None)
+
+        reply = dict(variant, stream=name, row=stream.variants.row, ready=ready,
+                     seconds=dict(variant['seconds'], wait=round(time.perf_counter() - started, 4)))
+        if inline:
+            with open(variant['fragment'], encoding='utf-8') as f:
+                reply['svg'] = f.read()
+        return reply
+
+    async def handle(self, request):
+        """Reply (without the id) for one decoded request."""
+        op = request.get('op', 'generate')
+        if op == 'ping':
+            return {'ok': True, 'pong': time.time()}
+        if op == 'stats':
+            return {'ok': True, 'pending': self.pending, 'max_pending': self.max_pending,
+                    'streams': sorted(self.streams), 'uptime': round(time.time() - self.started, 1),
+                    **self.stats}
+        if op == 'close':
+            return {'ok': True, 'closed': self.close_stream(str(request.get('stream', 'default')))}
+        if op not in ('generate', 'next'):
+            return {'ok': False, 'error': f"unknown op '{op}'"}
+
+        self.stats['requests'] += 1
+        if self.pending >= self.max_pending:
+            self.stats['busy'] += 1
+            return {'ok': False, 'error': 'busy', 'retry': True, 'pending': self.pending}
+
+        self.pending += 1
+        try:
+            if op == 'next':
+                reply = await self.next_variant(request, inline=bool(request.get('inline')))
+            else:
+                reply = await self.generate(request.get('params', {}), inline=bool(request.get('inline')))
+        except RequestError as e:
+            self.stats['failed'] += 1
+            return {'ok': False, 'error': str(e)}
+        finally:
+            self.pending -= 1
+        if op == 'next':
+            self.stats['live_ready' if reply['ready'] else 'live_waited'] += 1
+        else:
+            self.stats['cached' if reply['cached'] else 'generated'] += 1
+        return {'ok': True, **reply}
+
+    async def serve_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or 'unix'
+        logging.info(f"client connected: {peer}")
+        slots = asyncio.Semaphore(PER_CONNECTION)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request_id, request):
+            try:
+                reply = await self.handle(request)
+            except Exception as e:  # keep the connection alive whatever happens
+                logging.exception("request failed")
+                reply = {'ok': False, 'error': f"internal error: {e}"}
+            finally:
+                slots.release()
+            await send(dict(reply, id=request_id))
+
+        async def send(message):
+            async with write_lock:
+                if writer.is_closing():
+                    return
+                writer.write(json.dumps(message).encode('utf-8') + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    await send({'ok': False, 'error': f"request larger than {LINE_LIMIT} bytes"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    await send({'ok': False, 'error': f"bad request: {e}"})
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(respond(request.get('id'), request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            logging.info(f"client disconnected: {peer}")
+
+
+async def serve(service, socket_path=None, host='127.0.0.1', port=None):
+    if port is not None:
+        server = await asyncio.start_server(service.serve_connection, host, port, limit=LINE_LIMIT)
+        where = f"{host}:{port}"
+    else:
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # stale socket from an earlier run
+        server = await asyncio.start_unix_server(service.serve_connection, socket_path, limit=LINE_LIMIT)
+        where = socket_path
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logging.info(f"generator service listening on {where}")
+    print(json.dumps({'type': 'genserver', 'listening': where}), flush=True)
+    async with server:
+        await stop.wait()
+    if port is None and os.path.exists(socket_path):
+        os.remove(socket_path)
+    service.close()
+
+
+def call(request, socket_path=DEFAULT_SOCKET, port=None, host='127.0.0.1', timeout=None):
+    """Blocking one-shot client: send one request and return the reply."""
+    if port is not None:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise ConnectionError("generator service closed the connection")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve noteheads.py generation requests over a local socket.")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--socket', default=None, help=f"Unix socket path (default {DEFAULT_SOCKET})")
+    where.add_argument('--port', type=int, default=None, help="Listen on 127.0.0.1:PORT instead")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=None, help="Concurrent LilyPond processes (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument('--timeout', type=float, default=None, help="Per-compile LilyPond timeout in seconds")
+    parser.add_argument('--cache-dir', default=None, help="Render cache directory (reuse identical renders)")
+    parser.add_argument('--preload-abjad', action='store_true', help="Import abjad at startup for engine=abjad jobs")
+    parser.add_argument('--live-dir', default=DEFAULT_LIVE_DIR, help="Where live stream variants are written")
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH,
+                        help="Live variants rendered ahead of the last one requested")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    import noteheads  # warm the build path: patterns, noteplan, rowgen
+    if args.preload_abjad:
+        import abjad
+
+    cache = RenderCache(args.cache_dir) if args.cache_dir else None
+    service = GeneratorService(args.output_dir, workers=args.workers, max_pending=args.max_pending,
+                               timeout=args.timeout, cache=cache, live_dir=args.live_dir, prefetch=args.prefetch)
+    asyncio.run(serve(service, socket_path=args.socket or DEFAULT_SOCKET, host=args.host, port=args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Live Variant Streams
+#
+# The per-staff half of live generation: a stream fixes a row and a set of
+# noteheads.py options, and variant k is a single new staff (or a pitch +
+# percussion pair) rather than a whole score, so a performance can ask for
+# "the next one" and get back one small SVG fragment to splice into the page.
+#
+# Variants, by output mode:
+#   pitches / percussion   rotation k mod row_length
+#   both                   pitch and percussion staves of rotation k (one
+#                          plan, staffed twice, so their rhythms match)
+#   serial                 the 48 row forms in turn: P0 I0 R0 RI0 P1 I1 ...
+#                          (transposition n is relative to the row)
+#
+# When the stream has a seed, variant k reseeds the RNG from (seed, k)
+# before planning, so a variant is the same whichever order the variants
+# are built in (prefetching builds ahead of the performance).
+#
+# genserver.py keeps streams open and pre-renders the next N variants; this
+# module only plans and writes them.
+#
+# Usage:
+#   stream = VariantStream('a', {'row_length': 12, 'seed': 7, 'output': 'rotations=pitches'})
+#   ly_path = stream.write(3, 'o/live')
+#   svg_path = render(ly_path, stream.variant_name(3))
+
+import os
+import random
+
+import batch
+import noteplan
+import svg_export
+
+FORMS = ('p', 'i', 'r', 'ri')
+LIVE_DEFAULTS = dict(batch.JOB_DEFAULTS, output='rotations=pitches')
+STREAM_KEYS = set(LIVE_DEFAULTS) - {'name', 'formats', 'engine'}
+
+
+def form_row(row, form, transposition=0):
+    """Row form `form` ('p', 'i', 'r', 'ri') transposed by `transposition` semitones."""
+    row = [(pitch + transposition) % 12 for pitch in row]
+    if form in ('i', 'ri'):
+        row = [(row[0] - (pitch - row[0])) % 12 for pitch in row]
+    if form in ('r', 'ri'):
+        row = row[::-1]
+    return row
+
+
+class VariantStream:
+    """One live stream: a resolved row plus the options every variant shares."""
+
+    def __init__(self, name, params=None):
+        import noteheads
+
+        unknown = set(params or {}) - STREAM_KEYS
+        if unknown:
+            raise ValueError(f"unknown stream params {sorted(unknown)}")
+        self.name = name
+        self.params = dict(LIVE_DEFAULTS, **(params or {}))
+        self.row_length = int(self.params['row_length'])
+        self.output_mode = batch.parse_output_mode(self.params['output'])
+        self.notehead_mode = noteheads.normalize_notehead_mode(self.params['noteheads'])
+        self.row = noteheads.resolve_row(self.row_length, self.params['row_mode'], seed=self.params['seed'])
+        if self.row is None:
+            raise ValueError(f"No valid row of length {self.row_length}")
+
+    def variant_name(self, index):
+        return f"live-{self.name}-{index:04d}"
+
+    def plan(self, index):
+        """Staff plans for variant `index` (one staff, two for 'both')."""
+        seed = self.params['seed']
+        if seed is not None:
+            random.seed(f"{seed}:{index}")
+        prefix = self.variant_name(index)
+        options = dict(
+            articulation_mode_string=self.params['articulation_mode'],
+            duration_mode_string=self.params['duration_mode'],
+            notehead_mode=self.notehead_mode,
+            notehead_mode_string=self.params['notehead_mode'],
+            row_length=self.row_length,
+        )
+
+        if self.output_mode == 'serial':
+            return [self._plan_form(index, prefix)]
+
+        rotation = index % self.row_length
+        plan = noteplan.plan_rotation(self.row, rotation, **options)  # shared by both staves
+        staves = []
+        if self.output_mode in ('pitches', 'both'):
+            staves.append(noteplan.rotation_staff(
+                plan, rotation, self.row_length, note_id_prefix=f"{prefix}-pitch"))
+        if self.output_mode in ('percussion', 'both'):
+            staves.append(noteplan.rotation_staff(
+                plan, rotation, self.row_length, clef='percussion', pitch_mapping=noteplan.PERCUSSION_NOTE_MAP,
+                fixed_duration=(1, 8), note_id_prefix=f"{prefix}-perc"))
+        return staves
+
+    def _plan_form(self, index, prefix):
+        form = FORMS[index % len(FORMS)]
+        transposition = (index // len(FORMS)) % 12
+        row = form_row(self.row, form, transposition)
+        articulation_mode = self.params['articulation_mode']
+        duration_mode = self.params['duration_mode']
+        articulations = noteplan.parse_articulation_sequence(
+            articulation_mode, len(row), rotation_index=index) if articulation_mode else []
+        durations = noteplan.parse_duration_sequence(
+            duration_mode, len(row), rotation_index=index) if duration_mode else None
+
+        plan = noteplan.plan_notes(row, articulations, self.notehead_mode, durations or [noteplan.DEFAULT_DURATION],
+                                   notehead_mode_string=self.params['notehead_mode'],
+                                   note_id_prefix=f"{prefix}-{form}{transposition}")
+        plan.name = f"serial-{form}{transposition}"
+        noteplan.plan_beaming(plan, len(plan), max_groups=5)
+        plan.overrides = True
+        return plan
+
+    def write(self, index, output_dir):
+        """Plan variant `index` and write it as <output_dir>/live-<stream>-<index>.ly."""
+        staves = self.plan(index)
+        ly_path = os.path.join(output_dir, f"{self.variant_name(index)}.ly")
+        noteplan.write_ly(staves, ly_path)
+        return ly_path, [plan.name for plan in staves]
+
+
+def render(ly_path, fragment_id, timeout=None):
+    """Compile one variant to a plain SVG fragment; returns the fragment path."""
+    output_base = os.path.splitext(ly_path)[0]
+    return svg_export.render_fragment(ly_path, batch.output_path(output_base, 'fragment'),
+                                      fragment_id=fragment_id, timeout=timeout)
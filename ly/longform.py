@@ -0,0 +1,130 @@
+# Long-Form Scores
+#
+# Writes a piece of any length as a sequence of live-stream variants (see
+# livestream.py): variant k is rotation k of the row, or the k-th serial
+# form, each reseeded from (seed, k).  Staves are planned lazily and written
+# to the .ly file as they are produced (noteplan.iter_ly_lines), so memory
+# stays flat whether the piece has forty staves or forty thousand.
+#
+# LilyPond cannot lay out thousands of simultaneous staves in one score, and
+# compiling one huge file uses one core.  --chunk N groups every N staves:
+#
+#   --split bookparts   one .ly file, each chunk a \bookpart (its own pages)
+#   --split files       <name>-001.ly, <name>-002.ly ... one score per chunk,
+#                       compiled in parallel on --workers LilyPond processes
+#
+# Usage:
+# python longform.py <row_length> --variants 2000 [--seed 7] [--output rotations=both]
+#                    [--noteheads ...] [--duration ...] [--row-mode random|fixed]
+#                    [--articulation-mode ...] [--duration-mode ...] [--notehead-mode ...]
+#                    [--chunk 48] [--split bookparts|files] [--formats pdf]
+#                    [--workers N] [--timeout SECONDS] [-o o/longform/piece]
+#
+# Without --formats only the .ly source is written.
+
+import argparse
+import logging
+import os
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+import noteplan
+from livestream import VariantStream
+
+DEFAULT_CHUNK = 48  # staves per book part / file
+DEFAULT_OUTPUT = os.path.join('o', 'longform', 'piece')
+
+
+def iter_staves(stream, count, start=0):
+    """Staff plans for variants start .. start + count - 1, planned one variant at a time."""
+    for index in range(start, start + count):
+        yield from stream.plan(index)
+
+
+def compile_parts(paths, formats, workers=None, timeout=None):
+    """Compile .ly files concurrently. Returns [(path, outputs or error)] in order."""
+    def compile_one(path):
+        try:
+            return path, batch.compile_ly(path, formats, timeout=timeout)
+        except Exception as e:
+            return path, e
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return list(pool.map(compile_one, paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a long generative piece as streamed, chunked LilyPond source.")
+    parser.add_argument('row_length', type=int, help="Number of notes in the row")
+    parser.add_argument('--variants', type=int, default=100, help="Number of variants (rotations / row forms)")
+    parser.add_argument('--start', type=int, default=0, help="First variant index")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='rotations=pitches',
+                        help="rotations=pitches | rotations=percussion | rotations=both | serial")
+    parser.add_argument('--noteheads', default='standard')
+    parser.add_argument('--duration', default='fixed')
+    parser.add_argument('--row-mode', choices=['random', 'fixed'], default='random')
+    parser.add_argument('--articulation-mode', default=None)
+    parser.add_argument('--duration-mode', default=None)
+    parser.add_argument('--notehead-mode', default=None)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help="Staves per book part or file (0 = one score)")
+    parser.add_argument('--split', choices=['bookparts', 'files'], default='bookparts')
+    parser.add_argument('--formats', nargs='*', default=[], help="LilyPond outputs to compile (pdf, svg, png)")
+    parser.add_argument('--workers', type=int, default=None, help="Concurrent LilyPond processes (default: CPU count)")
+    parser.add_argument('--timeout', type=float, default=None, help="Per-compile LilyPond timeout in seconds")
+    parser.add_argument('-o', '--output-base', default=DEFAULT_OUTPUT, help="Output path without extension")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    name = os.path.basename(args.output_base)
+    stream = VariantStream(name, {
+        'row_length': args.row_length,
+        'noteheads': args.noteheads,
+        'duration': args.duration,
+        'row_mode': args.row_mode,
+        'articulation_mode': args.articulation_mode,
+        'duration_mode': args.duration_mode,
+        'notehead_mode': args.notehead_mode,
+        'output': args.output,
+        'seed': args.seed,
+    })
+    os.makedirs(os.path.dirname(args.output_base) or '.', exist_ok=True)
+
+    started = time.perf_counter()
+    staves = iter_staves(stream, args.variants, start=args.start)
+    if args.split == 'files' and args.chunk:
+        paths = noteplan.write_ly_parts(staves, args.output_base, args.chunk)
+    else:
+        paths = [noteplan.write_ly(staves, f"{args.output_base}.ly", chunk_size=args.chunk)]
+    written = time.perf_counter() - started
+    size = sum(os.path.getsize(path) for path in paths)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    logging.info(f"{args.variants} variants → {len(paths)} .ly file(s), {size / 1e6:.1f} MB "
+                 f"in {written:.2f}s (peak RSS {peak / 1024:.0f} MB)")
+
+    formats = [fmt for fmt in args.formats if fmt != 'ly']
+    if not formats:
+        for path in paths:
+            print(path)
+        return
+
+    started = time.perf_counter()
+    failed = 0
+    for path, result in compile_parts(paths, formats, workers=args.workers, timeout=args.timeout):
+        if isinstance(result, Exception):
+            failed += 1
+            logging.error(f"{path}: {result}")
+            continue
+        for output in result.values():
+            for page in output if isinstance(output, list) else [output]:
+                print(page)
+    logging.info(f"compiled {len(paths) - failed} of {len(paths)} in {time.perf_counter() - started:.1f}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
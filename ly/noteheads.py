@@ -2,9 +2,9 @@
 #
 # Usage:
 # python noteheads.py <row_length>
-#     --noteheads <random|standard|serial|fixed=X|random=[...]|fixed=[...]>
-#     --duration <random|serial|fixed=X|fixed=[...],random=[...]>
-#     --row-mode <random|fixed>
+#     [--noteheads <random|standard|serial|fixed=X|random=[...]|fixed=[...]>]
+#     [--duration <random|serial|fixed=X|fixed=[...],random=[...]>]
+#     [--row-mode <random|fixed>]
 #     [--notehead-mode ...]
 #     [--duration-mode ...]
 #     [--articulation-mode ...]
@@ -50,6 +50,28 @@
 #                               - 'random'         : Generates a random twelve-tone row.
 #                               - 'fixed'          : Uses a static test row.
 #
+# --seed                      : Integer seed for row generation (reproducible rows).
+#
+# --workers N                 : Plan rotation staves on N processes (0 = every
+#                               core). Each rotation has its own RNG stream, so
+#                               the score is identical for any N.
+#
+# --cache-dir DIR             : Reuse identical renders from a content-addressed
+#                               render cache (see render_cache.py). Output names
+#                               gain a short content hash so parameter sets
+#                               no longer overwrite each other.
+#
+# --engine text|abjad         : 'text' (default) writes the .ly straight from note
+#                               plans (see noteplan.py); 'abjad' builds the abjad
+#                               score and lets abjad format and show it. Either
+#                               way the PDF is opened in the system viewer.
+#
+# --no-show                   : Write the PDF without opening a viewer.
+#
+# --svg                       : Render a plain SVG fragment (see svg_export.py)
+#                               instead of a PDF. Notes get stable ids such as
+#                               note-pitch-r03-07 (rotation 3, note 7).
+#
 # --articulation-mode         : Block-based articulation specification.
 #     - fixed=X                → All notes get articulation X
 #     - random=[a,b]           → Each note randomly receives one
@@ -63,285 +85,63 @@
 #     - rotations=both         : Both pitch and percussion versions
 #     - serial                 : Just a prime/retrograde/inversion display
 #
-# TODO --beaming              : (Not yet implemented)
-#     Controls how notes are grouped:
-#         - 'together'         : All beamed together
-#         - 'fixed=N'          : Grouped in chunks
-#         - 'fixed=[...]'      : Fixed beam pattern
-#         - 'ratios=...|...'   : Cycled beam ratios
-#         - 'dynamic'          : Randomized patterns
+# Beaming is not an option: each staff is beamed in randomly sized groups
+# (noteplan.plan_beaming), reproducible with --seed.
 #
 # Example Usage:
 # python noteheads.py 12 --noteheads random=[diamond,cross] \
 #     --duration-mode "[fixed=[8]x2,random=[rest=(1,4),16]x3,rotate=[rest,4]x2]" \
 #     --notehead-mode "[fixed=[cross]x2,random=[diamond]x5]" \
 #     --row-mode random --output rotations=percussion
+#
+# --trace [PATH]              : Write a JSON trace of stage timings (row, patterns,
+#                               abjad, beaming, persist.as_ly, lilypond, show) to
+#                               PATH (default <output>.trace.json); see instrument.py.
+# --trace-memory              : Also record tracemalloc allocation per stage.
+# --profile                   : Also run under cProfile (top entries in the trace,
+#                               raw data in <trace>.prof).
+# --quiet                     : Log warnings and errors only.
+#
+# --plan-only                 : Print the resolved plan (row, and per staff the
+#                               pitches, durations, noteheads, articulations and
+#                               beam groups) as JSON and stop. Neither abjad nor
+#                               LilyPond is loaded; abjad is only imported when
+#                               --engine abjad is used.
+#
+# To render many parameter sets in one run, see batch.py.
 
 
-import abjad
-import random
+import argparse
+import json
 import logging
-import time
-import sys
 import os
-import time
-import subprocess
 import random
-import re
-import itertools
-from itertools import permutations, islice
-
-logging.basicConfig(level=logging.INFO)
-
-
-def parse_articulation_sequence(arg_string, total_notes, rotation_index=0):
-    import re
-    import itertools
-
-    def expand_repetitions(item_str):
-        """Expands inline repetitions like 'accent x3' → ['accent', 'accent', 'accent']"""
-        repeat_match = re.match(r'(.+?)x(\d+)$', item_str.strip())
-        if repeat_match:
-            base, count = repeat_match.groups()
-            return [base.strip()] * int(count)
-        else:
-            return [item_str.strip()]
-
-    articulation_plan = []
-    pattern = re.compile(r'(fixed|random|rotate|none)=\[((?:[^,\[\]]+,?)+)\](?:x(\d+))?')
-
-    # Remove outer brackets
-    arg_string = arg_string.strip()
-    if arg_string.startswith("[") and arg_string.endswith("]"):
-        arg_string = arg_string[1:-1]
-
-    segments = pattern.findall(arg_string)
-    print(f"📦 Raw articulation-mode string: {arg_string}")
-    print(f"🔍 Parsed segments: {segments}")
-
-    if not segments:
-        print("Error: Unable to parse articulation-mode string.")
-        return []
-
-    for mode, raw_list, count_str in segments:
-        count = int(count_str) if count_str else None
-
-        if mode == "none":
-            articulations = ["\\none"]
-        else:
-            items = raw_list.split(",")
-            articulations = []
-            for item in items:
-                expanded = expand_repetitions(item)
-                articulations.extend([a.lstrip("\\") for a in expanded if a.strip()])
-
-        if not articulations:
-            continue
-
-        if mode == "fixed":
-            seq = itertools.cycle(articulations)
-        elif mode == "random":
-            seq = (random.choice(articulations) for _ in itertools.count())
-        elif mode == "rotate":
-            rotated = articulations[rotation_index % len(articulations):] + articulations[:rotation_index % len(articulations)]
-            seq = itertools.cycle(rotated)
-        elif mode == "none":
-            seq = itertools.cycle(["\\none"])
-
-        if count:
-            full_block = list(itertools.islice(seq, count * len(articulations)))
-            articulation_plan.extend(full_block)
-        else:
-            articulation_plan.extend(articulations)
-
-    print(f"🧩 Block {mode}, expanded: {articulation_plan[-10:]}")
-
-    if len(articulation_plan) < total_notes:
-        return list(itertools.islice(itertools.cycle(articulation_plan), total_notes))
-    else:
-        return articulation_plan[:total_notes]
-
-def parse_duration_sequence(arg_string, total_notes, rotation_index=0):
-    import re
-    import ast
-    import random
-    import itertools
-
-    def smart_split(comma_string):
-        parts = []
-        current = ''
-        depth = 0
-        for char in comma_string:
-            if char == ',' and depth == 0:
-                parts.append(current.strip())
-                current = ''
-            else:
-                if char == '(':
-                    depth += 1
-                elif char == ')':
-                    depth -= 1
-                current += char
-        if current.strip():
-            parts.append(current.strip())
-        return parts
-
-    def parse_duration_item(val, previous_duration):
-        import re
-        import ast
-
-        repeat_match = re.match(r"(.+?)x(\d+)$", val.strip())
-        if repeat_match:
-            base_val, repeat_count = repeat_match.groups()
-            repeat_count = int(repeat_count)
-            repeated_items = []
-            for _ in range(repeat_count):
-                repeated_items.extend(parse_duration_item(base_val.strip(), previous_duration))
-            return repeated_items
-
-        val = val.strip()
-        if val.startswith("rest="):
-            val = val[len("rest="):].strip()
-            if val.startswith("("):
-                return [("rest", ast.literal_eval(val))]
-            elif val.isdigit():
-                return [("rest", (1, int(val)))]
-        elif val == "rest":
-            return [("rest", previous_duration)]
-        elif val.startswith("("):
-            return [ast.literal_eval(val)]
-        elif val.isdigit():
-            return [(1, int(val))]
-        elif val.startswith("r") and val[1:].isdigit():
-            return [("rest", (1, int(val[1:])))]
-        return [(1, 4)]  # default fallback
-
-
-
-    duration_plan = []
-    pattern = re.compile(r'(fixed|random|rotate)=\[((?:[^\[\]]+?,?)+?)\](?:x(\d+))?')
-
-    if arg_string.startswith("[") and arg_string.endswith("]"):
-        arg_string = arg_string[1:-1]
-
-    segments = pattern.findall(arg_string)
-    print(f"📦 Raw duration-mode string: {arg_string}")
-    print(f"🔍 Parsed segments: {segments}")
-
-    for mode, raw_list, count_str in segments:
-        count = int(count_str) if count_str else None
-        raw_values = smart_split(raw_list)
-        durations = []
-
-        try:
-            # Then inside the for-loop over `raw_values`:
-            for val in raw_values:
-                prev = durations[-1][1] if durations and isinstance(durations[-1], tuple) and durations[-1][0] == "rest" else durations[-1] if durations else (1, 4)
-                expanded = parse_duration_item(val, prev)
-                durations.extend(expanded)
-
-        except Exception as e:
-            print(f"⚠️ Error parsing duration list: {raw_list} — {e}")
-            durations = [(1, 4)]
-
-        start_index = len(duration_plan)
-
-        if mode == "fixed":
-            seq = itertools.cycle(durations)
-            duration_plan.extend(itertools.islice(seq, count or len(durations)))
-
-        elif mode == "random":
-            count = count or total_notes
-            random_choices = [random.choice(durations) for _ in range(count)]
-            duration_plan.extend(random_choices)
-            print(f"🎲 Random choices from {durations}: {random_choices}")
-
-        elif mode == "rotate":
-            offset = rotation_index % len(durations)
-            rotated = durations[offset:] + durations[:offset]
-            seq = itertools.cycle(rotated)
-            duration_plan.extend(itertools.islice(seq, count or len(durations)))
-            print(f"🔄 Rotation index: {rotation_index}, Rotated: {rotated}")
-
-        print(f"📤 Mode: {mode}, Durations: {durations}, Count: {count}")
-        print(f"📦 Added items {start_index}–{len(duration_plan)-1}: {duration_plan[start_index:]}")
-
-    print(f"✅ Final duration plan ({len(duration_plan)} items): {duration_plan}")
-
-    if len(duration_plan) < total_notes:
-        return list(itertools.islice(itertools.cycle(duration_plan), total_notes))
-    else:
-        return duration_plan[:total_notes]
-
-
-def parse_notehead_sequence(arg_string, total_notes, rotation_index=0):
-    import re
-    import itertools
-    import random
-
-    def expand_notehead_repetitions(item_str):
-        repeat_match = re.match(r'(.+?)x(\d+)$', item_str.strip())
-        if repeat_match:
-            base, count = repeat_match.groups()
-            return [base.strip()] * int(count)
-        else:
-            return [item_str.strip()]
-
-    notehead_plan = []
-    pattern = re.compile(r'(fixed|random|rotate)=\[((?:[^,\[\]]+,?)+)\](?:x(\d+))?')
-
-    arg_string = arg_string.strip()
-    if arg_string.startswith("[") and arg_string.endswith("]"):
-        arg_string = arg_string[1:-1]
-
-    segments = pattern.findall(arg_string)
-    print(f"📦 Raw notehead-mode string: {arg_string}")
-    print(f"🔍 Parsed notehead segments: {segments}")
-
-    for mode, raw_list, count_str in segments:
-        count = int(count_str) if count_str else None
-
-        # Expand inline repetitions like 'diamond x3'
-        raw_items = raw_list.split(',')
-        noteheads = []
-        for item in raw_items:
-            expanded = expand_notehead_repetitions(item)
-            noteheads.extend([n for n in expanded if n in notehead_shapes])
-
-        if not noteheads:
-            continue
-
-        if mode == "fixed":
-            seq = itertools.cycle(noteheads)
-        elif mode == "random":
-            count = count or total_notes
-            random_choices = [random.choice(noteheads) for _ in range(count)]
-            notehead_plan.extend(random_choices)
-            print(f"🎲 Random notehead choices from {noteheads}: {random_choices}")
-            continue
-        elif mode == "rotate":
-            offset = rotation_index % len(noteheads)
-            rotated = noteheads[offset:] + noteheads[:offset]
-            seq = itertools.cycle(rotated)
-        else:
-            continue
+import sys
+import time
 
-        if count:
-            full_block = list(itertools.islice(seq, count * len(noteheads)))
-            notehead_plan.extend(full_block)
-        else:
-            notehead_plan.extend(noteheads)
+from beaming import sample_beam_grouping
+import instrument
+from instrument import traced
+from noteplan import (
+    ARTICULATIONS,
+    NOTEHEADS,
+    PERCUSSION_NOTE_MAP,
+    parse_articulation_sequence,
+    parse_duration_sequence,
+    plan_notes,
+)
+import noteplan
+from patterns import ARTICULATION, DURATION, NOTEHEAD, NOTEHEAD_SHAPES, PatternSyntaxError, compile_pattern
+from rowgen import generate_row
 
-    if len(notehead_plan) < total_notes:
-        return list(itertools.islice(itertools.cycle(notehead_plan), total_notes))
-    else:
-        return notehead_plan[:total_notes]
+logging.basicConfig(level=logging.INFO)
 
 
 all_articulations = [
     'staccato',
 ]
 
-notehead_shapes = ['default', 'cross', 'triangle', 'diamond', 'slash',  'xcircle', 'harmonic', 'harmonic-black']
+notehead_shapes = NOTEHEAD_SHAPES
 
 allowed_durations = [
     (1, 16),   # 16 Note
@@ -356,75 +156,6 @@ allowed_durations = [
 
 ]
 
-import random
-import logging
-
-def generate_row(row_length, max_retries=5):
-    allowed_intervals = {1, 2, 3, 6, 9, 10, 11}
-    pitch_limit_base = 1  # each pitch starts allowed only once
-    total_pitch_classes = 12
-
-    for retry in range(max_retries):
-        row = []
-        previous_intervals = []
-        pitch_counts = {i: 0 for i in range(12)}
-        attempts = 0
-        max_attempts = 10000
-        max_occurrences = pitch_limit_base
-
-        logging.info(f"Attempt {retry+1}: Starting row generation")
-
-        while len(row) < row_length:
-            attempts += 1
-            if attempts > max_attempts:
-                logging.warning("Max attempts reached. Restarting row generation...")
-                break
-
-            # Calculate the current repetition limit (increases every 12 notes)
-            cycle = len(row) // 12
-            max_occurrences = pitch_limit_base + cycle
-
-            # Select pitches that have not yet hit their allowed maximum
-            eligible_pitches = [p for p, count in pitch_counts.items() if count < max_occurrences]
-
-            # Special case: permanently limit the 12th unique pitch (only one occurrence allowed)
-            if len(row) >= 12:
-                unique_first_12 = list(dict.fromkeys(row[:12]))  # preserve order
-                if len(unique_first_12) == 12:
-                    final_unique = unique_first_12[-1]
-                    if final_unique in eligible_pitches and pitch_counts[final_unique] >= 1:
-                        eligible_pitches.remove(final_unique)
-
-            if not eligible_pitches:
-                logging.warning("No eligible pitches found under constraints. Restarting...")
-                break
-
-            next_pitch = random.choice(eligible_pitches)
-
-            if row:
-                interval = (next_pitch - row[-1]) % 12
-                inverse_interval = (row[-1] - next_pitch) % 12
-
-                if previous_intervals and previous_intervals[-1] in (interval, inverse_interval):
-                    continue
-
-                if interval not in allowed_intervals and inverse_interval not in allowed_intervals:
-                    continue
-
-                previous_intervals.append(interval)
-
-            row.append(next_pitch)
-            pitch_counts[next_pitch] += 1
-            logging.info(f"Added pitch {next_pitch} (Count: {pitch_counts[next_pitch]})")
-
-        if len(row) == row_length:
-            return row
-
-    logging.error("Failed to generate a valid row after maximum retries.")
-    return None
-
-
-
 def pitch_class_to_note_name(pitch_class):
     pitch_names = ['c', 'db', 'd', 'eb', 'e', 'f', 'f#', 'g', 'ab', 'a', 'bb', 'b']
     return pitch_names[pitch_class] + "'"
@@ -448,6 +179,7 @@ def transpose_row_to_start(row, pitch_class):
     return [(p + transposition) % 12 for p in row]
 
 
+@traced('abjad')
 def create_abjad_notes(
     row,
     articulations,
@@ -461,99 +193,66 @@ def create_abjad_notes(
     clef='treble',
     pitch_mapping=None,
     attach_markup=True,
-    as_staff=False
+    as_staff=False,
+    note_id_prefix=None
 ):
+    """abjad notes (or a staff) for `row`; the choices are made by noteplan.plan_notes."""
+    plan = plan_notes(
+        row,
+        articulations,
+        notehead_mode,
+        duration_set,
+        notehead_mode_string=notehead_mode_string,
+        rotation_index=rotation_index,
+        original_row=original_row,
+        clef=clef,
+        pitch_mapping=pitch_mapping,
+        attach_markup=attach_markup,
+        note_id_prefix=note_id_prefix,
+        as_staff=as_staff,
+    )
+    return abjad_leaves(plan, as_staff=as_staff)
+
+
+def abjad_leaves(plan, as_staff=False):
+    """Turn a noteplan.StaffPlan into abjad leaves, or an abjad.Staff."""
+    import abjad
 
     notes = []
-    row_source = original_row if original_row is not None else row
-    notehead_index = 0
-    allowed_noteheads = notehead_shapes
-    previous_duration = (1, 4)
-
-    if notehead_mode.startswith('random=['):
-        allowed_noteheads = notehead_mode.split('=')[1].strip('[]').split(',')
-    elif notehead_mode.startswith('fixed=['):
-        allowed_noteheads = notehead_mode.split('=')[1].strip('[]').split(',')
-
-    parsed_noteheads = []
-    if notehead_mode_string:
-        parsed_noteheads = parse_notehead_sequence(notehead_mode_string, len(row), rotation_index=rotation_index)
-
-    for i, pitch in enumerate(row):
-        # Get duration entry
-        entry = duration_set[i % len(duration_set)] if duration_set else (1, 4)
+    for i in range(len(plan)):
+        abjad_duration = abjad.Duration((plan.num[i], plan.den[i]))
 
-        is_rest = False
-        duration = None
-
-        # Explicit form: ('rest', (1, 4))
-        if isinstance(entry, tuple) and len(entry) == 2 and entry[0] == 'rest':
-            duration = entry[1]
-            is_rest = True
+        if plan.rest[i]:
+            notes.append(abjad.Rest(abjad_duration))
+            continue
 
-        # LilyPond style: 'r4'
-        elif isinstance(entry, str) and entry.startswith('r'):
-            denom = int(entry[1:])
-            duration = (1, denom)
-            is_rest = True
+        pitch = plan.pitch[i]
+        note = abjad.Note(plan.note_name(pitch), abjad_duration)
 
-        # Shorthand 'rest' means rest of previous duration
-        elif entry == "rest":
-            duration = previous_duration
-            is_rest = True
+        if plan.notehead[i]:
+            shape = NOTEHEADS.names[plan.notehead[i]]
+            style_command = abjad.LilyPondLiteral(f"\\once \\override NoteHead.style = #' {shape}")
+            abjad.attach(style_command, note)
 
-        # Normal duration tuple or abbreviation
-        else:
-            duration = entry
+        if plan.markup:
+            abjad.attach(abjad.Markup(f'{pitch}'), note)
 
-        abjad_duration = abjad.Duration(duration)
-        previous_duration = duration
+        # Stable id for SVG output: LilyPond wraps the notehead in <g id="...">
+        if plan.id_prefix:
+            id_command = abjad.LilyPondLiteral(
+                f"\\once \\override NoteHead.output-attributes = #'((id . \"{plan.id_prefix}-{i:02d}\"))"
+            )
+            abjad.attach(id_command, note)
 
-        if is_rest:
-            note = abjad.Rest(abjad_duration)
-        else:
-            note_name = pitch_mapping.get(pitch % 12, 'c') if pitch_mapping else pitch_class_to_note_name(pitch)
-            note = abjad.Note(note_name, abjad_duration)
-
-            # Notehead
-            if parsed_noteheads:
-                chosen_shape = parsed_noteheads[i % len(parsed_noteheads)]
-            elif notehead_mode.startswith('random=['):
-                chosen_shape = random.choice(allowed_noteheads)
-            elif notehead_mode == 'random':
-                chosen_shape = random.choice(notehead_shapes)
-            elif notehead_mode == 'serial':
-                if original_row and pitch in original_row:
-                    original_index = original_row.index(pitch)
-                    chosen_shape = notehead_shapes[original_index % len(notehead_shapes)]
-                else:
-                    chosen_shape = notehead_shapes[i % len(notehead_shapes)]
-            elif notehead_mode.startswith('fixed=['):
-                chosen_shape = allowed_noteheads[notehead_index % len(allowed_noteheads)]
-                notehead_index += 1
-            elif notehead_mode.startswith('fixed='):
-                chosen_shape = notehead_mode.split('=')[1]
-            else:
-                chosen_shape = 'default'
-
-            if chosen_shape != 'default':
-                style_command = abjad.LilyPondLiteral(f"\\once \\override NoteHead.style = #' {chosen_shape}")
-                abjad.attach(style_command, note)
-
-            if attach_markup:
-                abjad.attach(abjad.Markup(f'{pitch}'), note)
-                print();
-        if articulations and i < len(articulations) and not is_rest:
-            articulation = articulations[i]
-            if articulation not in ("none", "\\none"):
-                abjad.attach(abjad.Articulation(articulation), note)
+        if plan.articulation[i]:
+            abjad.attach(abjad.Articulation(ARTICULATIONS.names[plan.articulation[i]]), note)
 
         notes.append(note)
 
     if as_staff:
         staff = abjad.Staff(notes)
-        if clef:
-            abjad.attach(abjad.Clef(clef), staff[0])
+        if plan.clef:
+            abjad.attach(abjad.Clef(plan.clef), staff[0])
         return staff
     else:
         return notes
@@ -574,48 +273,56 @@ def add_rotation_staves(
     clef='treble',
     pitch_mapping=None,
     fixed_duration=(1, 4),
+    note_id_prefix=None,
+    seed=None,
+    workers=1,
+    plans=None,
 ):
-    truncated_row = row[:row_length]
-
-    for i in range(row_length):
-        rotation = rotate_row(truncated_row, i)
-
-        transposed = transpose_row_to_start(rotation, truncated_row[0])
-
-        # ⬇️ NEW: regenerate articulations per-rotation
-        articulations_for_rotation = parse_articulation_sequence(
-                articulation_mode_string, row_length, rotation_index=i
-        ) if articulation_mode_string else []
-
-        durations_for_rotation = parse_duration_sequence(
-            duration_mode_string, row_length, rotation_index=i
-        ) if duration_mode_string else None
-
-
-        staff = create_abjad_notes(
-            transposed,
-            articulations_for_rotation,
-            notehead_mode,
-            duration_mode,
-            durations_for_rotation,
-            duration_mode_string=duration_mode_string,
-            notehead_mode_string=notehead_mode_string,
-            original_row=row,
-            clef=clef,
-            pitch_mapping=pitch_mapping,
-            as_staff=True
-        )
-
+    """
+    Append one staff per rotation of `row`.  The rotations are planned by
+    noteplan (each from its own RNG stream, on `workers` processes) and only
+    turned into abjad staves here, in rotation order.  Pass `plans`
+    (noteplan.plan_rotations) to staff rotations planned for another staff.
+    """
+    staves = noteplan.plan_rotation_staves(
+        row,
+        articulation_mode_string,
+        duration_mode_string,
+        notehead_mode,
+        notehead_mode_string,
+        row_length,
+        clef=clef,
+        pitch_mapping=pitch_mapping,
+        fixed_duration=fixed_duration,
+        note_id_prefix=note_id_prefix,
+        seed=seed,
+        workers=workers,
+        plans=plans,
+    )
+
+    for plan in staves:
+        staff = abjad_leaves(plan, as_staff=True)
         apply_time_signature(staff, row_length, fixed_duration[1])
-        apply_dynamic_beaming(staff, row_length, max_groups=5)
+        apply_plan_beaming(staff, plan)
         apply_overrides(staff)
 
         score.append(staff)
 
 
+def apply_plan_beaming(staff, plan):
+    """Beam a staff by the groups already drawn in its plan (see noteplan.plan_beaming)."""
+    import abjad
+
+    start = 0
+    for i in range(1, len(plan) + 1):
+        if i == len(plan) or plan.beam[i] != plan.beam[start]:
+            if plan.beam[start] != noteplan.NO_BEAM:
+                abjad.beam(staff[start:i])
+            start = i
 
 
-def apply_dynamic_beaming(staff, row_length, min_groups=3, max_groups=3):
+@traced('beaming')
+def apply_dynamic_beaming(staff, row_length, min_groups=3, max_groups=3, rng=None):
     """
     Apply dynamic beaming to a given staff using unique groupings.
     Each grouping is different for each staff or rotation.
@@ -625,26 +332,14 @@ def apply_dynamic_beaming(staff, row_length, min_groups=3, max_groups=3):
         row_length (int): The number of notes in the row.
         min_groups (int): Minimum number of groups required (default is 3).
         max_groups (int): Maximum number of groups allowed (default is 3).
+        rng (random.Random): Optional RNG for reproducible groupings.
     """
-    # Generate all valid groupings for the row length
-    valid_groupings = set()
-
-    for group_count in range(min_groups, max_groups + 1):  # Allow groupings with at least 'min_groups'
-        for split_points in permutations(range(1, row_length), group_count - 1):
-            group_sizes = [split_points[0]] + [split_points[i] - split_points[i - 1] for i in range(1, len(split_points))] + [row_length - split_points[-1]]
+    import abjad
 
-            # Check all group sizes are valid (minimum of 2 notes per group)
-            if all(size >= 2 for size in group_sizes):
-                valid_groupings.add(tuple(group_sizes))
+    # Draw one grouping uniformly from all compositions with groups of >= 2 notes
+    selected_grouping = sample_beam_grouping(row_length, min_groups, max_groups, rng=rng)
 
-    # Convert to a sorted list for deterministic results if needed
-    valid_groupings = list(valid_groupings)
-    random.shuffle(valid_groupings)  # Shuffle to ensure variety
-
-    # Pick a unique grouping for this staff
-    if valid_groupings:
-        selected_grouping = valid_groupings.pop(0)
-    else:
+    if selected_grouping is None:
         selected_grouping = (row_length,)  # Fallback if nothing valid is found
 
     # Apply the beaming based on the selected grouping
@@ -656,7 +351,8 @@ def apply_dynamic_beaming(staff, row_length, min_groups=3, max_groups=3):
 
 
 def apply_overrides(staff):
-    print("overrides applied")
+    import abjad
+
     abjad.override(staff).BarLine.stencil = False
     #abjad.override(staff).Stem.stencil = False
     #abjad.override(staff).Beam.stencil = False
@@ -677,6 +373,8 @@ def apply_time_signature(staff, row_length, fixed_duration):
     Dynamically sets the time signature based on the row length and fixed duration.
     The time signature is calculated as (row_length / fixed_duration).
     """
+    import abjad
+
     time_signature = (row_length, fixed_duration)
 
     # Attach the time signature to the first note in the staff
@@ -688,10 +386,13 @@ def apply_time_signature(staff, row_length, fixed_duration):
 
 
 
-def add_serial_staves(score, row, articulations, notehead_mode, duration_mode, duration_set):
-    prime_staff = create_abjad_notes(row, articulations, notehead_mode, duration_mode, duration_set, as_staff=True)
-    inversion_staff = create_abjad_notes(invert_row(row), articulations, notehead_mode, duration_mode, duration_set, as_staff=True)
-    retrograde_inversion_staff = create_abjad_notes(retrograde_inversion(row), articulations, notehead_mode, duration_mode, duration_set, as_staff=True)
+def add_serial_staves(score, row, articulations, notehead_mode, duration_mode, duration_set, note_id_prefix=None):
+    def prefix(form):
+        return f"{note_id_prefix}-{form}" if note_id_prefix else None
+
+    prime_staff = create_abjad_notes(row, articulations, notehead_mode, duration_mode, duration_set, as_staff=True, note_id_prefix=prefix('p'))
+    inversion_staff = create_abjad_notes(invert_row(row), articulations, notehead_mode, duration_mode, duration_set, as_staff=True, note_id_prefix=prefix('i'))
+    retrograde_inversion_staff = create_abjad_notes(retrograde_inversion(row), articulations, notehead_mode, duration_mode, duration_set, as_staff=True, note_id_prefix=prefix('ri'))
 
     for staff in [prime_staff, inversion_staff, retrograde_inversion_staff]:
         apply_dynamic_beaming(staff, len(staff), max_groups=5)
@@ -700,6 +401,8 @@ def add_serial_staves(score, row, articulations, notehead_mode, duration_mode, d
 
 
 def add_triad_staff(score, row, notehead_mode, duration_mode, duration_set):
+    import abjad
+
     row_length = len(row)
     triad_notes = []
     prime_tetrachords = [row[i:i + 4] for i in range(0, row_length, 3)]
@@ -837,83 +540,11 @@ def compare_interval_vectors(vector1, vector2):
 
 
 
-def generate_filename(row_length, notehead_mode, duration_mode, row_mode, output_dir="o"):
-    """Generate a shorter, human-readable filename and save files in a specific directory."""
-
-    # Ensure the output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # Map modes to single-letter codes
-    mode_map = {'random': 'R', 'serial': 'S', 'fixed': 'F'}
-
-    # Get the abbreviations for each mode
-    notehead_abbr = mode_map.get(notehead_mode, notehead_mode[0].upper())
-    duration_abbr = mode_map.get(duration_mode, duration_mode[0].upper())
-    rowmode_abbr = mode_map.get(row_mode, row_mode[0].upper())
-
-    # Generate the filename
-    date_str = time.strftime('%Y%m%d')
-    filename = f"{date_str}_l{row_length}_nh-{notehead_abbr}_d-{duration_abbr}_rm-{rowmode_abbr}"
-
-    # Return the full path of the file within the output directory
-    return os.path.join(output_dir, filename)
-
-def main():
-    if len(sys.argv) < 6:
-        print("Usage: python noteheads.py <row_length> --noteheads <random|standard|serial|fixed=X|random=[...]|fixed=[...] > "
-              "--duration <random|serial|fixed=X|fixed=[...]|random=[...]> --row-mode <random|fixed> "
-              "--output <rotations=percussion|rotations=pitches|rotations=both|serial>")
-        sys.exit(1)
-
-    row_length = int(sys.argv[1])
-    notehead_mode = sys.argv[3]
-    duration_mode = sys.argv[5]
-
-    # Default row_mode
-    row_mode = None
-    for i, arg in enumerate(sys.argv):
-        if arg == "--row-mode" and i + 1 < len(sys.argv):
-            row_mode = sys.argv[i + 1]
-
-    if row_mode not in ['random', 'fixed']:
-        print("Invalid row mode. Use 'random' or 'fixed'.")
-        sys.exit(1)
-
-    articulation_mode_string = None
-    duration_mode_string = None
-    notehead_mode_string = None
-
-    for i, arg in enumerate(sys.argv):
-        if arg == "--articulation-mode" and i + 1 < len(sys.argv):
-            articulation_mode_string = sys.argv[i + 1]
-        elif arg == "--duration-mode" and i + 1 < len(sys.argv):
-            duration_mode_string = sys.argv[i + 1]
-        elif arg == "--notehead-mode" and i + 1 < len(sys.argv):
-            notehead_mode_string = sys.argv[i + 1]
-
-    print(f"🎯 Using articulation mode string: {articulation_mode_string}")
-    print(f"⏱️ Using duration mode string: {duration_mode_string}")
-    print(f"🎯 Using notehead mode string: {notehead_mode_string}")
+FIXED_TEST_ROW = [4, 5, 6, 1, 0, 8, 9, 6]
 
-    durations_for_rotation = None
-    if duration_mode_string:
-        durations_for_rotation = parse_duration_sequence(duration_mode_string, row_length)
-
-    rotation_output_mode = None
-    for i, arg in enumerate(sys.argv):
-        if arg == "--output" and i + 1 < len(sys.argv):
-            next_arg = sys.argv[i + 1]
-            if next_arg.startswith("rotations="):
-                rotation_value = next_arg.split("rotations=")[1]
-                if rotation_value in ['percussion', 'pitches', 'both']:
-                    rotation_output_mode = rotation_value
-            elif next_arg == "serial":
-                rotation_output_mode = 'serial'
-
-    if rotation_output_mode is None:
-        rotation_output_mode = 'pitches'
 
+def normalize_notehead_mode(notehead_mode):
+    """Drop unknown shapes from 'random=[...]' / 'fixed=[...]' notehead modes."""
     if notehead_mode.startswith('random='):
         notehead_list = notehead_mode.split('=')[1].strip('[]').split(',')
         notehead_list = [n.strip() for n in notehead_list if n.strip() in notehead_shapes]
@@ -929,20 +560,68 @@ def main():
             print("Invalid fixed notehead list specified. Using default noteheads.")
             notehead_list = notehead_shapes
         notehead_mode = f"fixed=[{','.join(notehead_list)}]"
-#[4, 3, 7, 5, 11, 0, 9, 6, 10, 8, 1, 2]
-    row = generate_row(row_length) if row_mode == 'random' else [4,5,6,1,0,8,9,6]
 
-    if row is None:
-        logging.error("Row generation failed. Exiting...")
-        return
+    return notehead_mode
+
+
+@traced('row')
+def resolve_row(row_length, row_mode, seed=None):
+    """Generate (row_mode='random') or look up (row_mode='fixed') the source row."""
+    #[4, 3, 7, 5, 11, 0, 9, 6, 10, 8, 1, 2]
+    if row_mode == 'random':
+        return generate_row(row_length, seed=seed)
+    return list(FIXED_TEST_ROW)
+
+
+@traced('build_score')
+def build_score(
+    row,
+    row_length,
+    notehead_mode,
+    duration_mode,
+    articulation_mode_string=None,
+    duration_mode_string=None,
+    notehead_mode_string=None,
+    output_mode='pitches',
+    seed=None,
+    note_ids=False,
+    workers=1,
+):
+    """
+    Build the abjad.Score for one parameter set.
+
+    `output_mode` is one of 'pitches', 'percussion', 'both' or 'serial'.
+    When `seed` is given the global RNG is reseeded first, so random
+    noteheads, durations and beaming are reproducible too.
+    With `note_ids`, every note carries a stable note-* id in SVG output.
+    Rotation staves are planned on `workers` processes (0 = every core).
+    """
+    import abjad
+
+    if seed is not None:
+        random.seed(seed)
+
+    durations_for_rotation = None
+    if duration_mode_string:
+        durations_for_rotation = parse_duration_sequence(duration_mode_string, row_length)
 
     score = abjad.Score([])
 
-    if rotation_output_mode == 'serial':
-        add_serial_staves(score, row, articulations, notehead_mode, duration_mode, duration_set)
+    if output_mode == 'serial':
+        articulations = parse_articulation_sequence(articulation_mode_string, len(row)) if articulation_mode_string else []
+        duration_set = durations_for_rotation or [(1, 4)]
+        add_serial_staves(score, row, articulations, notehead_mode, duration_mode, duration_set,
+                          note_id_prefix='note-serial' if note_ids else None)
         add_triad_staff(score, row, notehead_mode, duration_mode, duration_set)
+        return score
+
+    # Planned once and staffed twice, so pitch and percussion staves line up
+    rotation_plans = noteplan.plan_rotations(
+        row, articulation_mode_string, duration_mode_string, notehead_mode, notehead_mode_string,
+        row_length, seed=seed, workers=workers,
+    )
 
-    if rotation_output_mode in ['pitches', 'both']:
+    if output_mode in ['pitches', 'both']:
         add_rotation_staves(
             score,
             row,
@@ -952,26 +631,12 @@ def main():
             notehead_mode_string,
             duration_mode,
             durations_for_rotation,
-            row_length
+            row_length,
+            note_id_prefix='note-pitch' if note_ids else None,
+            plans=rotation_plans,
         )
 
-    if rotation_output_mode in ['percussion', 'both']:
-        percussion_note_map = {
-            0:  "g",    # bass drum
-            1:  "d'",    # snare drum
-            2:  "f'",    # high tom
-            3:  "e'",    # mid tom
-            4:  "b",    # floor tom
-            5:  "f'",    # high tom (repeat)
-            6:  "e'",    # mid tom (repeat)
-            7:  "b",    # floor tom (repeat)
-            8:  "g'",   # ride cymbal
-            9:  "b'",   # crash cymbal
-            10: "f'",    # high tom (repeat)
-            11: "e'"     # mid tom (repeat)
-        }
-
-
+    if output_mode in ['percussion', 'both']:
         add_rotation_staves(
             score,
             row,
@@ -983,14 +648,218 @@ def main():
             durations_for_rotation,
             row_length,
             clef='percussion',
-            pitch_mapping=percussion_note_map,
+            pitch_mapping=PERCUSSION_NOTE_MAP,
             fixed_duration=(1, 8),
+            note_id_prefix='note-perc' if note_ids else None,
+            plans=rotation_plans,
         )
 
-    filename = generate_filename(row_length, notehead_mode, duration_mode, row_mode)
-    abjad.persist.as_ly(score, f'{filename}.ly')
-    abjad.persist.as_pdf(score, f'{filename}.pdf')
-    abjad.show(score)
+    return score
+
+
+def generate_filename(row_length, notehead_mode, duration_mode, row_mode, output_dir="o"):
+    """Generate a shorter, human-readable filename and save files in a specific directory."""
+
+    # Ensure the output directory exists
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Map modes to single-letter codes
+    mode_map = {'random': 'R', 'serial': 'S', 'fixed': 'F'}
+
+    # Get the abbreviations for each mode
+    notehead_abbr = mode_map.get(notehead_mode, notehead_mode[0].upper())
+    duration_abbr = mode_map.get(duration_mode, duration_mode[0].upper())
+    rowmode_abbr = mode_map.get(row_mode, row_mode[0].upper())
+
+    # Generate the filename
+    date_str = time.strftime('%Y%m%d')
+    filename = f"{date_str}_l{row_length}_nh-{notehead_abbr}_d-{duration_abbr}_rm-{rowmode_abbr}"
+
+    # Return the full path of the file within the output directory
+    return os.path.join(output_dir, filename)
+
+OUTPUT_CHOICES = ['rotations=pitches', 'rotations=percussion', 'rotations=both', 'serial']
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Generate rotation and serial staves from a constrained twelve-tone row.",
+    )
+    parser.add_argument('row_length', type=int, help="Number of notes in the row")
+    parser.add_argument('--noteheads', default='standard',
+                        help="random | standard | serial | fixed=X | random=[...] | fixed=[...]")
+    parser.add_argument('--duration', default='fixed',
+                        help="random | serial | fixed=X | fixed=[...] | random=[...]")
+    parser.add_argument('--row-mode', choices=['random', 'fixed'], default='random')
+    parser.add_argument('--articulation-mode', help="Articulation pattern (see patterns.py)")
+    parser.add_argument('--duration-mode', help="Duration pattern (see patterns.py)")
+    parser.add_argument('--notehead-mode', help="Notehead pattern (see patterns.py)")
+    parser.add_argument('--output', choices=OUTPUT_CHOICES, default='rotations=pitches')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes for planning rotation staves (0 = every core)")
+    parser.add_argument('--cache-dir', default=None, help="Content-addressed render cache directory")
+    parser.add_argument('--svg', action='store_true', help="Render a plain SVG fragment instead of a PDF")
+    parser.add_argument('--no-show', action='store_true', help="Write the PDF without opening it")
+    parser.add_argument('--engine', choices=['text', 'abjad'], default='text')
+    parser.add_argument('--plan-only', action='store_true',
+                        help="Print the resolved plan as JSON without abjad or LilyPond")
+    parser.add_argument('--trace', nargs='?', const='', default=None, metavar='PATH',
+                        help="Write a JSON trace of stage timings")
+    parser.add_argument('--trace-memory', action='store_true')
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--quiet', action='store_true', help="Log warnings and errors only")
+    return parser
+
+
+def plan_json(row, row_length, output_mode, seed, staves):
+    """--plan-only document: the row and every staff plan."""
+    return {
+        'row': row,
+        'row_length': row_length,
+        'output_mode': output_mode,
+        'seed': seed,
+        'staves': [plan.to_json() for plan in staves],
+    }
+
+
+def generate(args, parser):
+    """Build and render one score; returns the output path stem (None for --plan-only)."""
+    logging.info(f"🎯 Using articulation mode string: {args.articulation_mode}")
+    logging.info(f"⏱️ Using duration mode string: {args.duration_mode}")
+    logging.info(f"🎯 Using notehead mode string: {args.notehead_mode}")
+
+    # Parse every mode string once up front so syntax errors stop the run early
+    for mode_string, kind in (
+        (args.articulation_mode, ARTICULATION),
+        (args.duration_mode, DURATION),
+        (args.notehead_mode, NOTEHEAD),
+    ):
+        if mode_string:
+            try:
+                compile_pattern(mode_string, kind)
+            except PatternSyntaxError as e:
+                parser.error(f"--{kind}-mode: {e}")
+
+    row_length = args.row_length
+    output_mode = args.output.split('=', 1)[-1]
+    notehead_mode = normalize_notehead_mode(args.noteheads)
+    duration_mode = args.duration
+
+    row = resolve_row(row_length, args.row_mode, seed=args.seed)
+
+    if row is None:
+        logging.error("Row generation failed. Exiting...")
+        sys.exit(1)
+
+    score_options = dict(
+        articulation_mode_string=args.articulation_mode,
+        duration_mode_string=args.duration_mode,
+        notehead_mode_string=args.notehead_mode,
+        output_mode=output_mode,
+        seed=args.seed,
+        note_ids=args.svg,
+        workers=args.workers,
+    )
+
+    if args.plan_only:
+        staves = noteplan.plan_score(row, row_length, notehead_mode, duration_mode, **score_options)
+        json.dump(plan_json(row, row_length, output_mode, args.seed, staves), sys.stdout)
+        sys.stdout.write('\n')
+        return None
+
+    # Rendering helpers pull in subprocess/xml machinery; --plan-only never needs them
+    import batch
+    import svg_export
+    from render_cache import RenderCache
+
+    filename = generate_filename(row_length, notehead_mode, duration_mode, args.row_mode)
+
+    if args.engine == 'text':
+        score = None
+        staves = noteplan.plan_score(row, row_length, notehead_mode, duration_mode, **score_options)
+        with instrument.span('persist.as_ly'):
+            noteplan.write_ly(staves, f'{filename}.ly')
+    else:
+        import abjad
+        score = build_score(row, row_length, notehead_mode, duration_mode, **score_options)
+        with instrument.span('persist.as_ly'):
+            abjad.persist.as_ly(score, f'{filename}.ly')
+
+    output_format = 'svg' if args.svg else 'pdf'
+
+    @traced('lilypond')
+    def render():
+        if args.svg:
+            svg_export.render_fragment(f'{filename}.ly', f'{filename}.svg')
+        elif score is None:
+            batch.compile_ly(f'{filename}.ly', ['pdf'])
+        else:
+            abjad.persist.as_pdf(score, f'{filename}.pdf')
+
+    if args.cache_dir:
+        cache = RenderCache(args.cache_dir)
+        key = cache.key_for_file(f'{filename}.ly', engine=args.engine)
+        tagged = f"{filename}_{key[:8]}"
+        os.replace(f'{filename}.ly', f'{tagged}.ly')
+        filename = tagged
+
+        if cache.materialize(key, [output_format], filename) is None:
+            render()
+            cache.store(key, {'ly': f'{filename}.ly', output_format: f'{filename}.{output_format}'}, meta={'row': row})
+        else:
+            logging.info(f"Render cache hit {key[:8]}")
+        print(f"{filename}.{output_format}")
+        return filename
+
+    render()
+    if args.svg or args.no_show:
+        print(f"{filename}.{output_format}")
+    elif score is None:
+        print(f"{filename}.{output_format}")
+        show_pdf(f"{filename}.pdf")
+    else:
+        with instrument.span('show'):
+            abjad.show(score)
+    return filename
+
+
+def show_pdf(path):
+    """Open a PDF in the system viewer, as abjad.show does for the abjad engine."""
+    import subprocess
+
+    if os.name == 'nt':
+        os.startfile(path)
+        return
+    command = ['open' if sys.platform == 'darwin' else 'xdg-open', path]
+    try:
+        subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        logging.warning(f"Could not open {path}: {e}")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.quiet or args.plan_only:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.trace is None and not (args.trace_memory or args.profile):
+        generate(args, parser)
+        return
+
+    instrument.start(memory=args.trace_memory, profile=args.profile,
+                     meta={'argv': sys.argv[1:] if argv is None else list(argv)})
+    filename = None
+    try:
+        filename = generate(args, parser)
+    finally:
+        tracer = instrument.stop()
+        trace_path = args.trace or f"{filename or 'noteheads'}.trace.json"
+        tracer.write(trace_path)
+        logging.info(f"Stage timings (trace: {trace_path}):\n{tracer.report()}")
 
 
 if __name__ == "__main__":
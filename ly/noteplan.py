@@ -0,0 +1,737 @@
+# Note Plans and Direct LilyPond Output
+#
+# A note plan is the flat, per-note description of one staff that
+# noteheads.py used to express directly as abjad objects: pitch, duration,
+# notehead, articulation, rest flag and beam group, plus a few staff-level
+# settings (clef, time signature, note ids, markup).  Columns are stored in
+# compact `array` buffers, so a 96 x 96 rotation score is a few dozen
+# kilobytes instead of an abjad object graph.
+#
+# The plan builders make exactly the decisions (and the same random draws,
+# in the same order) as create_abjad_notes / add_rotation_staves /
+# build_score, so for a given seed both engines write the same music:
+#
+#   plan_score(...)  →  format_score(staves)  →  .ly text      (no abjad)
+#   plan_notes(...)  →  noteheads.abjad_leaves(plan)           (abjad path)
+#
+# Every rotation draws from its own RNG stream, derived from the seed and
+# the rotation number, so rotations are independent work units: with
+# workers > 1 they are planned on a process pool and merged in rotation
+# order, and the music is the same for any worker count.  A rotation is
+# planned once (plan_rotation) and then staffed per output (rotation_staff):
+# in rotations=both the pitch and percussion staves share their rhythms,
+# noteheads, articulations and beams, differing only in note names, clef,
+# time signature and note ids.
+#
+# The emitted source mirrors abjad's layout (one leaf per line, overrides
+# before the leaf, articulations / markup / beams after it), so diffs
+# against abjad-written files stay readable.
+#
+# Usage:
+#   staves = plan_score(row, 12, 'standard', 'fixed', output_mode='both', seed=7, workers=16)
+#   write_ly(staves, 'o/score.ly')
+
+import array
+import copy
+import glob
+import itertools
+import math
+import os
+import random
+from fractions import Fraction
+
+from beaming import sample_beam_grouping
+from instrument import traced
+from patterns import ARTICULATION, DURATION, NOTEHEAD, NOTEHEAD_SHAPES, compile_pattern
+
+LILYPOND_VERSION = '2.24.0'
+INDENT = '    '
+
+# Pitch-class spellings as noteheads.pitch_class_to_note_name gives them
+# (c, db, d, eb, ...), in the english note names abjad writes.
+PITCH_NAMES = tuple(name + "'" for name in ('c', 'df', 'd', 'ef', 'e', 'f', 'fs', 'g', 'af', 'a', 'bf', 'b'))
+DEFAULT_DURATION = (1, 4)
+NO_BEAM = -1
+
+PERCUSSION_NOTE_MAP = {
+    0:  "g",    # bass drum
+    1:  "d'",    # snare drum
+    2:  "f'",    # high tom
+    3:  "e'",    # mid tom
+    4:  "b",    # floor tom
+    5:  "f'",    # high tom (repeat)
+    6:  "e'",    # mid tom (repeat)
+    7:  "b",    # floor tom (repeat)
+    8:  "g'",   # ride cymbal
+    9:  "b'",   # crash cymbal
+    10: "f'",    # high tom (repeat)
+    11: "e'"     # mid tom (repeat)
+}
+
+
+class Codes:
+    """Interned names ↔ small integer codes; code 0 is `default`."""
+
+    def __init__(self, default, names=()):
+        self.names = [default]
+        self.index = {default: 0}
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.index.get(name)
+        if code is None:
+            code = self.index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+NOTEHEADS = Codes('default', NOTEHEAD_SHAPES)
+ARTICULATIONS = Codes(None)
+
+
+class StaffPlan:
+    """One staff: per-note columns plus staff-level settings."""
+
+    __slots__ = (
+        'name', 'pitch', 'num', 'den', 'notehead', 'articulation', 'rest', 'beam', 'chords',
+        'note_names', 'clef', 'time_signature', 'markup', 'id_prefix', 'overrides',
+    )
+
+    def __init__(self, note_names=PITCH_NAMES, clef=None, markup=True, id_prefix=None):
+        self.name = None  # e.g. 'pitch-r03', 'perc-r03', 'serial-ri', 'triad'
+        self.pitch = array.array('b')
+        self.num = array.array('H')
+        self.den = array.array('H')
+        self.notehead = array.array('B')
+        self.articulation = array.array('B')
+        self.rest = array.array('B')
+        self.beam = array.array('h')
+        self.chords = None  # {index: (pitch, ...)} for chord leaves
+        self.note_names = note_names
+        self.clef = clef
+        self.time_signature = None
+        self.markup = markup
+        self.id_prefix = id_prefix
+        self.overrides = False
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def append(self, pitch, duration, notehead=0, articulation=0, rest=False):
+        self.pitch.append(pitch)
+        self.num.append(duration[0])
+        self.den.append(duration[1])
+        self.notehead.append(notehead)
+        self.articulation.append(articulation)
+        self.rest.append(rest)
+        self.beam.append(NO_BEAM)
+
+    def note_name(self, pitch):
+        return self.note_names[pitch % 12]
+
+    def restaffed(self, **settings):
+        """Copy with other staff-level settings; the note columns are shared, not copied."""
+        other = copy.copy(self)
+        for key, value in settings.items():
+            setattr(other, key, value)
+        return other
+
+    def to_json(self):
+        """Plain-data form (for inspection and tests of the plan itself)."""
+        return {
+            'name': self.name,
+            'clef': self.clef,
+            'time_signature': self.time_signature,
+            'id_prefix': self.id_prefix,
+            'markup': self.markup,
+            'overrides': self.overrides,
+            'notes': [
+                {
+                    'pitch': None if self.rest[i] else self.pitch[i],
+                    'chord': list(self.chords[i]) if self.chords and i in self.chords else None,
+                    'duration': [self.num[i], self.den[i]],
+                    'notehead': NOTEHEADS.names[self.notehead[i]],
+                    'articulation': ARTICULATIONS.names[self.articulation[i]],
+                    'rest': bool(self.rest[i]),
+                    'beam': self.beam[i],
+                }
+                for i in range(len(self))
+            ],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Pattern plans (also exported by noteheads.py)
+# ---------------------------------------------------------------------------
+
+@traced('patterns')
+def parse_articulation_sequence(arg_string, total_notes, rotation_index=0, rng=None):
+    """Articulation plan for one rotation (see patterns.py for the syntax)."""
+    return compile_pattern(arg_string, ARTICULATION).plan(total_notes, rotation_index, rng=rng)
+
+
+@traced('patterns')
+def parse_duration_sequence(arg_string, total_notes, rotation_index=0, rng=None):
+    """Duration plan for one rotation (see patterns.py for the syntax)."""
+    return compile_pattern(arg_string, DURATION).plan(total_notes, rotation_index, rng=rng)
+
+
+@traced('patterns')
+def parse_notehead_sequence(arg_string, total_notes, rotation_index=0, rng=None):
+    """Notehead plan for one rotation (see patterns.py for the syntax)."""
+    return compile_pattern(arg_string, NOTEHEAD).plan(total_notes, rotation_index, rng=rng)
+
+
+# ---------------------------------------------------------------------------
+# Plan builders
+# ---------------------------------------------------------------------------
+
+def staff_note_names(pitch_mapping=None):
+    """Note name per pitch class; unmapped pitch classes fall back to c."""
+    if pitch_mapping:
+        return tuple(pitch_mapping.get(pc, 'c') for pc in range(12))
+    return PITCH_NAMES
+
+
+def _list_mode_values(notehead_mode):
+    return notehead_mode.split('=')[1].strip('[]').split(',')
+
+
+@traced('plan')
+def plan_notes(
+    row,
+    articulations,
+    notehead_mode,
+    duration_set,
+    notehead_mode_string=None,
+    rotation_index=0,
+    original_row=None,
+    clef='treble',
+    pitch_mapping=None,
+    attach_markup=True,
+    note_id_prefix=None,
+    as_staff=True,
+    rng=None,
+):
+    """
+    Plan one staff of `row`; the decisions of noteheads.create_abjad_notes.
+
+    `pitch_mapping` maps pitch classes to note names (percussion staves);
+    unmapped pitch classes fall back to c.  The clef is only set when
+    `as_staff` is true, as create_abjad_notes only attaches it to staves.
+    Random choices come from `rng` (default: the global random module).
+    """
+    rng = rng or random
+    note_names = staff_note_names(pitch_mapping)
+    plan = StaffPlan(note_names, clef=clef if as_staff else None, markup=attach_markup, id_prefix=note_id_prefix)
+
+    allowed_noteheads = NOTEHEAD_SHAPES
+    if notehead_mode.startswith('random=[') or notehead_mode.startswith('fixed=['):
+        allowed_noteheads = _list_mode_values(notehead_mode)
+
+    parsed_noteheads = []
+    if notehead_mode_string:
+        parsed_noteheads = parse_notehead_sequence(notehead_mode_string, len(row), rotation_index=rotation_index,
+                                                   rng=rng)
+
+    notehead_index = 0
+    previous_duration = DEFAULT_DURATION
+    for i, pitch in enumerate(row):
+        entry = duration_set[i % len(duration_set)] if duration_set else DEFAULT_DURATION
+
+        is_rest = False
+        if isinstance(entry, tuple) and len(entry) == 2 and entry[0] == 'rest':
+            duration = entry[1]
+            is_rest = True
+        elif isinstance(entry, str) and entry.startswith('r'):
+            duration = (1, int(entry[1:]))
+            is_rest = True
+        elif entry == "rest":
+            duration = previous_duration
+            is_rest = True
+        else:
+            duration = entry
+        previous_duration = duration
+
+        if is_rest:
+            plan.append(pitch, duration, rest=True)
+            continue
+
+        if parsed_noteheads:
+            chosen_shape = parsed_noteheads[i % len(parsed_noteheads)]
+        elif notehead_mode.startswith('random=['):
+            chosen_shape = rng.choice(allowed_noteheads)
+        elif notehead_mode == 'random':
+            chosen_shape = rng.choice(NOTEHEAD_SHAPES)
+        elif notehead_mode == 'serial':
+            if original_row and pitch in original_row:
+                chosen_shape = NOTEHEAD_SHAPES[original_row.index(pitch) % len(NOTEHEAD_SHAPES)]
+            else:
+                chosen_shape = NOTEHEAD_SHAPES[i % len(NOTEHEAD_SHAPES)]
+        elif notehead_mode.startswith('fixed=['):
+            chosen_shape = allowed_noteheads[notehead_index % len(allowed_noteheads)]
+            notehead_index += 1
+        elif notehead_mode.startswith('fixed='):
+            chosen_shape = notehead_mode.split('=')[1]
+        else:
+            chosen_shape = 'default'
+
+        articulation = 0
+        if articulations and i < len(articulations) and articulations[i] not in ("none", "\\none"):
+            articulation = ARTICULATIONS.code(articulations[i])
+
+        plan.append(pitch, duration, NOTEHEADS.code(chosen_shape), articulation)
+    return plan
+
+
+@traced('beaming')
+def plan_beaming(plan, row_length, min_groups=3, max_groups=3, rng=None):
+    """Beam groups for a plan; the draw noteheads.apply_dynamic_beaming makes."""
+    grouping = sample_beam_grouping(row_length, min_groups, max_groups, rng=rng) or (row_length,)
+    start = 0
+    for group, size in enumerate(grouping):
+        for i in range(start, min(start + size, len(plan))):
+            plan.beam[i] = group
+        start += size
+    return plan
+
+
+def plan_rotation(
+    row,
+    index,
+    articulation_mode_string,
+    duration_mode_string,
+    notehead_mode,
+    notehead_mode_string,
+    row_length,
+    rng=None,
+):
+    """
+    The music of rotation `index`, independent of how it is staffed: pitches,
+    durations, noteheads, articulations and beaming.  rotation_staff turns it
+    into a pitch, percussion or any other staff without planning it again.
+    """
+    truncated_row = row[:row_length]
+    rotation = truncated_row[index:] + truncated_row[:index]
+    transposition = (truncated_row[0] - rotation[0]) % 12
+    transposed = [(p + transposition) % 12 for p in rotation]
+
+    articulations = parse_articulation_sequence(
+        articulation_mode_string, row_length, rotation_index=index, rng=rng
+    ) if articulation_mode_string else []
+    durations = parse_duration_sequence(
+        duration_mode_string, row_length, rotation_index=index, rng=rng
+    ) if duration_mode_string else None
+
+    plan = plan_notes(
+        transposed,
+        articulations,
+        notehead_mode,
+        durations,
+        notehead_mode_string=notehead_mode_string,
+        original_row=row,
+        as_staff=False,
+        rng=rng,
+    )
+    plan.name = f"r{index:02d}"
+    plan_beaming(plan, row_length, max_groups=5, rng=rng)
+    plan.overrides = True
+    return plan
+
+
+def rotation_staff(
+    plan,
+    index,
+    row_length,
+    clef='treble',
+    pitch_mapping=None,
+    fixed_duration=(1, 4),
+    note_id_prefix=None,
+):
+    """A rotation plan staffed for one output; shares the plan's note columns."""
+    return plan.restaffed(
+        name=rotation_name(index, pitch_mapping),
+        note_names=staff_note_names(pitch_mapping),
+        clef=clef,
+        id_prefix=f"{note_id_prefix}-r{index:02d}" if note_id_prefix else None,
+        time_signature=(row_length, fixed_duration[1]),
+    )
+
+
+def plan_rotation_staff(
+    row,
+    index,
+    articulation_mode_string,
+    duration_mode_string,
+    notehead_mode,
+    notehead_mode_string,
+    row_length,
+    clef='treble',
+    pitch_mapping=None,
+    fixed_duration=(1, 4),
+    note_id_prefix=None,
+    rng=None,
+):
+    """Plan for rotation `index` alone (one staff of plan_rotation_staves)."""
+    plan = plan_rotation(row, index, articulation_mode_string, duration_mode_string, notehead_mode,
+                         notehead_mode_string, row_length, rng=rng)
+    return rotation_staff(plan, index, row_length, clef=clef, pitch_mapping=pitch_mapping,
+                          fixed_duration=fixed_duration, note_id_prefix=note_id_prefix)
+
+
+def rotation_name(index, pitch_mapping=None):
+    return f"{'perc' if pitch_mapping else 'pitch'}-r{index:02d}"
+
+
+def rotation_units(
+    row,
+    articulation_mode_string,
+    duration_mode_string,
+    notehead_mode,
+    notehead_mode_string,
+    row_length,
+    seed=None,
+):
+    """
+    One picklable work unit per rotation, for run_rotation_units.
+    Each unit carries its own stream seed; without `seed` one base value is
+    drawn from the global RNG, so a seeded global state still reproduces.
+    """
+    base = seed if seed is not None else random.getrandbits(64)
+    common = (row, articulation_mode_string, duration_mode_string, notehead_mode, notehead_mode_string, row_length)
+    return [(common, i, f"{base}:r{i:02d}") for i in range(row_length)]
+
+
+def _plan_unit(unit):
+    (row, *modes), index, stream = unit
+    plan = plan_rotation(row, index, *modes, rng=random.Random(stream))
+    return plan, NOTEHEADS.names, ARTICULATIONS.names
+
+
+def _adopt_codes(plan, notehead_names, articulation_names):
+    """Re-intern a plan's notehead / articulation codes from a worker's tables."""
+    if notehead_names != NOTEHEADS.names:
+        plan.notehead = array.array('B', (NOTEHEADS.code(notehead_names[c]) for c in plan.notehead))
+    if articulation_names != ARTICULATIONS.names:
+        plan.articulation = array.array('B', (ARTICULATIONS.code(articulation_names[c]) for c in plan.articulation))
+    return plan
+
+
+def resolve_workers(workers):
+    """None / 1 → 1 (in process), 0 → every core."""
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, workers or 1)
+
+
+@traced('rotations')
+def run_rotation_units(units, workers=1):
+    """Rotation plans for `units` in order; on a process pool when workers > 1."""
+    workers = min(resolve_workers(workers), len(units))
+    if workers <= 1:
+        return [_plan_unit(unit)[0] for unit in units]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, math.ceil(len(units) / (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [_adopt_codes(*result) for result in pool.map(_plan_unit, units, chunksize=chunksize)]
+
+
+def plan_rotations(
+    row,
+    articulation_mode_string,
+    duration_mode_string,
+    notehead_mode,
+    notehead_mode_string,
+    row_length,
+    seed=None,
+    workers=1,
+):
+    """Every rotation plan of `row`, planned once for all the staves built from them."""
+    units = rotation_units(row, articulation_mode_string, duration_mode_string, notehead_mode,
+                           notehead_mode_string, row_length, seed=seed)
+    return run_rotation_units(units, workers)
+
+
+def plan_rotation_staves(
+    row,
+    articulation_mode_string,
+    duration_mode_string,
+    notehead_mode,
+    notehead_mode_string,
+    row_length,
+    clef='treble',
+    pitch_mapping=None,
+    fixed_duration=(1, 4),
+    note_id_prefix=None,
+    seed=None,
+    workers=1,
+    plans=None,
+):
+    """
+    Plans for every rotation staff, as noteheads.add_rotation_staves builds them.
+    Pass `plans` (from plan_rotations) to staff rotations that are already planned.
+    """
+    if plans is None:
+        plans = plan_rotations(row, articulation_mode_string, duration_mode_string, notehead_mode,
+                               notehead_mode_string, row_length, seed=seed, workers=workers)
+    return [
+        rotation_staff(plan, i, row_length, clef=clef, pitch_mapping=pitch_mapping,
+                       fixed_duration=fixed_duration, note_id_prefix=note_id_prefix)
+        for i, plan in enumerate(plans)
+    ]
+
+
+def _invert(row):
+    return [(row[0] - (pitch - row[0])) % 12 for pitch in row]
+
+
+def plan_serial_staves(row, articulations, notehead_mode, duration_set, note_id_prefix=None):
+    """Prime, inversion and retrograde-inversion staves (noteheads.add_serial_staves)."""
+    forms = (('p', row), ('i', _invert(row)), ('ri', list(reversed(_invert(row)))))
+    staves = [
+        plan_notes(form, articulations, notehead_mode, duration_set,
+                   note_id_prefix=f"{note_id_prefix}-{name}" if note_id_prefix else None)
+        for name, form in forms
+    ]
+    for (name, _), plan in zip(forms, staves):
+        plan.name = f"serial-{name}"
+        plan_beaming(plan, len(plan), max_groups=5)
+        plan.overrides = True
+    return staves
+
+
+def plan_triad_staff(row, notehead_mode, duration_mode, duration_set):
+    """Overlapping tetrachords of the prime and inversion (noteheads.add_triad_staff)."""
+    row_length = len(row)
+    inversion = _invert(row)
+    tetrachords = [row[i:i + 4] for i in range(0, row_length, 3)]
+    tetrachords += [inversion[i:i + 4] for i in range(0, row_length, 3)]
+
+    duration = duration_set[0] if duration_mode == 'fixed' and duration_set else DEFAULT_DURATION
+    notehead = 0
+    if notehead_mode.startswith('fixed='):
+        shape = notehead_mode.split('=')[1]
+        if shape in NOTEHEAD_SHAPES:
+            notehead = NOTEHEADS.code(shape)
+
+    plan = StaffPlan(markup=False)
+    plan.name = 'triad'
+    plan.chords = {}
+    for i, tetrachord in enumerate(tetrachords):
+        plan.append(tetrachord[0], duration, notehead)
+        plan.chords[i] = tuple(tetrachord)
+    plan_beaming(plan, len(plan), max_groups=5)
+    plan.overrides = True
+    return plan
+
+
+@traced('build_score')
+def plan_score(
+    row,
+    row_length,
+    notehead_mode,
+    duration_mode,
+    articulation_mode_string=None,
+    duration_mode_string=None,
+    notehead_mode_string=None,
+    output_mode='pitches',
+    seed=None,
+    note_ids=False,
+    workers=1,
+):
+    """
+    Staff plans for one parameter set; the text-engine twin of noteheads.build_score.
+    Rotation staves are planned on `workers` processes (0 = every core).
+    """
+    if seed is not None:
+        random.seed(seed)
+
+    durations_for_rotation = None
+    if duration_mode_string:
+        durations_for_rotation = parse_duration_sequence(duration_mode_string, row_length)
+
+    staves = []
+    if output_mode == 'serial':
+        articulations = parse_articulation_sequence(articulation_mode_string, len(row)) if articulation_mode_string else []
+        duration_set = durations_for_rotation or [DEFAULT_DURATION]
+        staves += plan_serial_staves(row, articulations, notehead_mode, duration_set,
+                                     note_id_prefix='note-serial' if note_ids else None)
+        staves.append(plan_triad_staff(row, notehead_mode, duration_mode, duration_set))
+        return staves
+
+    # Planned once; the pitch and percussion staves are two stavings of the same music
+    common = (row, articulation_mode_string, duration_mode_string, notehead_mode, notehead_mode_string, row_length)
+    plans = plan_rotations(*common, seed=seed, workers=workers)
+    if output_mode in ['pitches', 'both']:
+        staves += plan_rotation_staves(*common, note_id_prefix='note-pitch' if note_ids else None, plans=plans)
+    if output_mode in ['percussion', 'both']:
+        staves += plan_rotation_staves(*common, clef='percussion', pitch_mapping=PERCUSSION_NOTE_MAP,
+                                       fixed_duration=(1, 8), note_id_prefix='note-perc' if note_ids else None,
+                                       plans=plans)
+    return staves
+
+
+# ---------------------------------------------------------------------------
+# LilyPond emitter
+# ---------------------------------------------------------------------------
+
+_DURATION_NAMES = {}
+
+
+def duration_name(num, den):
+    """LilyPond duration for num/den (1/8 → '8', 3/16 → '8.', 2/1 → '\\breve')."""
+    key = (num, den)
+    name = _DURATION_NAMES.get(key)
+    if name is not None:
+        return name
+    value = Fraction(num, den)
+    for dots in range(5):
+        base = value / (2 - Fraction(1, 2 ** dots))
+        if base.numerator == 1 and base.denominator & (base.denominator - 1) == 0:
+            name = str(base.denominator)
+        elif base == 2:
+            name = '\\breve'
+        elif base == 4:
+            name = '\\longa'
+        else:
+            continue
+        name += '.' * dots
+        _DURATION_NAMES[key] = name
+        return name
+    raise ValueError(f"duration {num}/{den} cannot be written as a single note")
+
+
+def _leaf(plan, i):
+    duration = duration_name(plan.num[i], plan.den[i])
+    if plan.rest[i]:
+        return f"r{duration}"
+    if plan.chords and i in plan.chords:
+        return f"<{' '.join(PITCH_NAMES[p % 12] for p in plan.chords[i])}>{duration}"
+    return f"{plan.note_name(plan.pitch[i])}{duration}"
+
+
+def format_staff(plan, indent=INDENT * 2):
+    """LilyPond source lines for one staff plan."""
+    inner = indent + INDENT
+    lines = [f"{indent}\\new Staff"]
+    if plan.overrides:
+        lines += [
+            f"{indent}\\with",
+            f"{indent}{{",
+            f"{inner}\\override BarLine.stencil = ##f",
+            f"{inner}\\override TimeSignature.stencil = ##f",
+            f"{indent}}}",
+        ]
+    lines.append(f"{indent}{{")
+
+    notehead_names = NOTEHEADS.names
+    articulation_names = ARTICULATIONS.names
+    beam = plan.beam
+    count = len(plan)
+    for i in range(count):
+        if i == 0:
+            if plan.time_signature:
+                lines.append(f"{inner}\\time {plan.time_signature[0]}/{plan.time_signature[1]}")
+            if plan.clef:
+                lines.append(f"{inner}\\clef \"{plan.clef}\"")
+        is_note = not plan.rest[i]
+        if plan.notehead[i]:
+            lines.append(f"{inner}\\once \\override NoteHead.style = #' {notehead_names[plan.notehead[i]]}")
+        if is_note and plan.id_prefix:
+            lines.append(
+                f"{inner}\\once \\override NoteHead.output-attributes = "
+                f"#'((id . \"{plan.id_prefix}-{i:02d}\"))"
+            )
+        lines.append(inner + _leaf(plan, i))
+        if plan.articulation[i]:
+            lines.append(f"{inner}- \\{articulation_names[plan.articulation[i]]}")
+        if is_note and plan.markup and not plan.chords:
+            lines.append(f"{inner}- \\markup {{ {plan.pitch[i]} }}")
+        group = beam[i]
+        if group != NO_BEAM:
+            first = i == 0 or beam[i - 1] != group
+            last = i == count - 1 or beam[i + 1] != group
+            if first and not last:
+                lines.append(f"{inner}[")
+            elif last and not first:
+                lines.append(f"{inner}]")
+    lines.append(f"{indent}}}")
+    return lines
+
+
+def _chunks(staves, size):
+    """Lists of up to `size` staves, drawn lazily from any iterable."""
+    staves = iter(staves)
+    while True:
+        chunk = list(itertools.islice(staves, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _score_lines(staves, indent=''):
+    yield f"{indent}\\score"
+    yield f"{indent}{{"
+    yield f"{indent}{INDENT}\\new Score"
+    yield f"{indent}{INDENT}<<"
+    for plan in staves:
+        yield from format_staff(plan, indent=indent + INDENT * 2)
+    yield f"{indent}{INDENT}>>"
+    yield f"{indent}}}"
+
+
+def iter_ly_lines(staves, chunk_size=None):
+    """
+    .ly source lines for staff plans, one staff at a time, so `staves` may be
+    a generator of any length.  With `chunk_size`, every chunk_size staves
+    become their own \\bookpart (a new page and score).
+    """
+    yield f"\\version \"{LILYPOND_VERSION}\""
+    yield "\\language \"english\""
+    yield ""
+    if not chunk_size:
+        yield from _score_lines(staves)
+        return
+    for chunk in _chunks(staves, chunk_size):
+        yield "\\bookpart"
+        yield "{"
+        yield from _score_lines(chunk, indent=INDENT)
+        yield "}"
+
+
+@traced('format')
+def format_score(staves):
+    """Complete .ly source for a list of staff plans."""
+    return '\n'.join(iter_ly_lines(staves)) + '\n'
+
+
+def write_ly(staves, path, chunk_size=None):
+    """
+    Write staff plans to `path` as LilyPond source (atomically).  The file is
+    written as the staves arrive, so memory does not grow with the score.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for line in iter_ly_lines(staves, chunk_size=chunk_size):
+            f.write(line)
+            f.write('\n')
+    os.replace(temp_path, path)
+    return path
+
+
+def write_ly_parts(staves, output_base, chunk_size):
+    """
+    Write every chunk_size staves as a separate score, <output_base>-001.ly,
+    -002.ly ..., so the parts can be compiled in parallel.  Parts left from
+    an earlier, longer run are removed.  Returns the paths written.
+    """
+    paths = []
+    for number, chunk in enumerate(_chunks(staves, chunk_size), 1):
+        paths.append(write_ly(chunk, f"{output_base}-{number:03d}.ly"))
+    for stale in glob.glob(f"{glob.escape(output_base)}-[0-9][0-9][0-9].ly"):
+        if stale not in paths:
+            os.remove(stale)
+    return paths
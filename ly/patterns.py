@@ -0,0 +1,376 @@
+# Pattern DSL for --articulation-mode, --duration-mode and --notehead-mode
+#
+# One grammar shared by all three options:
+#
+#   pattern := '[' blocks ']' | blocks
+#   blocks  := block (',' block)*
+#   block   := MODE '=' ( '[' items ']' | item ) ( 'x' COUNT )?
+#   items   := item (',' item)*
+#   item    := text with balanced parentheses, optionally suffixed 'xN'
+#
+#   e.g. "[fixed=[8]x2, random=[rest=(1,4),16]x3, rotate=[rest,4]x2]"
+#
+# A pattern string is parsed once into a CompiledPattern (cached by
+# compile_pattern), after which plan(total_notes, rotation_index) produces
+# the per-note sequence.  Fully deterministic patterns are additionally
+# cached per rotation offset, so building hundreds of rotation staves no
+# longer re-tokenizes the same string.
+#
+# Block semantics per kind (unchanged from the original parsers):
+#
+#   articulation : fixed|random|rotate|none, 'xN' repeats the list N times
+#   duration     : fixed|random|rotate, 'xN' yields N notes
+#   notehead     : fixed|random|rotate, 'xN' repeats the list N times
+#                  (random yields N notes)
+
+import ast
+import functools
+import itertools
+import random
+import re
+
+ARTICULATION = 'articulation'
+DURATION = 'duration'
+NOTEHEAD = 'notehead'
+
+MODES = {
+    ARTICULATION: ('fixed', 'random', 'rotate', 'none'),
+    DURATION: ('fixed', 'random', 'rotate'),
+    NOTEHEAD: ('fixed', 'random', 'rotate'),
+}
+
+NOTEHEAD_SHAPES = ['default', 'cross', 'triangle', 'diamond', 'slash', 'xcircle', 'harmonic', 'harmonic-black']
+
+DEFAULT_DURATION = (1, 4)
+
+_MODE_RE = re.compile(r'\s*([a-z]+)\s*=\s*')
+_COUNT_RE = re.compile(r'\s*x\s*(\d+)')
+_REPEAT_RE = re.compile(r'(.+?)x(\d+)$')
+
+
+class PatternSyntaxError(ValueError):
+    """Raised when a mode string does not match the pattern grammar."""
+
+    def __init__(self, message, text, position):
+        self.text = text
+        self.position = position
+        super().__init__(f"{message}\n    {text}\n    {' ' * position}^")
+
+
+class Item:
+    __slots__ = ('text', 'position')
+
+    def __init__(self, text, position):
+        self.text = text
+        self.position = position
+
+    def __repr__(self):
+        return f"Item({self.text!r})"
+
+
+class Block:
+    __slots__ = ('mode', 'items', 'count', 'position', 'values')
+
+    def __init__(self, mode, items, count, position):
+        self.mode = mode
+        self.items = items
+        self.count = count
+        self.position = position
+        self.values = []
+
+    def __repr__(self):
+        return f"Block({self.mode!r}, {self.values!r}, count={self.count!r})"
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def parse_blocks(text, kind):
+    """Parse a mode string into a list of Blocks (syntax only)."""
+    modes = MODES[kind]
+    body_start = 0
+    body_end = len(text)
+
+    stripped = text.strip()
+    if stripped.startswith('[') and stripped.endswith(']'):
+        body_start = text.index('[') + 1
+        body_end = text.rindex(']')
+
+    blocks = []
+    pos = body_start
+    while True:
+        match = _MODE_RE.match(text, pos, body_end)
+        if not match:
+            raise PatternSyntaxError(f"expected one of {', '.join(m + '=' for m in modes)}", text, _skip_space(text, pos))
+        mode = match.group(1)
+        if mode not in modes:
+            raise PatternSyntaxError(f"unknown {kind} mode '{mode}'", text, match.start(1))
+        pos = match.end()
+
+        if pos < body_end and text[pos] == '[':
+            close = _find_closing(text, pos, body_end)
+            items = _split_items(text, pos + 1, close)
+            pos = close + 1
+        else:
+            end = _scan_item(text, pos, body_end)
+            items = _split_items(text, pos, end)
+            pos = end
+
+        if not items and mode != 'none':
+            raise PatternSyntaxError(f"'{mode}' block has no items", text, match.start(1))
+
+        count = None
+        count_match = _COUNT_RE.match(text, pos, body_end)
+        if count_match:
+            count = int(count_match.group(1))
+            pos = count_match.end()
+
+        blocks.append(Block(mode, items, count, match.start(1)))
+
+        pos = _skip_space(text, pos, body_end)
+        if pos >= body_end:
+            break
+        if text[pos] != ',':
+            raise PatternSyntaxError("expected ',' between blocks", text, pos)
+        pos += 1
+
+    return blocks
+
+
+def _skip_space(text, pos, end=None):
+    end = len(text) if end is None else end
+    while pos < end and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _find_closing(text, open_pos, end):
+    depth = 0
+    for pos in range(open_pos, end):
+        char = text[pos]
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+            if depth == 0:
+                return pos
+    raise PatternSyntaxError("unclosed '['", text, open_pos)
+
+
+def _scan_item(text, pos, end):
+    """End of a bare (unbracketed) item: next top-level ',' or 'xN' count."""
+    depth = 0
+    start = pos
+    while pos < end:
+        char = text[pos]
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            break
+        pos += 1
+    item_text = text[start:pos].rstrip()
+    repeat = re.search(r'x\s*\d+$', item_text)
+    if repeat:
+        return start + repeat.start()
+    return start + len(item_text)
+
+
+def _split_items(text, start, end):
+    items = []
+    depth = 0
+    item_start = start
+    for pos in range(start, end + 1):
+        char = text[pos] if pos < end else ','
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                raise PatternSyntaxError("unbalanced ')'", text, pos)
+        elif char == '[' or char == ']':
+            raise PatternSyntaxError(f"unexpected '{char}' inside item list", text, pos)
+        elif char == ',' and depth == 0:
+            raw = text[item_start:pos]
+            if raw.strip():
+                items.append(Item(raw.strip(), item_start + len(raw) - len(raw.lstrip())))
+            item_start = pos + 1
+    if depth != 0:
+        raise PatternSyntaxError("unclosed '('", text, start)
+    return items
+
+
+def _expand_repeat(item):
+    """'accent x3' / '8x2' → (base, 3) / (base, 2); plain items → (text, 1)."""
+    match = _REPEAT_RE.match(item.text)
+    if match:
+        return match.group(1).strip(), int(match.group(2))
+    return item.text, 1
+
+
+# ---------------------------------------------------------------------------
+# Item values per kind
+# ---------------------------------------------------------------------------
+
+def _articulation_values(block, text):
+    if block.mode == 'none':
+        return ["\\none"]
+    values = []
+    for item in block.items:
+        base, repeat = _expand_repeat(item)
+        base = base.lstrip("\\")
+        if base:
+            values.extend([base] * repeat)
+    return values
+
+
+def _notehead_values(block, text):
+    values = []
+    for item in block.items:
+        base, repeat = _expand_repeat(item)
+        if base not in NOTEHEAD_SHAPES:
+            raise PatternSyntaxError(f"unknown notehead '{base}'", text, item.position)
+        values.extend([base] * repeat)
+    return values
+
+
+def _duration_values(block, text):
+    values = []
+    for item in block.items:
+        previous = values[-1] if values else DEFAULT_DURATION
+        if previous[0] == 'rest':
+            previous = previous[1]
+        base, repeat = _expand_repeat(item)
+        values.extend([_parse_duration(base, previous, text, item.position)] * repeat)
+    return values
+
+
+def _parse_duration(value, previous, text, position):
+    if value.startswith('rest='):
+        inner = value[len('rest='):]
+        inner_position = position + len('rest=') + len(inner) - len(inner.lstrip())
+        duration = _parse_duration(inner.strip(), previous, text, inner_position)
+        if duration[0] == 'rest':
+            raise PatternSyntaxError("rest= takes a duration, not another rest", text, inner_position)
+        return ('rest', duration)
+    if value == 'rest':
+        return ('rest', previous)
+    if value.startswith('('):
+        try:
+            duration = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            duration = None
+        if not (isinstance(duration, tuple) and len(duration) == 2 and all(isinstance(n, int) for n in duration)):
+            raise PatternSyntaxError(f"invalid duration tuple '{value}'", text, position)
+        return duration
+    if value.isdigit():
+        return (1, int(value))
+    if value.startswith('r') and value[1:].isdigit():
+        return ('rest', (1, int(value[1:])))
+    raise PatternSyntaxError(f"unrecognised duration '{value}'", text, position)
+
+
+_VALUE_PARSERS = {
+    ARTICULATION: _articulation_values,
+    DURATION: _duration_values,
+    NOTEHEAD: _notehead_values,
+}
+
+
+# ---------------------------------------------------------------------------
+# Compiled patterns
+# ---------------------------------------------------------------------------
+
+def _rotated(values, rotation_index):
+    offset = rotation_index % len(values)
+    return values[offset:] + values[:offset]
+
+
+class CompiledPattern:
+    """
+    A parsed mode string that produces per-note plans.
+
+    Deterministic patterns (no random blocks) memoize their plans per
+    (total_notes, rotation offsets); random blocks draw from `rng` on
+    every call.
+    """
+
+    def __init__(self, text, kind):
+        self.text = text
+        self.kind = kind
+        self.blocks = parse_blocks(text, kind)
+        for block in self.blocks:
+            block.values = _VALUE_PARSERS[kind](block, text)
+        self.blocks = [block for block in self.blocks if block.values]
+        self.is_random = any(block.mode == 'random' for block in self.blocks)
+        self._plan_cache = {}
+
+    def __repr__(self):
+        return f"CompiledPattern({self.kind!r}, {self.blocks!r})"
+
+    def plan(self, total_notes, rotation_index=0, rng=None):
+        """Return the list of `total_notes` values for one rotation."""
+        if self.is_random:
+            return self._build(total_notes, rotation_index, rng or random)
+
+        key = (total_notes,) + tuple(
+            rotation_index % len(block.values) for block in self.blocks if block.mode == 'rotate'
+        )
+        cached = self._plan_cache.get(key)
+        if cached is None:
+            cached = self._plan_cache[key] = self._build(total_notes, rotation_index, None)
+        return list(cached)
+
+    def _build(self, total_notes, rotation_index, rng):
+        expand = getattr(self, f'_expand_{self.kind}')
+        plan = []
+        for block in self.blocks:
+            plan.extend(expand(block, total_notes, rotation_index, rng))
+
+        if not plan:
+            return []
+        if len(plan) < total_notes:
+            return list(itertools.islice(itertools.cycle(plan), total_notes))
+        return plan[:total_notes]
+
+    @staticmethod
+    def _expand_articulation(block, total_notes, rotation_index, rng):
+        values = block.values
+        if not block.count:
+            return values
+        length = block.count * len(values)
+        if block.mode == 'random':
+            return [rng.choice(values) for _ in range(length)]
+        if block.mode == 'rotate':
+            values = _rotated(values, rotation_index)
+        return list(itertools.islice(itertools.cycle(values), length))
+
+    @staticmethod
+    def _expand_duration(block, total_notes, rotation_index, rng):
+        values = block.values
+        if block.mode == 'random':
+            return [rng.choice(values) for _ in range(block.count or total_notes)]
+        if block.mode == 'rotate':
+            values = _rotated(values, rotation_index)
+        return list(itertools.islice(itertools.cycle(values), block.count or len(values)))
+
+    @staticmethod
+    def _expand_notehead(block, total_notes, rotation_index, rng):
+        values = block.values
+        if block.mode == 'random':
+            return [rng.choice(values) for _ in range(block.count or total_notes)]
+        if not block.count:
+            return values
+        if block.mode == 'rotate':
+            values = _rotated(values, rotation_index)
+        return list(itertools.islice(itertools.cycle(values), block.count * len(values)))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(text, kind):
+    """Parse and cache a mode string. Raises PatternSyntaxError on bad input."""
+    if kind not in MODES:
+        raise ValueError(f"Unknown pattern kind: {kind}")
+    return CompiledPattern(text, kind)
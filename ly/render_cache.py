@@ -0,0 +1,217 @@
+# Content-Addressed Render Cache
+#
+# Stores LilyPond outputs (.ly/.pdf/.svg/.png) under a hash of the fully
+# resolved score source plus the engine that wrote it and the LilyPond (and,
+# for --engine abjad, abjad) versions, so a repeat request returns the
+# existing artifacts instead of recompiling.
+#
+# Layout:
+#   <root>/index.json                 manifest: key → files, size, last_used
+#   <root>/objects/ab/abcdef.../      one directory per cached score
+#
+# The cache is bounded by `max_bytes`; least recently used entries are
+# evicted when a store pushes it over the limit.
+#
+# Usage:
+#   cache = RenderCache('o/cache')
+#   key = cache.key_for_file('o/score.ly', engine='text')
+#   hit = cache.lookup(key, ['pdf'])
+#   if hit is None:
+#       ...compile...
+#       cache.store(key, {'ly': 'o/score.ly', 'pdf': 'o/score.pdf'})
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+INDEX_NAME = 'index.json'
+
+
+@functools.lru_cache(maxsize=None)
+def lilypond_version():
+    lilypond = os.environ.get('LILYPOND', 'lilypond')
+    try:
+        result = subprocess.run([lilypond, '--version'], capture_output=True, text=True, timeout=30)
+        return result.stdout.splitlines()[0].strip() if result.stdout else 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'missing'
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_versions(engine='text'):
+    """
+    Engine name and toolchain versions that feed into every cache key.
+    abjad is only imported (and its version recorded) for the abjad engine.
+    """
+    versions = {'engine': engine, 'lilypond': lilypond_version()}
+    if engine == 'abjad':
+        try:
+            import abjad
+            versions['abjad'] = getattr(abjad, '__version__', 'unknown')
+        except ImportError:
+            versions['abjad'] = 'missing'
+    return versions
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+class RenderCache:
+    """Size-bounded LRU cache of rendered score artifacts keyed by content hash."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, INDEX_NAME)
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.index = self._load_index()
+
+    # -- keys ---------------------------------------------------------------
+
+    def key_for_source(self, ly_source, engine='text', versions=None):
+        """Hash LilyPond source text together with the engine and toolchain versions."""
+        versions = versions if versions is not None else toolchain_versions(engine)
+        digest = hashlib.sha256()
+        digest.update(json.dumps(versions, sort_keys=True).encode())
+        digest.update(b'\0')
+        digest.update(ly_source.encode())
+        return digest.hexdigest()
+
+    def key_for_file(self, ly_path, engine='text', versions=None):
+        with open(ly_path, encoding='utf-8') as f:
+            return self.key_for_source(f.read(), engine=engine, versions=versions)
+
+    # -- lookup / store -----------------------------------------------------
+
+    def lookup(self, key, formats):
+        """
+        Return {format: cached_path} if every requested format is cached,
+        otherwise None.  A hit refreshes the entry's LRU position.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+
+        paths = {}
+        for fmt in formats:
+            relative = entry['files'].get(fmt)
+            if not relative:
+                return None
+            if isinstance(relative, list):
+                path = [os.path.join(self.root, page) for page in relative]
+            else:
+                path = os.path.join(self.root, relative)
+            if not all(os.path.exists(p) for p in _as_list(path)):
+                return None
+            paths[fmt] = path
+
+        entry['last_used'] = time.time()
+        self._save_index()
+        return paths
+
+    def store(self, key, files, meta=None):
+        """Copy artifacts ({format: path, or [page paths]}) into the cache under `key`."""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        entry = self.index.get(key, {'files': {}, 'size': 0, 'created': time.time()})
+        for fmt, path in files.items():
+            if isinstance(path, list):
+                pages = []
+                for page, page_path in enumerate(path, 1):
+                    target = os.path.join(entry_dir, f"score-{page}.{fmt}")
+                    shutil.copyfile(page_path, target)
+                    pages.append(os.path.relpath(target, self.root))
+                entry['files'][fmt] = pages
+                continue
+            target = os.path.join(entry_dir, f"score.{fmt}")
+            shutil.copyfile(path, target)
+            entry['files'][fmt] = os.path.relpath(target, self.root)
+
+        entry['size'] = sum(
+            os.path.getsize(os.path.join(self.root, relative))
+            for value in entry['files'].values() for relative in _as_list(value)
+        )
+        entry['last_used'] = time.time()
+        if meta:
+            entry['meta'] = meta
+        self.index[key] = entry
+
+        self.evict()
+        self._save_index()
+
+    def materialize(self, key, formats, output_base, naming=None):
+        """
+        Copy cached artifacts next to `output_base`.  Returns {format: path},
+        or None on a miss.  `naming(output_base, fmt)` overrides the default
+        `<output_base>.<fmt>` target names; for multi-page outputs it is
+        called with page=1, 2 ... (default `<output_base>-<page>.<fmt>`).
+        """
+        hit = self.lookup(key, formats)
+        if hit is None:
+            return None
+        outputs = {}
+        for fmt, path in hit.items():
+            if isinstance(path, list):
+                outputs[fmt] = []
+                for page, page_path in enumerate(path, 1):
+                    target = naming(output_base, fmt, page=page) if naming else f"{output_base}-{page}.{fmt}"
+                    shutil.copyfile(page_path, target)
+                    outputs[fmt].append(target)
+                continue
+            target = naming(output_base, fmt) if naming else f"{output_base}.{fmt}"
+            shutil.copyfile(path, target)
+            outputs[fmt] = target
+        return outputs
+
+    # -- eviction -----------------------------------------------------------
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.index.values())
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return []
+
+        evicted = []
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= entry['size']
+            evicted.append(key)
+
+        for key in evicted:
+            del self.index[key]
+        logging.info(f"Render cache evicted {len(evicted)} entries")
+        return evicted
+
+    # -- index --------------------------------------------------------------
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Render cache index unreadable ({e}); starting empty")
+            return {}
+
+    def _save_index(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
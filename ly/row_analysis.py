@@ -0,0 +1,376 @@
+# Vectorized Row Analysis
+#
+# Batch analysis of candidate rows with NumPy, for ranking thousands of rows
+# before choosing material.  Rows are (n, length) integer arrays; every
+# measure below is computed for the whole batch at once:
+#
+#   - the 48 row forms P0-11, I0-11, R0-11, RI0-11 (named by the starting
+#     pitch of P / I; R_t and RI_t are P_t and I_t backwards) and the classic
+#     transposition matrix
+#   - interval-class vectors of the pitch content and histograms of the
+#     successive (directed) intervals
+#   - invariance: how many order positions each form shares with the row,
+#     and how many forms reproduce it exactly
+#   - hexachordal combinatoriality (P, I, R, RI), for 12-note aggregates
+#   - similarity matrices between every pair of rotations (rotated, then
+#     transposed to start on the row's first pitch, as in noteheads.py),
+#     not only against rotation 0
+#
+# Rotation does not change the cyclic interval succession
+# (get_interval_vector in noteheads.py), so rotations are compared on their
+# open successions instead.
+#
+# Requires numpy.  Parquet output also needs pyarrow.
+#
+# Usage:
+# python row_analysis.py (--rows-file rows.txt | --index-dir o/row_index | --random N)
+#                        [--length 12] [--limit N] [--seed S]
+#                        [-o analysis.csv|.npz|.parquet] [--sort COLUMN[:asc] ...] [--top N]
+
+import argparse
+import csv
+import logging
+import os
+import random
+
+import numpy as np
+
+PITCH_CLASSES = 12
+FORM_KINDS = ('P', 'I', 'R', 'RI')
+FORM_NAMES = [f"{kind}{t}" for kind in FORM_KINDS for t in range(PITCH_CLASSES)]
+AGGREGATE = (1 << PITCH_CLASSES) - 1
+DEFAULT_BATCH = 20000
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(1 << PITCH_CLASSES)], dtype=np.int8)
+
+
+def as_rows(rows):
+    """(n, length) int16 array of pitch classes."""
+    array = np.asarray(rows, dtype=np.int16) % PITCH_CLASSES
+    return array[None, :] if array.ndim == 1 else array
+
+
+def pitch_masks(rows):
+    """12-bit pitch-class content of the last axis."""
+    return np.bitwise_or.reduce(np.left_shift(1, rows), axis=-1)
+
+
+# ---------------------------------------------------------------------------
+# Forms and matrix
+# ---------------------------------------------------------------------------
+
+def row_forms(rows):
+    """(n, 48, length): P0-11, I0-11, R0-11, RI0-11 for each row."""
+    rows = as_rows(rows)
+    base = (rows - rows[:, :1]) % PITCH_CLASSES
+    t = np.arange(PITCH_CLASSES, dtype=np.int16)[None, :, None]
+    prime = (base[:, None, :] + t) % PITCH_CLASSES
+    inversion = (t - base[:, None, :]) % PITCH_CLASSES
+    return np.concatenate([prime, inversion, prime[..., ::-1], inversion[..., ::-1]], axis=1)
+
+
+def row_matrix(rows):
+    """(n, length, length) transposition matrix: row i is the P form starting on I[i]."""
+    rows = as_rows(rows)
+    return (rows[:, None, :] - rows[:, :, None] + rows[:, :1, None]) % PITCH_CLASSES
+
+
+def identity_form(rows):
+    """Index in the 48 forms of each row itself (P at its first pitch)."""
+    return as_rows(rows)[:, 0].astype(np.intp)
+
+
+# ---------------------------------------------------------------------------
+# Intervals
+# ---------------------------------------------------------------------------
+
+def successive_intervals(rows, cyclic=False):
+    """(n, length - 1) directed intervals, or (n, length) wrapping around."""
+    rows = as_rows(rows)
+    if cyclic:
+        rows = np.concatenate([rows, rows[:, :1]], axis=1)
+    return np.diff(rows, axis=1) % PITCH_CLASSES
+
+
+def interval_histogram(rows, cyclic=False):
+    """(n, 12) counts of each directed successive interval."""
+    intervals = successive_intervals(rows, cyclic)
+    return (intervals[..., None] == np.arange(PITCH_CLASSES)).sum(axis=-2)
+
+
+def interval_class_vector(rows):
+    """(n, 6) interval-class vector <ic1..ic6> of each row's pitch content."""
+    content = (pitch_masks(as_rows(rows))[:, None] >> np.arange(PITCH_CLASSES)) & 1
+    content = content.astype(bool)
+    vector = np.stack(
+        [(content & np.roll(content, -k, axis=1)).sum(axis=1) for k in range(1, 7)],
+        axis=1,
+    )
+    vector[:, 5] //= 2  # the tritone pairs were counted from both ends
+    return vector
+
+
+# ---------------------------------------------------------------------------
+# Invariance and combinatoriality
+# ---------------------------------------------------------------------------
+
+def positional_invariance(rows, forms=None):
+    """(n, 48) number of order positions where each form matches the row."""
+    rows = as_rows(rows)
+    forms = row_forms(rows) if forms is None else forms
+    return (forms == rows[:, None, :]).sum(axis=-1)
+
+
+def hexachordal_combinatoriality(rows, forms=None):
+    """
+    (n, 48) bool: the form's first hexachord is the complement of the row's,
+    so the two can be combined into aggregates.  Only 12-note aggregates
+    qualify; the trivial R form (the row backwards) is excluded.
+    """
+    rows = as_rows(rows)
+    n, length = rows.shape
+    if length != PITCH_CLASSES:
+        return np.zeros((n, len(FORM_NAMES)), dtype=bool)
+    forms = row_forms(rows) if forms is None else forms
+    aggregate = pitch_masks(rows) == AGGREGATE
+    first = pitch_masks(rows[:, :length // 2])
+    hexachords = pitch_masks(forms[..., :length // 2])
+    combinatorial = (hexachords == (AGGREGATE ^ first)[:, None]) & aggregate[:, None]
+    combinatorial[np.arange(n), 2 * PITCH_CLASSES + identity_form(rows)] = False
+    return combinatorial
+
+
+# ---------------------------------------------------------------------------
+# Rotations
+# ---------------------------------------------------------------------------
+
+def rotations(rows):
+    """(n, length, length): rotation i, transposed to start on the row's first pitch."""
+    rows = as_rows(rows)
+    length = rows.shape[1]
+    index = (np.arange(length)[:, None] + np.arange(length)[None, :]) % length
+    rotated = rows[:, index]
+    return (rotated - rotated[..., :1] + rows[:, None, :1]) % PITCH_CLASSES
+
+
+def rotation_similarity(rows):
+    """
+    Pairwise similarity of every rotation with every other, each (n, length, length):
+      pitch_overlap     shared pitch classes
+      interval_jaccard  |A ∩ B| / |A ∪ B| of the successive-interval sets
+      interval_match    share of order positions with the same interval
+                        (compare_interval_vectors in noteheads.py)
+    """
+    rotated = rotations(rows)
+    content = pitch_masks(rotated)
+    intervals = np.diff(rotated, axis=-1) % PITCH_CLASSES
+    interval_sets = pitch_masks(intervals)
+
+    overlap = POPCOUNT[content[:, :, None] & content[:, None, :]]
+    shared = POPCOUNT[interval_sets[:, :, None] & interval_sets[:, None, :]].astype(np.float32)
+    either = POPCOUNT[interval_sets[:, :, None] | interval_sets[:, None, :]].astype(np.float32)
+    jaccard = np.divide(shared, either, out=np.zeros_like(shared), where=either > 0)
+    width = max(intervals.shape[-1], 1)
+    match = (intervals[:, :, None, :] == intervals[:, None, :, :]).sum(axis=-1) / np.float32(width)
+    return {
+        'pitch_overlap': overlap.astype(np.int8),
+        'interval_jaccard': jaccard,
+        'interval_match': match.astype(np.float32),
+    }
+
+
+def _off_diagonal_mean(matrices):
+    length = matrices.shape[-1]
+    if length < 2:
+        return np.zeros(matrices.shape[0], dtype=np.float32)
+    total = matrices.sum(axis=(1, 2)) - np.trace(matrices, axis1=1, axis2=2)
+    return (total / (length * (length - 1))).astype(np.float32)
+
+
+# ---------------------------------------------------------------------------
+# Table
+# ---------------------------------------------------------------------------
+
+def analyse_batch(rows):
+    """Summary columns and per-row matrices for rows of one length."""
+    rows = as_rows(rows)
+    n, length = rows.shape
+    forms = row_forms(rows)
+    invariance = positional_invariance(rows, forms)
+    identical = invariance == length
+    combinatorial = hexachordal_combinatoriality(rows, forms)
+    similarity = rotation_similarity(rows)
+    histogram = interval_histogram(rows)
+    ic_vector = interval_class_vector(rows)
+    by_kind = combinatorial.reshape(n, len(FORM_KINDS), PITCH_CLASSES).any(axis=2)
+
+    columns = {
+        'row': np.array([' '.join(map(str, row)) for row in rows.tolist()]),
+        'length': np.full(n, length, dtype=np.int16),
+        'aggregate': pitch_masks(rows) == AGGREGATE,
+        'distinct_intervals': (histogram > 0).sum(axis=1),
+        'symmetry': identical.sum(axis=1),
+        'max_invariance': np.where(identical, -1, invariance).max(axis=1),
+        'combinatorial_forms': combinatorial.sum(axis=1),
+        # every row is trivially R-combinatorial with itself backwards
+        'all_combinatorial': by_kind[:, [0, 1, 3]].all(axis=1),
+        'mean_pitch_overlap': _off_diagonal_mean(similarity['pitch_overlap'].astype(np.float32)),
+        'mean_interval_jaccard': _off_diagonal_mean(similarity['interval_jaccard']),
+        'mean_interval_match': _off_diagonal_mean(similarity['interval_match']),
+    }
+    for k, kind in enumerate(FORM_KINDS):
+        columns[f"{kind.lower()}_combinatorial"] = by_kind[:, k]
+    for k in range(6):
+        columns[f"ic{k + 1}"] = ic_vector[:, k]
+    for interval in range(1, PITCH_CLASSES):
+        columns[f"int{interval}"] = histogram[:, interval]
+
+    matrices = {
+        'rows': rows.astype(np.int8),
+        'invariance': invariance.astype(np.int8),
+        'combinatorial': combinatorial,
+        **{f"rotation_{name}": matrix for name, matrix in similarity.items()},
+    }
+    return columns, matrices
+
+
+def analyse_rows(rows, batch_size=DEFAULT_BATCH):
+    """analyse_batch over any number of equal-length rows, `batch_size` at a time."""
+    rows = as_rows(rows)
+    parts = [analyse_batch(rows[i:i + batch_size]) for i in range(0, len(rows), batch_size)]
+    if not parts:
+        raise ValueError("no rows to analyse")
+    columns = {key: np.concatenate([p[0][key] for p in parts]) for key in parts[0][0]}
+    matrices = {key: np.concatenate([p[1][key] for p in parts]) for key in parts[0][1]}
+    return columns, matrices
+
+
+def rank(columns, matrices, sort_keys, top=None):
+    """Reorder table and matrices by `sort_keys` (descending; 'key:asc' for ascending)."""
+    keys = []
+    for key in reversed(sort_keys):  # np.lexsort treats the last key as primary
+        name, _, direction = key.partition(':')
+        ascending = direction == 'asc'
+        values = columns[name]
+        keys.append(values if ascending else -values.astype(np.float64))
+    order = np.lexsort(keys) if keys else np.arange(len(columns['row']))
+    if top is not None:
+        order = order[:top]
+    return ({key: value[order] for key, value in columns.items()},
+            {key: value[order] for key, value in matrices.items()})
+
+
+def write_table(columns, matrices, path):
+    """Write CSV, NPZ (table plus matrices) or Parquet, chosen by extension."""
+    ext = os.path.splitext(path)[1].lower()
+    temp_path = f"{path}.tmp"
+    if ext == '.npz':
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, form_names=np.array(FORM_NAMES), **columns, **matrices)
+    elif ext == '.parquet':
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use .csv or .npz")
+        table = pyarrow.table({key: value.tolist() for key, value in columns.items()})
+        pyarrow.parquet.write_table(table, temp_path)
+    else:
+        names = list(columns)
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for values in zip(*(_csv_values(columns[name]) for name in names)):
+                writer.writerow(values)
+    os.replace(temp_path, path)
+    return path
+
+
+def _csv_values(column):
+    if column.dtype.kind == 'f':
+        return [f"{v:.4f}" for v in column.tolist()]
+    if column.dtype.kind == 'b':
+        return [int(v) for v in column.tolist()]
+    return column.tolist()
+
+
+# ---------------------------------------------------------------------------
+# Candidate sources
+# ---------------------------------------------------------------------------
+
+def read_rows(path):
+    """One row per line: pitch classes separated by spaces or commas."""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].replace(',', ' ').split()
+            if line:
+                rows.append([int(p) for p in line])
+    return rows
+
+
+def index_rows(index_dir, length, limit=None, seed=None):
+    """Rows from a row_index.py index: all of them, or `limit` drawn at random."""
+    from row_index import RowIndex
+    with RowIndex.open(index_dir, length) as index:
+        if limit is None or limit >= len(index):
+            ids = range(len(index))
+        else:
+            ids = sorted(random.Random(seed).sample(range(len(index)), limit))
+        return [index.row(i) for i in ids]
+
+
+def random_rows(count, length, seed=None):
+    from rowgen import MAX_ROW_LENGTH, generate_row
+    rng = random.Random(seed)
+    rows = [generate_row(length, rng=rng) for _ in range(count)]
+    if any(row is None for row in rows):
+        raise ValueError(f"no valid row of length {length} exists (maximum is {MAX_ROW_LENGTH})")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse and rank candidate rows.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--rows-file', help="Text file, one row per line")
+    source.add_argument('--index-dir', help="Directory built by row_index.py")
+    source.add_argument('--random', type=int, metavar='N', help="N rows from generate_row")
+    parser.add_argument('--length', type=int, default=PITCH_CLASSES)
+    parser.add_argument('--limit', type=int, default=None, help="Sample this many rows from the index")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', default='row_analysis.csv', help="Output .csv, .npz or .parquet")
+    parser.add_argument('--sort', nargs='*', default=['combinatorial_forms', 'max_invariance'],
+                        help="Columns to rank by, descending ('column:asc' for ascending)")
+    parser.add_argument('--top', type=int, default=None, help="Keep only the first N rows after sorting")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH)
+    args = parser.parse_args()
+
+    if not args.rows_file:
+        from rowgen import MAX_ROW_LENGTH
+        if args.length > MAX_ROW_LENGTH:
+            parser.error(f"--length {args.length}: no valid row is longer than {MAX_ROW_LENGTH}")
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.rows_file:
+        rows = read_rows(args.rows_file)
+    elif args.index_dir:
+        rows = index_rows(args.index_dir, args.length, args.limit, args.seed)
+    else:
+        rows = random_rows(args.random, args.length, args.seed)
+
+    lengths = {len(row) for row in rows}
+    if len(lengths) > 1:
+        raise SystemExit(f"rows must all have the same length, got {sorted(lengths)}")
+
+    columns, matrices = analyse_rows(rows, batch_size=args.batch_size)
+    unknown = [key for key in args.sort if key.partition(':')[0] not in columns]
+    if unknown:
+        raise SystemExit(f"unknown sort column(s) {unknown}; choose from {', '.join(columns)}")
+    columns, matrices = rank(columns, matrices, args.sort, args.top)
+    write_table(columns, matrices, args.output)
+    logging.info(f"{len(rows)} rows analysed, {len(columns['row'])} written → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
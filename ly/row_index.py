@@ -0,0 +1,469 @@
+# Exhaustive Row Index
+#
+# Enumerates every row the generator's rules allow (see rowgen.py) once,
+# offline, and stores them in a packed binary file per row length, so a row
+# with given properties becomes a lookup instead of a search:
+#
+#   row = RowIndex.open('o/row_index', 12).sample(rng, first=4, exclude=(5, 7))
+#
+# Up to 12 notes no pitch repeats, so the search state is a 12-bit mask of
+# used pitches plus the last pitch and interval class.  The depth-first
+# enumeration is split by two-note prefix across worker processes; prefixes
+# and candidates are visited in ascending pitch order, so the concatenated
+# output is already sorted.  Longer rows repeat pitches and their number
+# grows roughly fourfold per note, so they are left to generate_row.
+#
+# File layout (rows-<length>.bin, little-endian, sections 4-byte aligned):
+#   header        4s magic "OSRI", u16 version, u16 length, u32 count,
+#                 u16 allowed-interval mask, u16 number of interval sets
+#   u32[13]       first-pitch offsets: rows starting on p are rows[o[p]:o[p+1]]
+#   u32[13]       last-pitch offsets into the last-pitch row ids
+#   u16[n]        interval sets (bit i = directed interval i occurs), sorted
+#   u32[n + 1]    offsets into the interval-set row ids
+#   rows          count × ceil(length / 2) bytes, one pitch class per nibble
+#                 (first pitch in the high nibble), sorted
+#   u32[count]    row ids grouped by last pitch, ascending within a group
+#   u32[count]    row ids grouped by interval set, ascending within a group
+#
+# Usage:
+# python row_index.py build [-o o/row_index] [--lengths 12] [--intervals 1 2 3 6 9 10 11] [--jobs N]
+# python row_index.py query [-d o/row_index] [--length 12] [--first P] [--last P]
+#                           [--include I ...] [--exclude I ...] [--sample N] [--seed S]
+
+import argparse
+import bisect
+import logging
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from rowgen import ALLOWED_INTERVALS, PITCH_CLASSES, interval_class
+
+INDEX_VERSION = 1
+INDEX_MAGIC = b'OSRI'
+HEADER = struct.Struct('<4sHHIHH')
+DEFAULT_INDEX_DIR = 'o/row_index'
+MAX_INDEX_LENGTH = PITCH_CLASSES
+
+# Byte → (high nibble, low nibble)
+_NIBBLES = [(b >> 4, b & 0x0F) for b in range(256)]
+
+
+def interval_mask(intervals):
+    """12-bit mask of directed intervals (mod 12)."""
+    mask = 0
+    for interval in intervals:
+        mask |= 1 << (interval % 12)
+    return mask
+
+
+def row_interval_mask(row):
+    mask = 0
+    for a, b in zip(row, row[1:]):
+        mask |= 1 << ((b - a) % 12)
+    return mask
+
+
+def row_bytes(length):
+    return (length + 1) // 2
+
+
+def pack_row(row):
+    padded = list(row) + [0x0F] * (len(row) % 2)
+    return bytes((padded[i] << 4) | padded[i + 1] for i in range(0, len(padded), 2))
+
+
+def index_path(index_dir, length):
+    return os.path.join(index_dir, f"rows-{length}.bin")
+
+
+def _pad4(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def _u32(values):
+    data = array('I', values)
+    if data.itemsize != 4:
+        data = array('L', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+# ---------------------------------------------------------------------------
+# Enumeration
+# ---------------------------------------------------------------------------
+
+def _transitions(allowed_intervals):
+    """next_pitches[last][last_class] → [(pitch, interval class), ...] ascending."""
+    allowed_classes = {interval_class(0, i) for i in allowed_intervals if i % 12}
+    table = []
+    for last in range(PITCH_CLASSES):
+        by_class = {}
+        for last_class in list(range(7)) + [None]:
+            options = []
+            for pitch in range(PITCH_CLASSES):
+                ic = interval_class(last, pitch)
+                if ic in allowed_classes and ic != last_class:
+                    options.append((pitch, ic))
+            by_class[last_class] = options
+        table.append(by_class)
+    return table
+
+
+def _enumerate_prefix(task):
+    """Worker: all rows of the wanted lengths that start with `prefix`."""
+    prefix, lengths, allowed_intervals = task
+    table = _transitions(allowed_intervals)
+    longest = max(lengths)
+    wanted = set(lengths)
+    out = {length: ([], array('B'), array('H')) for length in lengths}
+    row = list(prefix)
+
+    # The packed nibbles and interval mask are carried down the recursion
+    def dfs(used, last_class, code, mask):
+        depth = len(row)
+        if depth in wanted:
+            packed, lasts, masks = out[depth]
+            packed.append(((code << 4 | 0x0F) if depth % 2 else code).to_bytes(row_bytes(depth), 'big'))
+            lasts.append(row[-1])
+            masks.append(mask)
+        if depth == longest:
+            return
+        last = row[-1]
+        for pitch, ic in table[last][last_class]:
+            bit = 1 << pitch
+            if used & bit:
+                continue
+            row.append(pitch)
+            dfs(used | bit, ic, code << 4 | pitch, mask | 1 << ((pitch - last) % 12))
+            row.pop()
+
+    first = row[0]
+    if len(row) == 1:
+        dfs(1 << first, None, first, 0)
+    else:
+        second = row[1]
+        dfs((1 << first) | (1 << second), interval_class(first, second),
+            first << 4 | second, 1 << ((second - first) % 12))
+    return {length: (b''.join(p), l.tobytes(), m) for length, (p, l, m) in out.items()}
+
+
+def _prefixes(lengths, allowed_intervals):
+    """Two-note prefixes in ascending order (plus the one-note rows if wanted)."""
+    table = _transitions(allowed_intervals)
+    for first in range(PITCH_CLASSES):
+        if 1 in lengths:
+            yield (first,)
+        for second, _ in table[first][None]:
+            yield (first, second)
+
+
+def enumerate_rows(lengths, allowed_intervals=ALLOWED_INTERVALS, jobs=None):
+    """
+    {length: (packed rows, last pitches, interval masks)} for every valid row,
+    sorted, computed across `jobs` processes.
+    """
+    lengths = sorted(set(lengths))
+    deep = [length for length in lengths if length >= 2]
+    tasks = []
+    for prefix in _prefixes(lengths, allowed_intervals):
+        task_lengths = [1] if len(prefix) == 1 else deep
+        if task_lengths:
+            tasks.append((prefix, task_lengths, tuple(sorted(allowed_intervals))))
+
+    results = {length: ([], [], array('H')) for length in lengths}
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            chunks = pool.imap(_enumerate_prefix, tasks, chunksize=4)
+            _collect(chunks, results)
+    else:
+        _collect(map(_enumerate_prefix, tasks), results)
+
+    return {
+        length: (b''.join(packed), b''.join(lasts), masks)
+        for length, (packed, lasts, masks) in results.items()
+    }
+
+
+def _collect(chunks, results):
+    for chunk in chunks:
+        for length, (packed, lasts, masks) in chunk.items():
+            if length in results:
+                results[length][0].append(packed)
+                results[length][1].append(lasts)
+                results[length][2].extend(masks)
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def write_index(path, length, packed, lasts, masks, allowed_intervals):
+    """Write one rows-<length>.bin file atomically. Returns the row count."""
+    width = row_bytes(length)
+    count = len(packed) // width
+
+    first_offsets = [0] * (PITCH_CLASSES + 1)
+    for i in range(count):
+        first_offsets[(packed[i * width] >> 4) + 1] += 1
+    for p in range(PITCH_CLASSES):
+        first_offsets[p + 1] += first_offsets[p]
+
+    by_last = [[] for _ in range(PITCH_CLASSES)]
+    for i, last in enumerate(lasts):
+        by_last[last].append(i)
+    last_offsets = [0]
+    for ids in by_last:
+        last_offsets.append(last_offsets[-1] + len(ids))
+
+    by_mask = {}
+    for i, mask in enumerate(masks):
+        by_mask.setdefault(mask, []).append(i)
+    mask_values = sorted(by_mask)
+    mask_offsets = [0]
+    for mask in mask_values:
+        mask_offsets.append(mask_offsets[-1] + len(by_mask[mask]))
+
+    mask_array = array('H', mask_values)
+    if sys.byteorder != 'little':
+        mask_array.byteswap()
+
+    sections = [
+        HEADER.pack(INDEX_MAGIC, INDEX_VERSION, length, count, interval_mask(allowed_intervals), len(mask_values)),
+        _u32(first_offsets),
+        _u32(last_offsets),
+        _pad4(mask_array.tobytes()),
+        _u32(mask_offsets),
+        _pad4(packed),
+        _u32(i for ids in by_last for i in ids),
+        _u32(i for mask in mask_values for i in by_mask[mask]),
+    ]
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        for section in sections:
+            f.write(section)
+    os.replace(temp_path, path)
+    return count
+
+
+def build(index_dir, lengths, allowed_intervals=ALLOWED_INTERVALS, jobs=None):
+    """Enumerate and write rows-<length>.bin for each length. Returns {length: count}."""
+    bad = [length for length in lengths if not 1 <= length <= MAX_INDEX_LENGTH]
+    if bad:
+        raise ValueError(f"row index supports lengths 1-{MAX_INDEX_LENGTH}, got {bad}")
+    os.makedirs(index_dir, exist_ok=True)
+    rows = enumerate_rows(lengths, allowed_intervals, jobs=jobs)
+    return {
+        length: write_index(index_path(index_dir, length), length, *rows[length], allowed_intervals)
+        for length in sorted(rows)
+    }
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+class RowIndex:
+    """Read-only, memory-mapped view of one rows-<length>.bin file."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.length, self.count, self.allowed_mask, n_masks = HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a row index")
+        if version != INDEX_VERSION:
+            raise ValueError(f"{path}: unsupported row index version {version}")
+        if sys.byteorder != 'little':
+            raise ValueError("row index files are little-endian")
+
+        view = memoryview(self._map)
+        offset = HEADER.size
+
+        def take(fmt, n, size):
+            nonlocal offset
+            section = view[offset:offset + n * size].cast(fmt)
+            offset += n * size + (-(n * size) % 4)
+            return section
+
+        self._first = take('I', PITCH_CLASSES + 1, 4)
+        self._last = take('I', PITCH_CLASSES + 1, 4)
+        self._masks = take('H', n_masks, 2)
+        self._mask_offsets = take('I', n_masks + 1, 4)
+        self.width = row_bytes(self.length)
+        self._rows = take('B', self.count * self.width, 1)
+        self._last_ids = take('I', self.count, 4)
+        self._mask_ids = take('I', self.count, 4)
+
+    @classmethod
+    def open(cls, index_dir, length):
+        return cls(index_path(index_dir, length))
+
+    def close(self):
+        for section in (self._first, self._last, self._masks, self._mask_offsets,
+                        self._rows, self._last_ids, self._mask_ids):
+            section.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def allowed_intervals(self):
+        return frozenset(i for i in range(12) if self.allowed_mask >> i & 1)
+
+    def row(self, i):
+        start = i * self.width
+        row = []
+        for byte in self._rows[start:start + self.width]:
+            row.extend(_NIBBLES[byte])
+        return row[:self.length]
+
+    def _last_pitch(self, i):
+        position = self.length - 1
+        byte = self._rows[i * self.width + position // 2]
+        return byte & 0x0F if position % 2 else byte >> 4
+
+    # -- filtering ----------------------------------------------------------
+
+    def _groups(self, first=None, last=None, include=(), exclude=()):
+        """
+        Sorted id sequences whose union is exactly the matching rows, plus a
+        residual test for the filters the chosen groups do not cover.
+        """
+        lo, hi = (self._first[first], self._first[first + 1]) if first is not None else (0, self.count)
+        need, avoid = interval_mask(include), interval_mask(exclude)
+
+        if need or avoid:
+            groups = []
+            for j, mask in enumerate(self._masks):
+                if mask & need == need and not mask & avoid:
+                    ids = self._mask_ids[self._mask_offsets[j]:self._mask_offsets[j + 1]]
+                    groups.append(_clip(ids, lo, hi))
+            residual = (lambda i: self._last_pitch(i) == last) if last is not None else None
+            return groups, residual
+
+        if last is not None:
+            ids = self._last_ids[self._last[last]:self._last[last + 1]]
+            return [_clip(ids, lo, hi)], None
+        return [range(lo, hi)], None
+
+    def count_matching(self, **filters):
+        groups, residual = self._groups(**filters)
+        if residual is None:
+            return sum(len(ids) for ids in groups)
+        return sum(1 for ids in groups for i in ids if residual(i))
+
+    def ids(self, **filters):
+        """Matching row ids in ascending order."""
+        groups, residual = self._groups(**filters)
+        ids = sorted(i for group in groups for i in group)
+        return [i for i in ids if residual(i)] if residual else ids
+
+    def filter(self, first=None, last=None, include=(), exclude=()):
+        """Matching rows, in sorted order."""
+        for i in self.ids(first=first, last=last, include=include, exclude=exclude):
+            yield self.row(i)
+
+    def sample(self, rng=None, first=None, last=None, include=(), exclude=()):
+        """One uniformly drawn matching row, or None if there is none."""
+        rng = rng or random
+        groups, residual = self._groups(first=first, last=last, include=include, exclude=exclude)
+        if residual is not None:
+            candidates = [i for ids in groups for i in ids if residual(i)]
+            return self.row(rng.choice(candidates)) if candidates else None
+        total = sum(len(ids) for ids in groups)
+        if not total:
+            return None
+        pick = rng.randrange(total)
+        for ids in groups:
+            if pick < len(ids):
+                return self.row(ids[pick])
+            pick -= len(ids)
+
+
+def _clip(ids, lo, hi):
+    """Part of an ascending id sequence within [lo, hi)."""
+    return ids[bisect.bisect_left(ids, lo):bisect.bisect_left(ids, hi)]
+
+
+def draw_row(row_length, seed=None, rng=None, index_dir=DEFAULT_INDEX_DIR, start_pitch=None):
+    """
+    generate_row() replacement that draws from a prebuilt index when one
+    exists for this length and the default interval rules, and falls back to
+    the backtracking search otherwise.
+    """
+    path = index_path(index_dir, row_length)
+    if os.path.exists(path):
+        with RowIndex(path) as index:
+            if index.allowed_intervals == ALLOWED_INTERVALS:
+                first = start_pitch % 12 if start_pitch is not None else None
+                return index.sample(rng or random.Random(seed), first=first)
+    from rowgen import generate_row
+    return generate_row(row_length, seed=seed, rng=rng, start_pitch=start_pitch)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the exhaustive row index.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help="Enumerate every valid row and write the index")
+    build_parser.add_argument('-o', '--output-dir', default=DEFAULT_INDEX_DIR)
+    build_parser.add_argument('--lengths', type=int, nargs='+', default=[PITCH_CLASSES])
+    build_parser.add_argument('--intervals', type=int, nargs='+', default=sorted(ALLOWED_INTERVALS),
+                              help="Allowed directed intervals (default: rowgen's)")
+    build_parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: all cores)")
+
+    query_parser = commands.add_parser('query', help="Count or sample rows from an index")
+    query_parser.add_argument('-d', '--index-dir', default=DEFAULT_INDEX_DIR)
+    query_parser.add_argument('--length', type=int, default=PITCH_CLASSES)
+    query_parser.add_argument('--first', type=int, default=None, help="First pitch class")
+    query_parser.add_argument('--last', type=int, default=None, help="Last pitch class")
+    query_parser.add_argument('--include', type=int, nargs='*', default=(), help="Intervals that must occur")
+    query_parser.add_argument('--exclude', type=int, nargs='*', default=(), help="Intervals that must not occur")
+    query_parser.add_argument('--sample', type=int, default=0, help="Print N random matching rows")
+    query_parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        counts = build(args.output_dir, args.lengths, set(args.intervals), jobs=args.jobs)
+        for length, count in counts.items():
+            size = os.path.getsize(index_path(args.output_dir, length))
+            logging.info(f"length {length}: {count:,} rows, {size:,} bytes")
+        logging.info(f"built in {time.perf_counter() - start:.1f}s → {args.output_dir}")
+        return
+
+    filters = {'first': args.first, 'last': args.last, 'include': args.include, 'exclude': args.exclude}
+    with RowIndex.open(args.index_dir, args.length) as index:
+        start = time.perf_counter()
+        count = index.count_matching(**filters)
+        elapsed = time.perf_counter() - start
+        logging.info(f"{count:,} of {len(index):,} rows match ({elapsed * 1e6:.0f} µs)")
+        rng = random.Random(args.seed)
+        for _ in range(args.sample if count else 0):
+            print(' '.join(str(p) for p in index.sample(rng, **filters)))
+
+
+if __name__ == "__main__":
+    main()
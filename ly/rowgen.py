@@ -0,0 +1,144 @@
+# Constrained Row Generator
+#
+# Backtracking search over the interval rules used by noteheads.py and gen.py.
+#
+# Rules (identical to the old rejection sampler):
+#   - consecutive pitches must form an interval class in ALLOWED_INTERVALS
+#     (1, 2, 3, 6 and their inversions 11, 10, 9)
+#   - the same interval class may not appear twice in a row
+#   - every pitch may occur once per 12-note cycle
+#     (limit = 1 + position // 12)
+#   - the 12th unique pitch is permanently limited to a single occurrence
+#
+# Instead of drawing random pitches until the rules pass, candidates are
+# shuffled with a seeded RNG and explored depth-first.  Dead states are
+# remembered, so the search is complete (it never fails when a valid row
+# exists) and always terminates.  Lengths that cannot satisfy the occurrence
+# limits (anything over 23 notes) are rejected before the search starts.
+#
+# Usage:
+#   from rowgen import generate_row
+#   row = generate_row(12, seed=42)
+
+import random
+import logging
+
+ALLOWED_INTERVALS = frozenset({1, 2, 3, 6, 9, 10, 11})
+PITCH_CLASSES = 12
+PITCH_LIMIT_BASE = 1
+
+
+def interval_class(a, b):
+    """Return the interval class (0-6) between two pitch classes."""
+    interval = (b - a) % 12
+    return min(interval, 12 - interval)
+
+
+def occurrence_limit(position):
+    """Maximum occurrences of a pitch when placing the note at `position`."""
+    return PITCH_LIMIT_BASE + position // PITCH_CLASSES
+
+
+def max_row_length():
+    """
+    Longest row the occurrence rules can ever produce.
+
+    Once the 12th unique pitch is frozen at one occurrence, the remaining
+    eleven pitches must absorb every further note within the per-cycle limit.
+    """
+    position = 0
+    while True:
+        limit = occurrence_limit(position)
+        if position < PITCH_CLASSES:
+            capacity = PITCH_CLASSES * limit
+        else:
+            capacity = (PITCH_CLASSES - 1) * limit + 1
+        if position >= capacity:
+            return position
+        position += 1
+
+
+MAX_ROW_LENGTH = max_row_length()
+
+
+def generate_row(row_length, seed=None, rng=None, allowed_intervals=ALLOWED_INTERVALS, start_pitch=None):
+    """
+    Generate a row of `row_length` pitch classes satisfying the interval rules.
+
+    Args:
+        row_length (int): Number of notes in the row.
+        seed (int): Seed for a private RNG; identical seeds give identical rows.
+        rng (random.Random): Explicit RNG to draw from (overrides `seed`).
+        allowed_intervals (set): Intervals permitted between notes; only their interval
+            class counts (7 allows 5, 11 allows 1), so direction is ignored.
+        start_pitch (int): Force the first pitch class.
+
+    Returns:
+        list[int] | None: The row, or None when no valid row exists.
+    """
+    if row_length <= 0:
+        return []
+
+    if row_length > MAX_ROW_LENGTH:
+        logging.error(f"No valid row of length {row_length} exists (maximum is {MAX_ROW_LENGTH}).")
+        return None
+
+    if rng is None:
+        rng = random.Random(seed)
+
+    allowed_classes = {interval_class(0, i) for i in allowed_intervals if i % 12}
+
+    row = []
+    counts = [0] * PITCH_CLASSES
+    dead_states = set()
+
+    def state_key():
+        banned = row[PITCH_CLASSES - 1] if len(row) >= PITCH_CLASSES else None
+        last_class = interval_class(row[-2], row[-1]) if len(row) > 1 else None
+        return (len(row), row[-1] if row else None, last_class, banned, tuple(counts))
+
+    def candidates():
+        position = len(row)
+        limit = occurrence_limit(position)
+        banned = row[PITCH_CLASSES - 1] if position >= PITCH_CLASSES else None
+
+        if not row:
+            pool = [start_pitch % 12] if start_pitch is not None else list(range(PITCH_CLASSES))
+        else:
+            last = row[-1]
+            last_class = interval_class(row[-2], last) if len(row) > 1 else None
+            pool = []
+            for pitch in range(PITCH_CLASSES):
+                ic = interval_class(last, pitch)
+                if ic not in allowed_classes or ic == last_class:
+                    continue
+                pool.append(pitch)
+
+        pool = [p for p in pool if counts[p] < limit and p != banned]
+        rng.shuffle(pool)
+        return pool
+
+    def search():
+        if len(row) == row_length:
+            return True
+
+        key = state_key()
+        if key in dead_states:
+            return False
+
+        for pitch in candidates():
+            row.append(pitch)
+            counts[pitch] += 1
+            if search():
+                return True
+            counts[pitch] -= 1
+            row.pop()
+
+        dead_states.add(key)
+        return False
+
+    if search():
+        return row
+
+    logging.error(f"No valid row of length {row_length} exists under the interval rules.")
+    return None
@@ -0,0 +1,294 @@
+# LilyPond SVG Fragment Export
+#
+# Compiles a generated .ly file with LilyPond's SVG backend and rewrites the
+# result into a plain SVG fragment that can be pasted straight into an
+# oscillaScore score (public/svg/*.svg) without the Inkscape round-trip.
+#
+# The rewrite is a single streaming (SAX) pass:
+#   - drops <title>, <desc>, <metadata>, <style> and point-and-click <a> links
+#   - flattens nested <g> groups: group transforms and inherited colour are
+#     pushed down onto the leaf shapes as one matrix(...) each
+#   - keeps groups that carry an id (the note-* ids attached by noteheads.py
+#     through NoteHead.output-attributes), so app.js can find them
+#   - wraps everything in one <g id="fragment-..."> ready to paste
+#
+# Usage:
+# python svg_export.py <input.ly|input.svg> <output.svg> [--id ID] [--scale S]
+
+import argparse
+import hashlib
+import math
+import os
+import re
+import subprocess
+import sys
+import xml.sax
+from xml.sax.saxutils import escape, quoteattr
+
+LILYPOND = os.environ.get('LILYPOND', 'lilypond')
+
+DROPPED_ELEMENTS = {'title', 'desc', 'metadata', 'style'}
+UNWRAPPED_ELEMENTS = {'a'}
+INHERITED_ATTRIBUTES = ('color', 'fill', 'stroke', 'font-family')
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+
+
+# ---------------------------------------------------------------------------
+# Affine transforms (a, b, c, d, e, f) as in SVG matrix()
+# ---------------------------------------------------------------------------
+
+def multiply(m1, m2):
+    """Compose two affine matrices: apply m2 first, then m1."""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def parse_transform(text):
+    """Parse an SVG transform attribute into a single matrix."""
+    matrix = IDENTITY
+    for name, raw_args in _TRANSFORM_RE.findall(text or ''):
+        args = [float(v) for v in re.split(r'[\s,]+', raw_args.strip()) if v]
+        if name == 'matrix' and len(args) == 6:
+            step = tuple(args)
+        elif name == 'translate':
+            step = (1.0, 0.0, 0.0, 1.0, args[0], args[1] if len(args) > 1 else 0.0)
+        elif name == 'scale':
+            sx = args[0]
+            sy = args[1] if len(args) > 1 else sx
+            step = (sx, 0.0, 0.0, sy, 0.0, 0.0)
+        elif name == 'rotate':
+            angle = math.radians(args[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(args) == 3:
+                cx, cy = args[1], args[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == 'skewX':
+            step = (1.0, 0.0, math.tan(math.radians(args[0])), 1.0, 0.0, 0.0)
+        elif name == 'skewY':
+            step = (1.0, math.tan(math.radians(args[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def format_matrix(matrix, precision=4):
+    if matrix == IDENTITY:
+        return None
+    a, b, c, d, e, f = matrix
+    if (a, b, c, d) == (1.0, 0.0, 0.0, 1.0):
+        return f"translate({_num(e, precision)},{_num(f, precision)})"
+    return "matrix(" + ",".join(_num(v, precision) for v in matrix) + ")"
+
+
+def _num(value, precision):
+    text = f"{value:.{precision}f}".rstrip('0').rstrip('.')
+    return '0' if text in ('-0', '') else text
+
+
+# ---------------------------------------------------------------------------
+# Streaming rewrite
+# ---------------------------------------------------------------------------
+
+class FragmentWriter(xml.sax.handler.ContentHandler):
+    """SAX handler that writes the flattened fragment as it parses."""
+
+    def __init__(self, out, fragment_id, scale=1.0, precision=4):
+        super().__init__()
+        self.out = out
+        self.fragment_id = fragment_id
+        self.precision = precision
+        self.root_matrix = (scale, 0.0, 0.0, scale, 0.0, 0.0)
+        self.scale = scale
+        # One frame per open element: (kind, matrix, inherited, tag)
+        #   kind: 'root' | 'drop' | 'skip' | 'emit'
+        self.stack = []
+        self.seen_ids = {}
+
+    # -- helpers ------------------------------------------------------------
+
+    def _context(self):
+        for kind, matrix, inherited, _ in reversed(self.stack):
+            if kind != 'drop':
+                return matrix, inherited
+        return self.root_matrix, {}
+
+    def _dropping(self):
+        return any(kind == 'drop' for kind, _, _, _ in self.stack)
+
+    def _unique_id(self, element_id):
+        count = self.seen_ids.get(element_id, 0)
+        self.seen_ids[element_id] = count + 1
+        return element_id if count == 0 else f"{element_id}-{count}"
+
+    # -- SAX events ---------------------------------------------------------
+
+    def startElement(self, name, attrs):
+        tag = name.split(':')[-1]
+        attrs = dict(attrs.items())
+
+        if self._dropping() or tag in DROPPED_ELEMENTS:
+            self.stack.append(('drop', None, None, tag))
+            return
+
+        if not self.stack:
+            self._write_root(attrs)
+            self.stack.append(('root', self.root_matrix, {}, tag))
+            return
+
+        matrix, inherited = self._context()
+        matrix = multiply(matrix, parse_transform(attrs.pop('transform', None)))
+        inherited = dict(inherited)
+        for key in INHERITED_ATTRIBUTES:
+            if key in attrs and tag in ('g', 'a'):
+                inherited[key] = attrs.pop(key)
+
+        if tag in UNWRAPPED_ELEMENTS or (tag == 'g' and 'id' not in attrs):
+            self.stack.append(('skip', matrix, inherited, tag))
+            return
+
+        if tag == 'g':
+            # Identified group (e.g. note-*): keep it, but push its transform down
+            attrs['id'] = self._unique_id(attrs['id'])
+            attrs.update(inherited)
+            self._write_start(tag, attrs)
+            self.stack.append(('emit', matrix, {}, tag))
+            return
+
+        for key, value in inherited.items():
+            attrs.setdefault(key, value)
+        transform = format_matrix(matrix, self.precision)
+        if transform:
+            attrs['transform'] = transform
+        if 'id' in attrs:
+            attrs['id'] = self._unique_id(attrs['id'])
+        self._write_start(tag, attrs)
+        # Children of a shape (e.g. <tspan>) are already in its coordinate system
+        self.stack.append(('emit', IDENTITY, {}, tag))
+
+    def endElement(self, name):
+        kind, _, _, tag = self.stack.pop()
+        if kind == 'emit':
+            self.out.write(f"</{tag}>")
+        elif kind == 'root':
+            self.out.write("</g>\n</svg>\n")
+
+    def characters(self, content):
+        if not self.stack or self._dropping():
+            return
+        kind = self.stack[-1][0]
+        if kind == 'emit':
+            self.out.write(escape(content))
+
+    # -- output -------------------------------------------------------------
+
+    def _write_start(self, tag, attrs):
+        rendered = ''.join(f" {key}={quoteattr(value)}" for key, value in attrs.items())
+        self.out.write(f"<{tag}{rendered}>")
+
+    def _write_root(self, attrs):
+        root = {
+            'xmlns': 'http://www.w3.org/2000/svg',
+            'xmlns:xlink': 'http://www.w3.org/1999/xlink',
+            'version': '1.1',
+        }
+        view_box = attrs.get('viewBox')
+        if view_box:
+            x, y, width, height = (float(v) for v in re.split(r'[\s,]+', view_box.strip()))
+            s = self.scale
+            root['viewBox'] = ' '.join(_num(v * s, self.precision) for v in (x, y, width, height))
+            root['width'] = _num(width * s, self.precision)
+            root['height'] = _num(height * s, self.precision)
+        self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._write_start('svg', root)
+        self.out.write("\n")
+        self._write_start('g', {'id': self.fragment_id, 'class': 'lilypond-fragment'})
+        self.out.write("\n")
+
+
+def rewrite_svg(input_path, output_path, fragment_id, scale=1.0, precision=4):
+    """Stream `input_path` (LilyPond SVG) into a plain fragment at `output_path`."""
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as out:
+        parser = xml.sax.make_parser()
+        parser.setFeature(xml.sax.handler.feature_namespaces, False)
+        parser.setFeature(xml.sax.handler.feature_external_ges, False)
+        parser.setContentHandler(FragmentWriter(out, fragment_id, scale=scale, precision=precision))
+        parser.parse(input_path)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def fragment_id_for(ly_path):
+    """Stable id derived from the .ly content, so identical scores share an id."""
+    with open(ly_path, 'rb') as f:
+        return f"fragment-{hashlib.sha256(f.read()).hexdigest()[:8]}"
+
+
+def svg_candidates(ly_path):
+    """Files LilyPond's SVG backend may write for `ly_path`, preferred first."""
+    output_base = os.path.splitext(ly_path)[0]
+    return [f"{output_base}.cropped.svg", f"{output_base}.svg"]
+
+
+def compile_svg(ly_path, timeout=None):
+    """Run LilyPond's SVG backend (cropped, no point-and-click). Returns the SVG path."""
+    output_base = os.path.splitext(ly_path)[0]
+    command = [
+        LILYPOND, '-dbackend=svg', '-dcrop', '-dno-point-and-click',
+        f"--output={output_base}", ly_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        tail = '\n'.join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"lilypond exited with {result.returncode}: {tail}")
+
+    for candidate in svg_candidates(ly_path):
+        if os.path.exists(candidate):
+            return candidate
+    raise RuntimeError(f"lilypond produced no SVG for {ly_path}")
+
+
+def render_fragment(ly_path, output_path, fragment_id=None, scale=1.0, timeout=None):
+    """Compile `ly_path` to SVG and write the pasteable fragment to `output_path`."""
+    fragment_id = fragment_id or fragment_id_for(ly_path)
+    raw_svg = compile_svg(ly_path, timeout=timeout)
+    try:
+        return rewrite_svg(raw_svg, output_path, fragment_id, scale=scale)
+    finally:
+        # LilyPond may write both the cropped and the full page; keep neither
+        for candidate in svg_candidates(ly_path):
+            if os.path.abspath(candidate) != os.path.abspath(output_path) and os.path.exists(candidate):
+                os.remove(candidate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a LilyPond score as a plain oscillaScore SVG fragment.")
+    parser.add_argument('input', help=".ly file to compile, or an SVG already produced by LilyPond")
+    parser.add_argument('output', help="Output SVG path")
+    parser.add_argument('--id', default=None, help="Fragment group id (default: content hash)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Uniform scale baked into the geometry")
+    args = parser.parse_args()
+
+    if args.input.endswith('.ly'):
+        render_fragment(args.input, args.output, fragment_id=args.id, scale=args.scale)
+    else:
+        fragment_id = args.id or f"fragment-{os.path.splitext(os.path.basename(args.input))[0]}"
+        rewrite_svg(args.input, args.output, fragment_id, scale=args.scale)
+    print(args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
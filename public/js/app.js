@@ -44,6 +44,7 @@ import {
   activeAudioCues,
   handleMediaCue,
   handleOscCue,
+  spliceGeneratedStaff,
   parseTraverseCueId,
   startTraverseAnimation,
   handleTraverseCue,
@@ -853,6 +854,11 @@ function flattenTransforms(svgRoot) {
               console.log("[CLIENT] Received cuePause_ack from another client.");
               break;
 
+            /** 🎼 Live Generated Staff (cueGenerate / OSC /generate/next) */
+            case "generated_staff":
+              spliceGeneratedStaff(data);
+              break;
+
             /** ✅ Audio Cue Received */
             case "audio_cue":
               console.log(`[CLIENT] Received audio cue event: ${data.filename} at volume ${data.volume}`);
@@ -1756,6 +1762,9 @@ preloadSpeedCues();
       const original = svgElement.querySelector(`#${CSS.escape(refId)}`);
       if (!original) return;
 
+      // Shared glyphs written by scripts/svg_optimize.py are plain shapes, not rotating objects
+      if (original.closest('defs.glyphs')) return;
+
       // Clone the original
       const deepClone = original.cloneNode(true);
       deepClone.removeAttribute("transform"); // prevent double-transform
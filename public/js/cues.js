@@ -12,6 +12,7 @@
  *  - cueSpeed, cueChoice         → Parameter change or user interaction
  *  - cueRepeat_*                 → Repeating sections with jump logic
  *  - cueAudio, cueOsc*           → Media and OSC triggering
+ *  - cueGenerate                 → Live generated staves (ly/genserver.py)
  *  - cueTraverse (c-t)           → Object animation along defined points
  *  - cueAnimejs, cueAnimation    → Fullscreen animated SVG overlays
  *
@@ -39,6 +40,7 @@ export const cueHandlers = {
   cueOscRandom: handleOscCue,
   cueOscBurst: handleOscCue,
   cueOscPulse: handleOscCue,
+  cueGenerate: handleGenerateCue,
   cueRepeat: handleRepeatCue,
   cueTraverse: handleTraverseCue,
   "c-t": handleTraverseCue,
@@ -1591,6 +1593,85 @@ export function handleOscCue(cueId, cueParams = {}) {
 }
 
 
+/**
+ * handleGenerateCue(cueId, cueParams = {})
+ *
+ * Asks the server for the next variant of a live generator stream
+ * (ly/genserver.py, via server.js). The server broadcasts the result as a
+ * `generated_staff` message, which spliceGeneratedStaff() places in the score.
+ *
+ * Cue Format:
+ *   cueGenerate(stream)[_len(12)][_seed(7)][_mode(serial)][_heads(random)]
+ *
+ *   stream  → stream name; also picks the placeholder element `generate-<stream>`
+ *   len     → row length                  (default 12)
+ *   seed    → seed for the row and variants
+ *   mode    → pitches | percussion | both | serial (48 row forms in turn)
+ *   heads   → notehead mode as in noteheads.py
+ *
+ * Every client that passes the cue sends the request; the server forwards
+ * only the first one per cue.
+ */
+export function handleGenerateCue(cueId, cueParams = {}) {
+  const stream = String(cueParams.choice ?? "default");
+  const params = {};
+  if (cueParams.len !== undefined) params.row_length = Number(cueParams.len);
+  if (cueParams.seed !== undefined) params.seed = Number(cueParams.seed);
+  if (cueParams.mode !== undefined) params.output = cueParams.mode === "serial" ? "serial" : `rotations=${cueParams.mode}`;
+  if (cueParams.heads !== undefined) params.noteheads = String(cueParams.heads);
+
+  if (window.socket?.readyState !== WebSocket.OPEN) {
+    console.warn(`[cueGenerate] ❌ No server connection for ${cueId}`);
+    return;
+  }
+  window.socket.send(JSON.stringify({
+    type: "generate_next",
+    cueId,
+    stream,
+    params: Object.keys(params).length ? params : undefined
+  }));
+  console.log(`[cueGenerate] 🎼 Requested next variant of stream '${stream}'`);
+}
+
+/**
+ * spliceGeneratedStaff(data)
+ *
+ * Places a `generated_staff` SVG fragment in the score at the element with
+ * id `generate-<stream>`:
+ *   - a <g> placeholder has its children replaced by the fragment
+ *   - any other element (e.g. a <rect>) is used as the box the fragment is
+ *     fitted into; the fragment is inserted after it and replaced next time
+ */
+export function spliceGeneratedStaff(data) {
+  const placeholder = document.getElementById(`generate-${data.stream}`);
+  if (!placeholder) {
+    console.warn(`[cueGenerate] ⚠️ No placeholder #generate-${data.stream} for ${data.name}`);
+    return;
+  }
+
+  const doc = new DOMParser().parseFromString(data.svg, "image/svg+xml");
+  const fragment = doc.documentElement;
+  if (!fragment || fragment.nodeName !== "svg") {
+    console.warn(`[cueGenerate] ❌ Could not parse SVG for ${data.name}`);
+    return;
+  }
+  const node = document.importNode(fragment, true);
+  node.setAttribute("data-generated", data.name);
+
+  if (placeholder.tagName.toLowerCase() === "g") {
+    placeholder.replaceChildren(node);
+  } else {
+    const box = placeholder.getBBox();
+    ["x", "y", "width", "height"].forEach((key) => node.setAttribute(key, box[key]));
+    node.setAttribute("preserveAspectRatio", "xMinYMid meet");
+    node.id = `generate-${data.stream}-content`;
+    document.getElementById(node.id)?.remove();
+    placeholder.after(node);
+  }
+  console.log(`[cueGenerate] ✅ Spliced ${data.name} (${(data.staves || []).join(", ")}) into #generate-${data.stream}`);
+}
+
+
 
 
 
@@ -0,0 +1,453 @@
+# oscillaScore ID Mini-Syntax
+#
+# Python port of the id parsing done by the client (public/js/cues.js
+# parseCueParams / parseRepeatCueId, public/js/anim.js selectors and
+# parseO2PCompact), so scores can be checked at build time instead of on
+# stage.
+#
+# Canonical cue ids are camelCase:
+#   cuePause(30)                     leading (choice)
+#   cueAudio(kick.wav)_loop(2)_amp(0.8)
+#   cueChoice(sceneA)_dur(8)
+#   cueRepeat_s_anchor-intro_x_4     underscore key/value pairs
+# Anything after the last ")" is ignored (Inkscape's "-3-7" duplicate
+# suffixes).
+#
+# Older snake-case ids (cue_pause_dur_30, cue_speed_1-4, and the
+# cue_audio(file(x)_loop(1)_amp(1.0)) form written by the cue_id_stub
+# extension) are still found in scores, but parseCueParams reads their type
+# as "cue" and no handler runs.  They are reported as warnings together with
+# the canonical id to use instead.
+
+import re
+
+CUE_TYPES = {
+    'cueSpeed', 'cuePause', 'cueStop', 'cueChoice', 'cueAnimation', 'cueAnimejs',
+    'cueAudio', 'cueVideo', 'cueP5', 'cueOsc', 'cueOscTrigger', 'cueOscValue',
+    'cueOscSet', 'cueOscRandom', 'cueOscBurst', 'cueOscPulse', 'cueRepeat',
+    'cueTraverse', 'cueGenerate',
+}
+
+# Legacy snake-case type names (longest first so osc_trigger wins over osc)
+LEGACY_TYPES = sorted(
+    [
+        ('osc_trigger', 'cueOscTrigger'), ('osc_value', 'cueOscValue'), ('osc_set', 'cueOscSet'),
+        ('osc_random', 'cueOscRandom'), ('osc_burst', 'cueOscBurst'), ('osc_pulse', 'cueOscPulse'),
+        ('osc', 'cueOsc'), ('speed', 'cueSpeed'), ('pause', 'cuePause'), ('stop', 'cueStop'),
+        ('choice', 'cueChoice'), ('animation', 'cueAnimation'), ('animejs', 'cueAnimejs'),
+        ('audio', 'cueAudio'), ('video', 'cueVideo'), ('p5', 'cueP5'), ('repeat', 'cueRepeat'),
+        ('traverse', 'cueTraverse'),
+    ],
+    key=lambda pair: -len(pair[0]),
+)
+
+# Values a legacy id lists without a key, in order (cue_animation_orbit_3)
+LEGACY_POSITIONAL = {
+    'cueAnimation': ('choice', 'dur'),
+    'cueAnimejs': ('choice', 'dur'),
+    'cueChoice': ('choice', 'dur'),
+}
+
+LEGACY_KEYS = {
+    'dur', 'duration', 'loop', 'amp', 'speed', 'fadein', 'fadeout', 'file', 'ext',
+    'interval', 'shuffle', 'random', 'rate', 'count', 'min', 'max', 'value', 'addr',
+}
+
+# Underscore keys whose value may be a word (obj_rotate_..._ease_easeInOutSine)
+TEXT_VALUE_KEYS = {'ease', 'easing'}
+
+# Kinds of ids the client looks for, by prefix (first match wins)
+ID_KINDS = (
+    ('assignCues(', 'assign'),
+    ('cue', 'cue'),
+    ('c-t', 'cue'),
+    ('rehearsal_', 'rehearsal'),
+    ('anchor-', 'anchor'),
+    ('label-', 'label'),
+    ('note-', 'note'),
+    ('obj_rotate_', 'rotate'),
+    ('r(', 'rotate'),
+    ('r_', 'rotate'),
+    ('sXY(', 'scale'),
+    ('sX(', 'scale'),
+    ('sY(', 'scale'),
+    ('s(', 'scale'),
+    ('sXY[', 'scale'),
+    ('sX[', 'scale'),
+    ('sY[', 'scale'),
+    ('s[', 'scale'),
+    ('s_', 'scale'),
+    ('obj2path-', 'path_follow'),
+    ('o2p(', 'path_follow'),
+    ('o2p-', 'path_follow'),
+    ('path-effect', None),  # Inkscape live path effects, not score paths
+    ('path-', 'path'),
+)
+
+# Prefixes anim.js actually selects; other scale spellings are never animated
+ANIMATED_SCALE_PREFIXES = ('s(', 'sXY(', 'sX(', 'sY(')
+
+_TYPE_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9]*)')
+_LEADING_RE = re.compile(r'^\(([^)]+)\)')
+_KEY_VALUE_RE = re.compile(r'_([a-zA-Z0-9]+)\(([^)]+)\)')
+_COMPACT_PARAM_RE = re.compile(r'([a-zA-Z][a-zA-Z0-9]*)(?:\(([^)]*)\)|\[([^\]]*)\])')
+_INKSCAPE_SUFFIX_RE = re.compile(r'(?:-\d+)+-?$')
+_NUMBER_RE = re.compile(r'^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$')
+
+
+def number_or_text(value):
+    """'2.5' → 2.5, 'kick.wav' → 'kick.wav' (mirrors isNaN/parseFloat)."""
+    value = value.strip()
+    if _NUMBER_RE.match(value):
+        number = float(value)
+        return int(number) if number.is_integer() and '.' not in value else number
+    return value
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def kind_of(element_id):
+    """Which client feature an id belongs to ('cue', 'rotate', ...) or None."""
+    for prefix, kind in ID_KINDS:
+        if element_id.startswith(prefix):
+            return kind
+    return None
+
+
+def strip_suffix(element_id):
+    """Drop trailing text after the last ')' — what parseCueParams does."""
+    last = element_id.rfind(')')
+    return element_id[:last + 1] if last != -1 else element_id
+
+
+def parse_cue_params(cue_id):
+    """Port of cues.js parseCueParams. Returns (type, params, cleaned_id)."""
+    cleaned = strip_suffix(cue_id)
+    match = _TYPE_RE.match(cleaned)
+    if not match:
+        return cue_id, {}, cleaned
+
+    cue_type = match.group(1)
+    params = {}
+    rest = cleaned[len(cue_type):]
+    if rest.startswith('('):
+        leading = _LEADING_RE.match(rest)
+        if leading:
+            params['choice'] = number_or_text(leading.group(1))
+            rest = rest[leading.end():]
+        else:
+            rest = ''
+    for key, value in _KEY_VALUE_RE.findall(rest):
+        params[key] = number_or_text(value)
+    return cue_type, params, cleaned
+
+
+def parse_repeat(cue_id):
+    """Port of cues.js parseRepeatCueId. Returns a dict or None if invalid."""
+    if not cue_id.startswith('cueRepeat_'):
+        return None
+    tokens = cue_id[len('cueRepeat_'):].split('_')
+    repeat = {'start': None, 'end': 'self', 'count': None, 'resume': 'self', 'direction': 'f', 'action': None}
+    names = {'s': 'start', 'e': 'end', 'r': 'resume', 'd': 'direction', 'a': 'action'}
+
+    for i in range(0, len(tokens), 2):
+        tag = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else ''
+        if not value:
+            continue
+        if tag == 'x':
+            if value == 'inf':
+                repeat['count'] = 'inf'
+            else:
+                digits = re.match(r'^[-+]?\d+', value)
+                if digits:
+                    repeat['count'] = int(digits.group(0))
+        elif tag in names:
+            repeat[names[tag]] = value
+
+    if not repeat['start'] or repeat['count'] is None:
+        return None
+    return repeat
+
+
+def parse_compact_params(text):
+    """
+    Parameters of compact animation ids: 'r(deg[30,45])_alt_seqdur(6)'
+    → {'deg': [30, 45], 'seqdur': 6, 'alt': True}.
+    """
+    params = {}
+    leading = re.match(r'^(?:\(([^()\[\]]*)\)|\[([^\]]*)\])', text)
+    if leading:
+        # s(0.8,1.2)_dur(4): the values directly after the type name
+        values = leading.group(1) if leading.group(1) is not None else leading.group(2)
+        params['values'] = [number_or_text(v) for v in values.split(',') if v.strip()]
+        text = text[leading.end():]
+    for key, round_value, square_value in _COMPACT_PARAM_RE.findall(text):
+        if square_value:
+            params[key] = [number_or_text(v) for v in square_value.split(',') if v.strip()]
+        else:
+            params[key] = number_or_text(round_value) if round_value.strip() else True
+    for flag in re.findall(r'(?:^|_)([a-zA-Z]+)(?=_|$)', re.sub(_COMPACT_PARAM_RE, '', text)):
+        params.setdefault(flag, True)
+    return params
+
+
+def parse_underscore_params(tokens):
+    """['rpm', '2', 'dir', '1', 'alternate'] → {'rpm': 2, 'dir': 1, 'alternate': True}."""
+    params = {}
+    i = 0
+    while i < len(tokens):
+        key = tokens[i]
+        if not key:
+            i += 1
+            continue
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        if value is not None and (is_number(number_or_text(value)) or key in TEXT_VALUE_KEYS):
+            params[key] = number_or_text(value)
+            i += 2
+        else:
+            params[key] = True
+            i += 1
+    return params
+
+
+# ---------------------------------------------------------------------------
+# Cue validation
+# ---------------------------------------------------------------------------
+
+def _require_number(params, keys, label):
+    for key in keys:
+        if key in params:
+            if is_number(params[key]) and params[key] > 0:
+                return None
+            return f"{label} must be a positive number, got {params[key]!r}"
+    return f"missing {label} (expected one of: {', '.join(keys)})"
+
+
+def check_cue_params(cue_type, params):
+    """Return an error message if a canonical cue would be rejected by its handler."""
+    if cue_type == 'cueSpeed':
+        return _require_number(params, ('speed', 'Speed', 'choice'), 'speed')
+    if cue_type == 'cuePause':
+        return _require_number(params, ('duration', 'dur', 'choice'), 'duration')
+    if cue_type in ('cueAnimation', 'cueAnimejs'):
+        if 'choice' not in params:
+            return "missing animation name: cueAnimation(name)_dur(seconds)"
+        return _require_number(params, ('dur',), 'dur')
+    if cue_type == 'cueChoice':
+        if 'choice' not in params or 'dur' not in params:
+            return "cueChoice needs both a choice and _dur(...)"
+    if cue_type == 'cueAudio' and not (params.get('file') or params.get('choice')):
+        return "cueAudio requires a file: cueAudio(name.wav) or _file(name.wav)"
+    if cue_type in ('cueVideo', 'cueP5') and 'choice' not in params:
+        return f"{cue_type} requires a name: {cue_type}(name)"
+    if cue_type in ('cueOscTrigger', 'cueOscValue'):
+        if not is_number(params.get('choice', params.get('value'))):
+            return f"{cue_type} requires a numeric value: {cue_type}(1)"
+    if cue_type == 'cueOscRandom':
+        if not (is_number(params.get('min')) and is_number(params.get('max'))):
+            return "cueOscRandom requires _min(...) and _max(...)"
+    if cue_type == 'cueOscBurst' and not is_number(params.get('count', params.get('choice'))):
+        return "cueOscBurst requires a count: cueOscBurst(5)"
+    if cue_type == 'cueOscPulse':
+        if not (is_number(params.get('rate')) and is_number(params.get('duration'))):
+            return "cueOscPulse requires _rate(...) and _duration(...)"
+    if cue_type == 'cueGenerate':
+        for key in ('len', 'seed'):
+            if key in params and not is_number(params[key]):
+                return f"cueGenerate _{key}(...) must be a number"
+        if params.get('mode', 'pitches') not in ('pitches', 'percussion', 'both', 'serial'):
+            return "cueGenerate _mode(...) must be pitches, percussion, both or serial"
+    return None
+
+
+def canonical_from_legacy(cue_id):
+    """
+    Suggest a canonical id for a snake-case cue.  Returns (cue_type, params,
+    suggestion); cue_type is None if the legacy type is unknown.
+    """
+    body = cue_id[len('cue_'):]
+
+    # Nested form written by the cue_id_stub extension: cue_audio(file(x)_loop(1))
+    nested = re.match(r'^([a-z0-9_]+)\((.*)\)', body)
+    if nested and nested.group(1) in dict(LEGACY_TYPES):
+        legacy_type, inner = nested.groups()
+        cue_type = dict(LEGACY_TYPES)[legacy_type]
+        params = {key: number_or_text(value) for key, value in _KEY_VALUE_RE.findall('_' + inner)}
+    else:
+        body = _INKSCAPE_SUFFIX_RE.sub('', body)
+        cue_type = None
+        for legacy_type, camel in LEGACY_TYPES:
+            if body == legacy_type or body.startswith(legacy_type + '_'):
+                cue_type = camel
+                body = body[len(legacy_type) + 1:]
+                break
+        if cue_type is None:
+            return None, {}, None
+
+        if cue_type in ('cueRepeat', 'cueTraverse'):
+            suggestion = f"{cue_type}_{body}" if body else cue_type
+            if cue_type == 'cueRepeat':
+                params = parse_repeat(suggestion) or {}
+            else:
+                params = parse_compact_params(body)
+            return cue_type, params, suggestion
+
+        tokens = [t for t in body.split('_') if t] if body else []
+        params = {}
+        positional = list(LEGACY_POSITIONAL.get(cue_type, ('choice',)))
+        while tokens and positional and tokens[0] not in LEGACY_KEYS:
+            params[positional.pop(0)] = number_or_text(tokens.pop(0))
+        for i in range(0, len(tokens) - 1, 2):
+            params[tokens[i]] = number_or_text(tokens[i + 1])
+
+    if cue_type is None:
+        return None, params, None
+    if 'file' in params and 'choice' not in params:
+        params = {'choice': params.pop('file'), **params}
+    return cue_type, params, format_cue(cue_type, params)
+
+
+def format_cue(cue_type, params):
+    """Build a canonical id: cueType(choice)_key(value)..."""
+    text = cue_type
+    if 'choice' in params:
+        text += f"({_format_value(params['choice'])})"
+    for key, value in params.items():
+        if key != 'choice':
+            text += f"_{key}({_format_value(value)})"
+    return text
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def analyse_cue(cue_id):
+    """
+    Validate a cue id.  Returns a dict with 'type', 'params' and optionally
+    'error', 'warning' and 'suggestion'.
+    """
+    if cue_id.startswith('cue_'):
+        cue_type, params, suggestion = canonical_from_legacy(cue_id)
+        result = {'type': cue_type, 'params': params}
+        if cue_type is None:
+            result['warning'] = "legacy snake-case cue of unknown type; it never triggers"
+        else:
+            result['warning'] = "legacy snake-case cue; parseCueParams reads its type as 'cue' so it never triggers"
+            result['suggestion'] = suggestion
+        return result
+
+    if cue_id.startswith('c-t'):
+        return {
+            'type': 'cueTraverse',
+            'params': parse_compact_params(cue_id[len('c-t'):]),
+            'warning': "c-t ids are not collected by extractScoreElements (ids must start with 'cue')",
+            'suggestion': 'cueTraverse' + cue_id[len('c-t'):],
+        }
+
+    cue_type, params, _ = parse_cue_params(cue_id)
+    result = {'type': cue_type, 'params': params}
+    if cue_type not in CUE_TYPES:
+        result['error'] = f"unknown cue type {cue_type!r}"
+        return result
+
+    if cue_type == 'cueRepeat':
+        repeat = parse_repeat(cue_id)
+        if repeat is None:
+            result['error'] = "cueRepeat needs a start and a count: cueRepeat_s_<startId>_x_<n>"
+        else:
+            result['params'] = repeat
+        return result
+
+    if cue_type == 'cueTraverse':
+        traverse = parse_compact_params(cue_id[len('cueTraverse'):])
+        result['params'] = traverse
+        if 'o' not in traverse:
+            result['error'] = "cueTraverse needs a target object: cueTraverse_o(objectId)"
+        return result
+
+    error = check_cue_params(cue_type, params)
+    if error:
+        result['error'] = error
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Animation ids
+# ---------------------------------------------------------------------------
+
+def analyse_animation(kind, element_id):
+    """Parse rotate/scale/path-follow ids. Same result shape as analyse_cue."""
+    if kind == 'rotate':
+        if element_id.startswith('obj_rotate_'):
+            tokens = _INKSCAPE_SUFFIX_RE.sub('', element_id[len('obj_rotate_'):]).split('_')
+            return {'type': 'rotate', 'params': parse_underscore_params(tokens)}
+        return {'type': 'rotate', 'params': parse_compact_params(strip_suffix(element_id)[1:])}
+
+    if kind == 'scale':
+        scale_type = element_id.split('(', 1)[0].split('[', 1)[0].split('_', 1)[0]
+        result = {'type': scale_type, 'params': parse_compact_params(strip_suffix(element_id)[len(scale_type):])}
+        if not element_id.startswith(ANIMATED_SCALE_PREFIXES):
+            result['warning'] = "scale id is not matched by anim.js (use s(...), sX(...), sY(...) or sXY(...))"
+        return result
+
+    if kind == 'path_follow':
+        if element_id.startswith('o2p('):
+            match = re.match(r'^o2p\(([^)]+)\)', element_id)
+            params = parse_compact_params(strip_suffix(element_id)[match.end():]) if match else {}
+            if not match:
+                return {'type': 'o2p', 'params': {}, 'error': "o2p id needs a path: o2p(pathId)"}
+            params['path'] = match.group(1)
+            return {'type': 'o2p', 'params': params}
+        # Legacy obj2path-<n>_speed_<s>_direction_<d>: same replace chain as anim.js
+        prefix = 'obj2path-' if element_id.startswith('obj2path-') else 'o2p-'
+        rest = element_id[len(prefix):].partition('_')[2]
+        params = parse_underscore_params(_INKSCAPE_SUFFIX_RE.sub('', rest).split('_')) if rest else {}
+        path_id = re.sub(r'_(speed|spd|s)_\d+(\.\d+)?', '', element_id, count=1)
+        path_id = re.sub(r'_(direction|dir|d)_\d+', '', path_id, count=1)
+        path_id = re.sub(r'_(ease|easing|e)_\d+', '', path_id, count=1)
+        params['path'] = 'path-' + path_id[len(prefix):]
+        return {'type': 'obj2path', 'params': params}
+
+    return {'type': kind, 'params': {}}
+
+
+def analyse_id(element_id):
+    """Classify and parse any id. Returns None for ids the client ignores."""
+    kind = kind_of(element_id)
+    if kind is None:
+        return None
+    if kind == 'cue':
+        result = analyse_cue(element_id)
+    elif kind in ('rotate', 'scale', 'path_follow'):
+        result = analyse_animation(kind, element_id)
+    elif kind == 'rehearsal':
+        result = {'type': 'rehearsal', 'params': {'mark': element_id[len('rehearsal_'):]}}
+    elif kind == 'assign':
+        match = re.match(r'^assignCues\((.+)\)$', element_id.split('-')[0])
+        result = {'type': 'assignCues', 'params': {'instruction': match.group(1)} if match else {}}
+        if not match:
+            result['error'] = "malformed assignCues(...) group id"
+    else:
+        result = {'type': kind, 'params': {}}
+    result['kind'] = kind
+    return result
+
+
+def id_references(result):
+    """(label, target id) for every id-valued parameter of an analyse_id result."""
+    params = result.get('params') or {}
+    if result['kind'] == 'path_follow':
+        targets = [('animation path', params.get('path'))]
+    elif result['type'] == 'cueTraverse':
+        targets = [('traverse target', params.get('o'))]
+    elif result['type'] == 'cueRepeat':
+        targets = [(f"cueRepeat {key}", params.get(key)) for key in ('start', 'end', 'resume')]
+    else:
+        targets = []
+    return [(label, target) for label, target in targets if isinstance(target, str) and target != 'self']
@@ -0,0 +1,251 @@
+# Cue Timeline Sidecar
+#
+# Precomputes where every cue sits along the playhead axis so clients and
+# server.js can find the active / next cue with a binary search instead of
+# walking the SVG DOM (see checkCueTriggers in public/js/cues.js).
+#
+# Positions are taken from score_index.py, which composes every nested
+# group transform (what app.js approximates with flattenGroupTransform and
+# bbox.x + CTM.e), and converted to playhead units: the SVG width attribute
+# that app.js uses as window.scoreWidth, i.e. the units of window.playheadX
+# and of the cue.x values checkCueTriggers compares against.
+#
+# Usage:
+# python cue_timeline.py <score.svg|score.index.json> [-o out.timeline.json] [--binary]
+#
+# <score>.timeline.json (columnar, sorted by start):
+#   {"version": 1, "scoreWidth": 60000, "scale": 3.78,
+#    "maxWidth": 412.5,                      widest cue, bounds the search window
+#    "cues":  {"start": [...], "end": [...], "id": [...], "type": [...]},
+#    "marks": {"x": [...], "id": [...]}}     rehearsal marks
+#
+# <score>.timeline.bin (--binary), little-endian:
+#   header  4s magic "OSCT", u16 version, u16 reserved, u32 count, f32 maxWidth
+#   f32[count] start, f32[count] end
+#   UTF-8 ids joined by "\n"
+# The float arrays start at byte 16, so a browser can view them with
+# new Float32Array(buffer, 16, count) without copying.
+
+import argparse
+import bisect
+import json
+import logging
+import os
+import struct
+import sys
+from array import array
+
+TIMELINE_VERSION = 1
+BINARY_MAGIC = b'OSCT'
+BINARY_HEADER = struct.Struct('<4sHHIf')
+
+# Ids app.js extractScoreElements collects as cues
+CUE_KINDS = ('cue', 'anchor')
+
+
+def score_scale(index):
+    """Factor from document (viewBox) units to playhead units."""
+    view_box = index.get('viewBox')
+    width = _leading_number(index.get('width'))
+    if not view_box or not width or not view_box[2]:
+        return 1.0, view_box[0] if view_box else 0.0, width
+    return width / view_box[2], view_box[0], width
+
+
+def _leading_number(value):
+    if value is None:
+        return None
+    digits = ''
+    for char in str(value).strip():
+        if char.isdigit() or char in '.-+eE':
+            digits += char
+        else:
+            break
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+class CueTimeline:
+    """Sorted cue intervals with bisect lookups. Positions are playhead units."""
+
+    def __init__(self, starts, ends, ids, types=None, mark_xs=(), mark_ids=(), score_width=None, scale=1.0):
+        order = sorted(range(len(starts)), key=lambda i: (starts[i], ids[i]))
+        self.starts = [starts[i] for i in order]
+        self.ends = [ends[i] for i in order]
+        self.ids = [ids[i] for i in order]
+        self.types = [types[i] for i in order] if types else [None] * len(order)
+        mark_order = sorted(range(len(mark_xs)), key=lambda i: mark_xs[i])
+        self.mark_xs = [mark_xs[i] for i in mark_order]
+        self.mark_ids = [mark_ids[i] for i in mark_order]
+        self.max_width = max((e - s for s, e in zip(self.starts, self.ends)), default=0.0)
+        self.score_width = score_width
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.starts)
+
+    # -- construction -------------------------------------------------------
+
+    @classmethod
+    def from_index(cls, index):
+        """Build from a score_index.py index dict."""
+        scale, origin, width = score_scale(index)
+        starts, ends, ids, types, mark_xs, mark_ids = [], [], [], [], [], []
+
+        for entry in index['elements']:
+            bbox = entry.get('bbox')
+            if bbox is None or entry.get('defs'):
+                continue
+            x0 = (bbox[0] - origin) * scale
+            x1 = (bbox[2] - origin) * scale
+            if entry['kind'] in CUE_KINDS and (entry['id'] or '').startswith(('cue', 'anchor-')):
+                starts.append(x0)
+                ends.append(x1)
+                ids.append(entry['id'])
+                types.append(entry['type'])
+            elif entry['kind'] == 'rehearsal':
+                mark_xs.append(x0)
+                mark_ids.append(entry['id'][len('rehearsal_'):])
+
+        return cls(starts, ends, ids, types, mark_xs, mark_ids, score_width=width, scale=scale)
+
+    # -- lookups ------------------------------------------------------------
+
+    def at(self, x):
+        """Ids of cues whose [start, end] contains x (what checkCueTriggers tests)."""
+        lo = bisect.bisect_left(self.starts, x - self.max_width)
+        hi = bisect.bisect_right(self.starts, x)
+        return [self.ids[i] for i in range(lo, hi) if self.ends[i] >= x]
+
+    def between(self, x0, x1):
+        """Ids of cues starting in (x0, x1] — the cues a playhead step crossed."""
+        lo = bisect.bisect_right(self.starts, x0)
+        hi = bisect.bisect_right(self.starts, x1)
+        return self.ids[lo:hi]
+
+    def next_after(self, x):
+        """(id, start) of the first cue starting after x, or None."""
+        i = bisect.bisect_right(self.starts, x)
+        return (self.ids[i], self.starts[i]) if i < len(self.starts) else None
+
+    def mark_at(self, x):
+        """Rehearsal mark in effect at x (the last one at or before it), or None."""
+        i = bisect.bisect_right(self.mark_xs, x)
+        return self.mark_ids[i - 1] if i else None
+
+    # -- serialisation ------------------------------------------------------
+
+    def to_json(self, source=None, precision=2):
+        return {
+            'version': TIMELINE_VERSION,
+            'source': source,
+            'scoreWidth': self.score_width,
+            'scale': round(self.scale, 6),
+            'maxWidth': round(self.max_width, precision),
+            'cues': {
+                'start': [round(v, precision) for v in self.starts],
+                'end': [round(v, precision) for v in self.ends],
+                'id': self.ids,
+                'type': self.types,
+            },
+            'marks': {
+                'x': [round(v, precision) for v in self.mark_xs],
+                'id': self.mark_ids,
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        cues = data['cues']
+        marks = data.get('marks', {})
+        return cls(
+            cues['start'], cues['end'], cues['id'], cues.get('type'),
+            marks.get('x', ()), marks.get('id', ()),
+            score_width=data.get('scoreWidth'), scale=data.get('scale', 1.0),
+        )
+
+    def to_binary(self):
+        header = BINARY_HEADER.pack(BINARY_MAGIC, TIMELINE_VERSION, 0, len(self), self.max_width)
+        starts = array('f', self.starts)
+        ends = array('f', self.ends)
+        if sys.byteorder != 'little':
+            starts.byteswap()
+            ends.byteswap()
+        return header + starts.tobytes() + ends.tobytes() + '\n'.join(self.ids).encode('utf-8')
+
+    @classmethod
+    def from_binary(cls, data):
+        magic, version, _, count, _ = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError("not a cue timeline file")
+        if version != TIMELINE_VERSION:
+            raise ValueError(f"unsupported timeline version {version}")
+        offset = BINARY_HEADER.size
+        starts = array('f')
+        starts.frombytes(data[offset:offset + 4 * count])
+        ends = array('f')
+        ends.frombytes(data[offset + 4 * count:offset + 8 * count])
+        if sys.byteorder != 'little':
+            starts.byteswap()
+            ends.byteswap()
+        text = data[offset + 8 * count:].decode('utf-8')
+        ids = text.split('\n') if count else []
+        return cls(list(starts), list(ends), ids)
+
+
+def load_index(path):
+    """Index dict for a score SVG or an existing .index.json."""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    from score_index import build_index
+    return build_index(path)
+
+
+def _write_atomic(path, data, mode='w'):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, mode, **({'encoding': 'utf-8'} if 'b' not in mode else {})) as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+
+def write_timeline(timeline, output_path, source=None, binary=False):
+    """Write <name>.timeline.json (and .timeline.bin). Returns the paths written."""
+    data = json.dumps(timeline.to_json(source=source), separators=(',', ':'), ensure_ascii=False)
+    paths = [_write_atomic(output_path, data)]
+    if binary:
+        binary_path = output_path[:-len('.json')] + '.bin' if output_path.endswith('.json') else output_path + '.bin'
+        paths.append(_write_atomic(binary_path, timeline.to_binary(), mode='wb'))
+    return paths
+
+
+def default_output_path(path):
+    base = path[:-len('.index.json')] if path.endswith('.index.json') else os.path.splitext(path)[0]
+    return f"{base}.timeline.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a sorted cue timeline for fast playhead lookups.")
+    parser.add_argument('score', help="Plain SVG score, or an index written by score_index.py")
+    parser.add_argument('-o', '--output', default=None, help="Timeline path (default: <score>.timeline.json)")
+    parser.add_argument('--binary', action='store_true', help="Also write the compact .timeline.bin")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    index = load_index(args.score)
+    timeline = CueTimeline.from_index(index)
+    paths = write_timeline(
+        timeline,
+        args.output or default_output_path(args.score),
+        source=index.get('source') or os.path.basename(args.score),
+        binary=args.binary,
+    )
+    logging.info(f"{len(timeline)} cues, {len(timeline.mark_ids)} rehearsal marks → {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
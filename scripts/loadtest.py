@@ -0,0 +1,562 @@
+# Performance Load Test
+#
+# Simulates N performer clients against a running server.js to measure how
+# the WebSocket fan-out behaves with a room full of phones: every client
+# connects like app.js does, a script of performance events is played by
+# (randomly chosen) clients, and each broadcast is timed from the moment it
+# was sent to the moment each client receives the matching message.
+#
+# A UDP socket stands in for the OSC target (point server.js at it with
+# --osc-out / OSC_REMOTE_PORT), so `osc` and `osc_rotate` are timed end to
+# end as well.
+#
+# Script format (JSON):
+#
+#   {"steps": [
+#     {"at": 0.0, "send": {"type": "play", "playheadX": 0}},
+#     {"at": 1.5, "send": {"type": "cue_triggered", "cueId": "cueAudio(a.wav)"}},
+#     {"at": 3.0, "send": {"type": "cue_pause", "id": "cuePause(2)", "duration": 2000}, "ack": true},
+#     {"at": 5.0, "send": {"type": "resume_after_pause", "playheadX": 900}},
+#     {"at": 6.0, "send": {"type": "osc_rotate", "uid": "wheel", "angle": 12.5,
+#                          "radians": 0.218, "norm": 0.035}, "repeat": 100, "interval": 0.02}
+#   ]}
+#
+#   "at" is seconds from the start; "from" picks the sending client (an
+#   index, default a random one); "repeat"/"interval" send the step again;
+#   "ack": true makes every client answer cue_pause with cue_pause_ack, and
+#   the time until the server's confirming "pause" is reported as
+#   pause_confirmed.  Without --script a built-in performance is used.
+#
+# Messages are tagged so each broadcast can be matched to its step: cue and
+# rotate ids get a "-lt<N>" suffix, osc cue numbers are unique integers and
+# playhead positions get a tiny unique offset.
+#
+# --record PATH joins as one passive client and writes everything it
+# receives (with times) to a JSONL file; --replay PATH turns such a
+# recording back into a script (cue triggers, pauses, resumes, jumps, speed
+# changes and play starts), so a rehearsal can be replayed at load.
+#
+# Needs the `websockets` package (pip install websockets).
+#
+# Usage:
+# python loadtest.py [--url ws://localhost:8001] [--clients 30] [--script perf.json | --replay rec.jsonl]
+#                    [--osc-port 57120] [--ramp 2] [--timeout 5] [--json report.json]
+# python loadtest.py --record rec.jsonl [--url ...] [--duration SECONDS]
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import time
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+DEFAULT_URL = 'ws://localhost:8001'
+DEFAULT_CLIENTS = 30
+DEFAULT_OSC_PORT = 57120
+DEFAULT_TIMEOUT = 5.0
+
+# What each sent type produces: (probe name, broadcast type, field of the
+# broadcast, field of the sent message it must equal, whether the sender
+# receives it too).  Fields with a dot look inside nested objects (sync
+# messages carry the playhead in state.playheadX).
+EXPECTATIONS = {
+    'cue_triggered': [('cue_triggered', 'cue_triggered', 'cueId', 'cueId', False)],
+    'cue_pause': [('cue_pause', 'cue_pause', 'id', 'id', True)],
+    'resume_after_pause': [('resume_after_pause', 'resume_after_pause', 'playheadX', 'playheadX', True)],
+    'play': [('play_sync', 'sync', 'state.playheadX', 'playheadX', True)],
+    'jump': [('jump_sync', 'sync', 'state.playheadX', 'playheadX', True)],
+    'set_speed_multiplier': [('speed', 'set_speed_multiplier', 'multiplier', 'multiplier', False)],
+    'dismiss_pause_countdown': [('dismiss', 'dismiss_pause_countdown', None, None, True)],
+}
+# Sent types that come out as OSC: (probe name, address (prefix), field matched against the first argument)
+OSC_EXPECTATIONS = {
+    'osc': ('osc_cue', '/cue/trigger', 'data'),
+    'osc_rotate': ('osc_rotate', '/rotate/', None),
+}
+REPLAYED_TYPES = {'cue_triggered', 'cue_pause', 'resume_after_pause', 'jump', 'set_speed_multiplier',
+                  'repeat_update', 'dismiss_pause_countdown'}
+
+DEFAULT_SCRIPT = {'steps': [
+    {'at': 0.0, 'send': {'type': 'play', 'playheadX': 0}},
+    {'at': 1.0, 'send': {'type': 'cue_triggered', 'cueId': 'cueAudio(bell.wav)'}, 'repeat': 10, 'interval': 0.5},
+    {'at': 2.0, 'send': {'type': 'osc', 'data': 1}, 'repeat': 10, 'interval': 0.5},
+    {'at': 3.0, 'send': {'type': 'osc_rotate', 'uid': 'wheel', 'angle': 12.5, 'radians': 0.218, 'norm': 0.035},
+     'repeat': 100, 'interval': 0.02},
+    {'at': 7.0, 'send': {'type': 'cue_pause', 'id': 'cuePause(2)', 'duration': 2000}, 'ack': True},
+    {'at': 9.0, 'send': {'type': 'resume_after_pause', 'playheadX': 1200}},
+    {'at': 10.0, 'send': {'type': 'set_speed_multiplier', 'multiplier': 1.5}},
+    {'at': 10.5, 'send': {'type': 'set_speed_multiplier', 'multiplier': 1.0}},
+    {'at': 11.0, 'send': {'type': 'jump', 'playheadX': 4000, 'elapsedTime': 60000}},
+    {'at': 13.0, 'send': {'type': 'cue_pause', 'id': 'cuePause(1)', 'duration': 1000}, 'ack': True},
+    {'at': 14.0, 'send': {'type': 'resume_after_pause', 'playheadX': 4100}},
+]}
+
+
+def field(message, path):
+    for key in path.split('.'):
+        if not isinstance(message, dict):
+            return None
+        message = message.get(key)
+    return message
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        'count': len(values),
+        'p50': ms(percentile(values, 50)),
+        'p90': ms(percentile(values, 90)),
+        'p99': ms(percentile(values, 99)),
+        'max': ms(values[-1]),
+        'mean': ms(sum(values) / len(values)),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Probes: one per expected delivery of a sent message
+# ---------------------------------------------------------------------------
+
+class Probe:
+    __slots__ = ('name', 'type', 'path', 'value', 'sent', 'waiting')
+
+    def __init__(self, name, message_type, path, value, sent, waiting):
+        self.name = name
+        self.type = message_type
+        self.path = path
+        self.value = value
+        self.sent = sent
+        self.waiting = waiting  # client indexes (or {'osc'}) still to receive it
+
+    def matches(self, message):
+        if message.get('type') != self.type:
+            return False
+        return self.path is None or field(message, self.path) == self.value
+
+
+class Stats:
+    """Everything measured during one run."""
+
+    def __init__(self, clients):
+        self.latencies = {}  # probe name → [seconds]
+        self.lost = {}  # probe name → deliveries that never arrived
+        self.received = [0] * clients
+        self.bytes = [0] * clients
+        self.by_type = {}  # message type → [count, bytes] over all clients
+        self.sent = {}  # message type → count
+        self.osc_packets = 0
+        self.osc_addresses = {}
+
+    def record(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def receive(self, client, message_type, size):
+        self.received[client] += 1
+        self.bytes[client] += size
+        counts = self.by_type.setdefault(message_type, [0, 0])
+        counts[0] += 1
+        counts[1] += size
+
+
+class LoadTest:
+    """Connects the clients, plays the script and collects Stats."""
+
+    def __init__(self, url, clients, steps, timeout=DEFAULT_TIMEOUT, ramp=0.0, seed=0):
+        self.url = url
+        self.count = clients
+        self.steps = steps
+        self.timeout = timeout
+        self.ramp = ramp
+        self.random = random.Random(seed)
+        self.stats = Stats(clients)
+        self.sockets = [None] * clients
+        self.probes = []
+        self.pending_acks = {}  # cue_pause id → Probe for the confirming "pause"
+        self.tags = itertools.count(1)
+        self.osc_numbers = itertools.count(100000)
+
+    # -- receiving ----------------------------------------------------------
+
+    def on_message(self, client, raw):
+        now = time.perf_counter()
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        self.stats.receive(client, message.get('type'), len(raw))
+        for probe in self.probes:
+            if client in probe.waiting and probe.matches(message):
+                probe.waiting.discard(client)
+                self.stats.record(probe.name, now - probe.sent)
+
+        if message.get('type') == 'cue_pause' and message.get('id') in self.pending_acks:
+            ack = {'type': 'cue_pause_ack', 'elapsedTime': message.get('elapsedTime', 0)}
+            asyncio.ensure_future(self.send(client, ack, count=False))
+
+    def on_osc(self, address, args):
+        now = time.perf_counter()
+        self.stats.osc_packets += 1
+        self.stats.osc_addresses[address] = self.stats.osc_addresses.get(address, 0) + 1
+        for probe in self.probes:
+            if 'osc' not in probe.waiting or not address.startswith(probe.type):
+                continue
+            if probe.path == 'address' and address != probe.value:
+                continue
+            if probe.path == 'arg' and (not args or args[0] != probe.value):
+                continue
+            probe.waiting.discard('osc')
+            self.stats.record(probe.name, now - probe.sent)
+
+    async def client(self, index, ready):
+        await asyncio.sleep(self.ramp * index / max(1, self.count))
+        async with websockets.connect(self.url, max_size=None, ping_interval=None) as ws:
+            self.sockets[index] = ws
+            if all(self.sockets):
+                ready.set()
+            async for raw in ws:
+                self.on_message(index, raw)
+
+    # -- sending ------------------------------------------------------------
+
+    async def send(self, client, message, count=True):
+        ws = self.sockets[client]
+        if ws is None:
+            return
+        if count:
+            self.stats.sent[message['type']] = self.stats.sent.get(message['type'], 0) + 1
+        await ws.send(json.dumps(message))
+
+    def tag(self, message):
+        """Copy of `message` made unique so its broadcasts can be told apart."""
+        message = dict(message)
+        n = next(self.tags)
+        kind = message.get('type')
+        if kind == 'cue_triggered':
+            message['cueId'] = f"{message.get('cueId', 'cue')}-lt{n}"
+        elif kind == 'cue_pause':
+            message['id'] = f"{message.get('id', 'cuePause')}-lt{n}"
+        elif kind == 'osc_rotate':
+            message['uid'] = f"{message.get('uid', 'rot')}-lt{n}"
+        elif kind == 'osc':
+            message['data'] = next(self.osc_numbers)
+        elif kind in ('play', 'jump', 'resume_after_pause'):
+            message['playheadX'] = float(message.get('playheadX', 0)) + n * 1e-6
+        return message
+
+    def expect(self, sender, message, ack, sent):
+        kind = message['type']
+        everyone = set(range(self.count))
+        for name, message_type, path, sent_path, to_sender in EXPECTATIONS.get(kind, ()):
+            waiting = everyone if to_sender else everyone - {sender}
+            value = field(message, sent_path) if sent_path else None
+            self.probes.append(Probe(name, message_type, path, value, sent, set(waiting)))
+        if kind in OSC_EXPECTATIONS:
+            name, address, key = OSC_EXPECTATIONS[kind]
+            if kind == 'osc_rotate':
+                probe = Probe(name, address, 'address', f"/rotate/{message['uid']}", sent, {'osc'})
+            else:
+                probe = Probe(name, address, 'arg', message[key], sent, {'osc'})
+            self.probes.append(probe)
+        if ack and kind == 'cue_pause':
+            probe = Probe('pause_confirmed', 'pause', None, None, sent, set(everyone))
+            self.pending_acks[message['id']] = probe
+            self.probes.append(probe)
+
+    def expire(self, now):
+        keep = []
+        for probe in self.probes:
+            if probe.waiting and now - probe.sent < self.timeout:
+                keep.append(probe)
+            elif probe.waiting:
+                self.stats.lost[probe.name] = self.stats.lost.get(probe.name, 0) + len(probe.waiting)
+        self.probes = keep
+
+    async def play(self):
+        events = []
+        for step in self.steps:
+            for i in range(int(step.get('repeat', 1))):
+                events.append((float(step['at']) + i * float(step.get('interval', 0)), step))
+        events.sort(key=lambda event: event[0])
+
+        start = time.perf_counter()
+        for at, step in events:
+            delay = start + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sender = step.get('from')
+            sender = self.random.randrange(self.count) if sender is None else int(sender) % self.count
+            message = self.tag(step['send'])
+            sent = time.perf_counter()
+            self.expect(sender, message, step.get('ack', False), sent)
+            await self.send(sender, message)
+            self.expire(sent)
+
+        # Let the last broadcasts arrive
+        deadline = time.perf_counter() + self.timeout
+        while self.probes and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        self.expire(float('inf'))
+        return time.perf_counter() - start
+
+    async def run(self, osc_port=None):
+        loop = asyncio.get_running_loop()
+        transport = None
+        if osc_port:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: OscReceiver(self.on_osc), local_addr=('127.0.0.1', osc_port))
+
+        ready = asyncio.Event()
+        tasks = [asyncio.ensure_future(self.client(i, ready)) for i in range(self.count)]
+        connect_started = time.perf_counter()
+        done, _ = await asyncio.wait([asyncio.ensure_future(ready.wait()), *tasks],
+                                     return_when=asyncio.FIRST_COMPLETED, timeout=self.ramp + self.timeout * 2)
+        failed = [task for task in done if task in tasks and task.exception()]
+        if failed or not ready.is_set():
+            for task in tasks:
+                task.cancel()
+            error = failed[0].exception() if failed else 'timed out'
+            raise SystemExit(f"could not connect {self.count} clients to {self.url}: {error}")
+        connect_time = time.perf_counter() - connect_started
+        logging.info(f"{self.count} clients connected in {connect_time:.2f}s")
+
+        # Drop the connection burst (welcome, client lists, sync) from the rates
+        await asyncio.sleep(0.5)
+        self.stats = Stats(self.count)
+        duration = await self.play()
+
+        for ws in self.sockets:
+            await ws.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if transport is not None:
+            transport.close()
+        return report(self.stats, duration, connect_time)
+
+
+# ---------------------------------------------------------------------------
+# OSC stand-in
+# ---------------------------------------------------------------------------
+
+def _osc_string(data, offset):
+    end = data.index(b'\0', offset)
+    return data[offset:end].decode('utf-8', 'replace'), (end + 4) & ~3
+
+
+def parse_osc(data):
+    """[(address, [args])] for an OSC packet (bundles are flattened)."""
+    if data.startswith(b'#bundle\0'):
+        messages, offset = [], 16
+        while offset + 4 <= len(data):
+            (size,) = struct.unpack('>i', data[offset:offset + 4])
+            messages += parse_osc(data[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        return messages
+    address, offset = _osc_string(data, 0)
+    args = []
+    if offset < len(data) and data[offset:offset + 1] == b',':
+        tags, offset = _osc_string(data, offset)
+        for tag in tags[1:]:
+            if tag == 'i':
+                args.append(struct.unpack('>i', data[offset:offset + 4])[0])
+                offset += 4
+            elif tag == 'f':
+                args.append(struct.unpack('>f', data[offset:offset + 4])[0])
+                offset += 4
+            elif tag == 's':
+                value, offset = _osc_string(data, offset)
+                args.append(value)
+            else:
+                break  # types we do not need to read
+    return [(address, args)]
+
+
+class OscReceiver(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        try:
+            messages = parse_osc(data)
+        except (ValueError, struct.error):
+            return
+        for address, args in messages:
+            self.callback(address, args)
+
+
+# ---------------------------------------------------------------------------
+# Scripts, recordings and the report
+# ---------------------------------------------------------------------------
+
+def load_script(path):
+    with open(path, encoding='utf-8') as f:
+        script = json.load(f)
+    steps = script['steps'] if isinstance(script, dict) else script
+    for step in steps:
+        if 'at' not in step or 'send' not in step or 'type' not in step['send']:
+            raise SystemExit(f"{path}: every step needs 'at' and a 'send' message with a 'type'")
+    return steps
+
+
+def script_from_recording(path):
+    """Steps that reproduce the client actions seen in a --record file."""
+    steps, playing = [], False
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            message = entry['message']
+            kind = message.get('type')
+            if kind in REPLAYED_TYPES:
+                step = {'at': entry['t'], 'send': message}
+                if kind == 'cue_pause':
+                    step['ack'] = True
+                steps.append(step)
+            elif kind == 'sync':
+                now_playing = bool(field(message, 'state.isPlaying'))
+                if now_playing and not playing:
+                    steps.append({'at': entry['t'], 'send': {
+                        'type': 'play', 'playheadX': field(message, 'state.playheadX') or 0}})
+                playing = now_playing
+    logging.info(f"{path}: {len(steps)} replayable events")
+    return steps
+
+
+async def record(url, path, duration=None):
+    """Join as a passive client and log every message received."""
+    start = time.perf_counter()
+    temp_path = f"{path}.tmp"
+    count = 0
+    with open(temp_path, 'w', encoding='utf-8') as out:
+        async with websockets.connect(url, max_size=None) as ws:
+            logging.info(f"recording {url} → {path} (Ctrl-C to stop)")
+            try:
+                while duration is None or time.perf_counter() - start < duration:
+                    timeout = None if duration is None else max(0.0, duration - (time.perf_counter() - start))
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    entry = {'t': round(time.perf_counter() - start, 4), 'message': json.loads(raw)}
+                    out.write(json.dumps(entry) + '\n')
+                    count += 1
+            except asyncio.CancelledError:
+                pass
+    os.replace(temp_path, path)
+    logging.info(f"{count} messages recorded")
+
+
+def report(stats, duration, connect_time):
+    clients = len(stats.received)
+    per_client_rate = [n / duration for n in stats.received] if duration else [0] * clients
+    return {
+        'clients': clients,
+        'duration': round(duration, 3),
+        'connect_seconds': round(connect_time, 3),
+        'latency_ms': {name: dict(latency_summary(values), lost=stats.lost.get(name, 0))
+                       for name, values in sorted(stats.latencies.items())},
+        'lost': {name: n for name, n in stats.lost.items() if name not in stats.latencies},
+        'sent': stats.sent,
+        'per_client': {
+            'messages_mean': round(sum(stats.received) / clients, 1),
+            'messages_per_second_mean': round(sum(per_client_rate) / clients, 2),
+            'messages_per_second_max': round(max(per_client_rate), 2),
+            'bytes_mean': round(sum(stats.bytes) / clients),
+            'bytes_max': max(stats.bytes),
+            'bytes_per_second_mean': round(sum(stats.bytes) / clients / duration) if duration else 0,
+        },
+        'received_by_type': {kind: {'messages': n, 'bytes': size}
+                             for kind, (n, size) in sorted(stats.by_type.items(), key=lambda item: -item[1][1])},
+        'osc': {'packets': stats.osc_packets, 'addresses': len(stats.osc_addresses)},
+    }
+
+
+def format_report(result):
+    lines = [f"{result['clients']} clients, {result['duration']:.1f}s "
+             f"(connected in {result['connect_seconds']:.2f}s)", "",
+             f"{'fan-out latency':<20} {'n':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'lost':>6}"]
+    for name, row in result['latency_ms'].items():
+        if row['count']:
+            lines.append(f"{name:<20} {row['count']:>6} {row['p50']:>8.2f} {row['p90']:>8.2f} "
+                         f"{row['p99']:>8.2f} {row['max']:>8.2f} {row['lost']:>6}")
+        else:
+            lines.append(f"{name:<20} {0:>6} {'':>35} {row['lost']:>6}")
+    for name, lost in result['lost'].items():
+        lines.append(f"{name:<20} {0:>6} {'':>35} {lost:>6}")
+    per_client = result['per_client']
+    lines += ["", f"per client: {per_client['messages_mean']} messages "
+                  f"({per_client['messages_per_second_mean']}/s mean, {per_client['messages_per_second_max']}/s max), "
+                  f"{per_client['bytes_mean']:,} bytes ({per_client['bytes_per_second_mean']:,} B/s)", "",
+              f"{'received type':<24} {'messages':>9} {'bytes':>12}"]
+    for kind, row in result['received_by_type'].items():
+        lines.append(f"{str(kind):<24} {row['messages']:>9} {row['bytes']:>12,}")
+    lines.append(f"\nOSC stand-in: {result['osc']['packets']} packets, {result['osc']['addresses']} addresses")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many performer clients against server.js.")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"server.js WebSocket URL (default {DEFAULT_URL})")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--script', default=None, help="Performance script (JSON)")
+    source.add_argument('--replay', default=None, help="Replay a --record file")
+    source.add_argument('--record', default=None, metavar='PATH', help="Record a live session to PATH instead")
+    parser.add_argument('--duration', type=float, default=None, help="Stop recording after SECONDS")
+    parser.add_argument('--osc-port', type=int, default=DEFAULT_OSC_PORT,
+                        help=f"UDP port of the OSC stand-in, 0 to disable (default {DEFAULT_OSC_PORT})")
+    parser.add_argument('--ramp', type=float, default=0.0, help="Spread client connections over SECONDS")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds before an expected message counts as lost")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for choosing sending clients")
+    parser.add_argument('--json', default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if websockets is None:
+        sys.exit("loadtest.py needs the websockets package: pip install websockets")
+
+    if args.record:
+        try:
+            asyncio.run(record(args.url, args.record, args.duration))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.replay:
+        steps = script_from_recording(args.replay)
+    elif args.script:
+        steps = load_script(args.script)
+    else:
+        steps = DEFAULT_SCRIPT['steps']
+
+    test = LoadTest(args.url, args.clients, steps, timeout=args.timeout, ramp=args.ramp, seed=args.seed)
+    result = asyncio.run(test.run(osc_port=args.osc_port))
+    print(format_report(result))
+    if args.json:
+        temp_path = f"{args.json}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        os.replace(temp_path, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# OSC Aggregating Relay
+#
+# Sits between server.js's OSC output and the synth (SuperCollider, Pd ...)
+# and turns a flood of per-frame messages into a few packets:
+#
+#   server.js --osc-out=57130  →  osc_relay.py :57130  →  synth :57120
+#
+# Every --window milliseconds the messages received since the last flush are
+# sent on as timetagged OSC bundles (split to stay under --max-packet bytes):
+#
+#   - addresses matching a --coalesce prefix (default /rotate/, /position/,
+#     /obj2path/, /stopwatch) are continuous controls: only the latest value
+#     per address is kept, and --max-rate limits how often each address is
+#     sent at all (the newest value waits for the next allowed slot)
+#   - everything else (cue triggers ...) is passed on in arrival order,
+#     never merged or rate limited
+#
+# Bundles carry the timetag "now + --latency"; with the default latency of 0
+# they are marked "immediately".  A small positive latency lets scsynth
+# schedule the bundle and smooths network jitter.  --no-bundle sends each
+# message as its own packet instead, for receivers that do not unpack
+# bundles; coalescing and rate limits still apply.
+#
+# Counters (logged every --stats-interval seconds and on exit, and written
+# to --stats-json if given):
+#   received    messages that arrived (bundles count each message inside)
+#   forwarded   messages sent on to the synth
+#   merged      continuous values replaced by a newer one before being sent
+#   dropped     malformed packets and messages that could not be sent
+#   packets_in / packets_out
+#
+# Usage:
+# python osc_relay.py [--listen 127.0.0.1:57130] [--target 127.0.0.1:57120] [--window 10]
+#                     [--max-rate 60] [--coalesce /rotate/ ...] [--latency 0] [--no-bundle]
+#                     [--max-packet 1400] [--stats-interval 10] [--stats-json o/osc_relay.json]
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import time
+
+DEFAULT_LISTEN = '127.0.0.1:57130'
+DEFAULT_TARGET = '127.0.0.1:57120'
+DEFAULT_WINDOW_MS = 10.0
+DEFAULT_MAX_RATE = 60.0
+DEFAULT_MAX_PACKET = 1400  # keeps bundles inside one Ethernet frame
+DEFAULT_COALESCE = ('/rotate/', '/position/', '/obj2path/', '/stopwatch')
+
+BUNDLE_HEADER = b'#bundle\0'
+IMMEDIATELY = struct.pack('>Q', 1)
+NTP_EPOCH_OFFSET = 2208988800  # seconds from 1900 to 1970
+
+
+class OscError(ValueError):
+    pass
+
+
+def _address(data):
+    end = data.find(b'\0')
+    if end <= 0 or data[:1] != b'/':
+        raise OscError("not an OSC message")
+    return data[:end].decode('utf-8', 'replace')
+
+
+def split_packet(data):
+    """[(address, message bytes)] for an OSC packet; nested bundles are flattened."""
+    if not data.startswith(BUNDLE_HEADER):
+        return [(_address(data), data)]
+    if len(data) < 16:
+        raise OscError("truncated bundle")
+    messages, offset = [], 16
+    while offset < len(data):
+        if offset + 4 > len(data):
+            raise OscError("truncated bundle element")
+        (size,) = struct.unpack('>i', data[offset:offset + 4])
+        if size <= 0 or size % 4 or offset + 4 + size > len(data):
+            raise OscError("bad bundle element size")
+        messages += split_packet(data[offset + 4:offset + 4 + size])
+        offset += 4 + size
+    return messages
+
+
+def timetag(seconds_from_now):
+    """OSC (NTP) timetag for now + seconds_from_now; 'immediately' for zero."""
+    if seconds_from_now <= 0:
+        return IMMEDIATELY
+    when = time.time() + seconds_from_now + NTP_EPOCH_OFFSET
+    whole = int(when)
+    return struct.pack('>II', whole, int((when - whole) * (1 << 32)) & 0xFFFFFFFF)
+
+
+def bundles(messages, tag, max_packet=DEFAULT_MAX_PACKET):
+    """
+    Pack message bytes into as few bundles of at most max_packet bytes as
+    possible (a single larger message gets a bundle of its own).
+    Returns [(bundle bytes, message count)].
+    """
+    packets, parts, size = [], [BUNDLE_HEADER, tag], 16
+    for message in messages:
+        element = struct.pack('>i', len(message)) + message
+        if len(parts) > 2 and size + len(element) > max_packet:
+            packets.append((b''.join(parts), len(parts) - 2))
+            parts, size = [BUNDLE_HEADER, tag], 16
+        parts.append(element)
+        size += len(element)
+    if len(parts) > 2:
+        packets.append((b''.join(parts), len(parts) - 2))
+    return packets
+
+
+class Relay(asyncio.DatagramProtocol):
+    """Receives from server.js, batches per window, sends to the synth."""
+
+    def __init__(self, send, window=DEFAULT_WINDOW_MS / 1000, max_rate=DEFAULT_MAX_RATE,
+                 coalesce=DEFAULT_COALESCE, latency=0.0, bundle=True, max_packet=DEFAULT_MAX_PACKET):
+        self.send = send  # callable(bytes)
+        self.window = window
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.coalesce = tuple(coalesce)
+        self.latency = latency
+        self.bundle = bundle
+        self.max_packet = max_packet
+        self.passthrough = []  # message bytes in arrival order
+        self.latest = {}  # address → newest message bytes
+        self.last_sent = {}  # address → monotonic time of last send
+        self.flush_handle = None
+        self.counters = {'received': 0, 'forwarded': 0, 'merged': 0, 'dropped': 0,
+                         'packets_in': 0, 'packets_out': 0}
+
+    def is_continuous(self, address):
+        return address.startswith(self.coalesce)
+
+    def datagram_received(self, data, addr):
+        self.counters['packets_in'] += 1
+        try:
+            messages = split_packet(data)
+        except (OscError, struct.error):
+            self.counters['dropped'] += 1
+            return
+        for address, message in messages:
+            self.counters['received'] += 1
+            if self.is_continuous(address):
+                if address in self.latest:
+                    self.counters['merged'] += 1
+                self.latest[address] = message
+            else:
+                self.passthrough.append(message)
+        self.schedule(self.window)
+
+    def schedule(self, delay):
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(delay, self.flush)
+
+    def flush(self):
+        self.flush_handle = None
+        now = time.monotonic()
+        outgoing, self.passthrough = self.passthrough, []
+        next_slot = None
+        for address in list(self.latest):
+            wait = self.last_sent.get(address, -self.min_interval) + self.min_interval - now
+            if wait > 0:
+                next_slot = wait if next_slot is None else min(next_slot, wait)
+                continue
+            outgoing.append(self.latest.pop(address))
+            self.last_sent[address] = now
+        if next_slot is not None:
+            self.schedule(next_slot)
+        if not outgoing:
+            return
+
+        if self.bundle:
+            packets = bundles(outgoing, timetag(self.latency), self.max_packet)
+        else:
+            packets = [(message, 1) for message in outgoing]
+        for packet, count in packets:
+            try:
+                self.send(packet)
+            except OSError as e:
+                logging.warning(f"send failed: {e}")
+                self.counters['dropped'] += count
+                continue
+            self.counters['packets_out'] += 1
+            self.counters['forwarded'] += count
+
+    def close(self):
+        """Send whatever is still waiting, ignoring rate limits."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.min_interval = 0.0
+        self.flush()
+
+
+def parse_endpoint(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def write_stats(path, counters):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(counters, time=time.time()), f, indent=2)
+    os.replace(temp_path, path)
+
+
+def format_counters(counters, elapsed):
+    received = counters['received']
+    ratio = counters['packets_in'] / counters['packets_out'] if counters['packets_out'] else 0
+    return (f"{received} in ({received / elapsed:.0f}/s), {counters['forwarded']} forwarded, "
+            f"{counters['merged']} merged, {counters['dropped']} dropped; "
+            f"packets {counters['packets_in']} → {counters['packets_out']} ({ratio:.1f}:1)")
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    target = parse_endpoint(args.target)
+    out_transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=target)
+    relay = Relay(out_transport.sendto, window=args.window / 1000, max_rate=args.max_rate,
+                  coalesce=args.coalesce or DEFAULT_COALESCE, latency=args.latency / 1000,
+                  bundle=not args.no_bundle, max_packet=args.max_packet)
+    in_transport, _ = await loop.create_datagram_endpoint(lambda: relay, local_addr=parse_endpoint(args.listen))
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logging.info(f"relaying {args.listen} → {args.target} (window {args.window:g} ms, "
+                 f"max {args.max_rate:g}/s per continuous address, "
+                 f"{'bundles' if not args.no_bundle else 'single messages'})")
+
+    started = time.monotonic()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), args.stats_interval)
+        except asyncio.TimeoutError:
+            pass
+        if relay.counters['packets_in']:
+            logging.info(format_counters(relay.counters, time.monotonic() - started))
+        if args.stats_json:
+            write_stats(args.stats_json, relay.counters)
+
+    in_transport.close()
+    relay.close()
+    out_transport.close()
+    logging.info("final: " + format_counters(relay.counters, time.monotonic() - started))
+    if args.stats_json:
+        write_stats(args.stats_json, relay.counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coalesce, rate-limit and bundle OSC between server.js and a synth.")
+    parser.add_argument('--listen', default=DEFAULT_LISTEN, help=f"host:port to receive on (default {DEFAULT_LISTEN})")
+    parser.add_argument('--target', default=DEFAULT_TARGET, help=f"host:port of the synth (default {DEFAULT_TARGET})")
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW_MS,
+                        help=f"Batching window in ms (default {DEFAULT_WINDOW_MS:g})")
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE,
+                        help="Max sends per second per continuous address, 0 for no limit")
+    parser.add_argument('--coalesce', action='append', default=None, metavar='PREFIX',
+                        help=f"Address prefix treated as a continuous control (repeatable; default {' '.join(DEFAULT_COALESCE)})")
+    parser.add_argument('--latency', type=float, default=0.0, help="Bundle timetag offset in ms (0 = immediately)")
+    parser.add_argument('--no-bundle', action='store_true', help="Send plain messages instead of bundles")
+    parser.add_argument('--max-packet', type=int, default=DEFAULT_MAX_PACKET, help="Max bundle size in bytes")
+    parser.add_argument('--stats-interval', type=float, default=10.0, help="Seconds between counter logs")
+    parser.add_argument('--stats-json', default=None, help="Also write the counters to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# Incremental Score Build
+#
+# Rebuilds the published score from the Inkscape master, re-running only the
+# stages an edit actually affects, instead of a full Inkscape export plus
+# optimize / index / tiles every time:
+#
+#   master.svg ─ plain ─ optimize ─ <score>.svg ─┬─ tiles  → <score>.tiles/
+#                                                └─ index  → <score>.index.json
+#                                                    └─ timeline → <score>.timeline.json
+#
+#   plain     strips inkscape: / sodipodi: elements and attributes in Python
+#             (no Inkscape launch); --inkscape uses `inkscape --export-plain-svg`
+#   optimize  svg_optimize.py (whole file: glyph dedupe is global); skipped
+#             with --rehearsal, which publishes the plain SVG as it is
+#   index     score_index.py, then cue_timeline.py
+#   tiles     score_tiles.py, only with --tiles; unchanged tiles are not rewritten
+#
+# Change detection: after editor data is stripped, every top-level layer /
+# group of the master is hashed, so saving without changes (Inkscape rewrites
+# zoom and window position on every save) builds nothing.  Separately a cue
+# signature is hashed: the root size, every cue / animation element (see
+# cue_syntax.py) with its ancestors' transforms, and whatever those elements
+# point at.  Index and timeline only re-run when that signature changes, so
+# editing notation leaves them alone and moving a cue re-indexes.
+#
+# Build state, the intermediate plain SVG and the build log live in
+# --work-dir (default .score_build/ next to the master), not next to the
+# published files.  A stage whose output is missing always re-runs.  Every
+# build appends one line to <work_dir>/<score>.build.log:
+#   {"time": ..., "changed": ["layer1"], "stages": {"plain": 0.21, "optimize": null, ...}, "seconds": 0.4}
+# null means the stage was skipped.  All outputs are written atomically, so
+# the server and clients never see a half-written file.
+#
+# --watch polls the master and builds once it has stopped changing for
+# --settle seconds (Inkscape writes large files in several steps).
+#
+# Usage:
+# python score_build.py <master.svg> <published.svg> [--watch] [--interval 0.5] [--settle 0.3]
+#                       [--rehearsal] [--inkscape] [--tiles] [--tile-width 4000]
+#                       [--precision 2] [--no-compress] [--work-dir DIR] [--force]
+#
+# e.g. python score_build.py ../inkscape_scores/1-10560_inkscape_MASTER.svg \
+#          ../public/svg/canning_ponysays_score_1-10560.svg --watch --rehearsal
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+
+from cue_syntax import analyse_id, id_references
+from svg_geometry import INKSCAPE_NS, SODIPODI_NS, SVG_NS, href_of
+
+BUILD_VERSION = 1
+STAGES = ('plain', 'optimize', 'index', 'timeline', 'tiles')
+EDITOR_NAMESPACES = (f'{{{INKSCAPE_NS}}}', f'{{{SODIPODI_NS}}}')
+ROOT_ATTRIBUTES = ('width', 'height', 'viewBox')
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _register_namespaces(svg_path):
+    """Keep the master's namespace prefixes (and SVG as the default) on output."""
+    for _, (prefix, uri) in ET.iterparse(svg_path, events=('start-ns',)):
+        if prefix and uri != SVG_NS:
+            ET.register_namespace(prefix, uri)
+    ET.register_namespace('', SVG_NS)
+
+
+def strip_editor_data(root):
+    """Remove inkscape: / sodipodi: elements and attributes in place."""
+    for parent in root.iter():
+        for child in list(parent):
+            if not isinstance(child.tag, str) or child.tag.startswith(EDITOR_NAMESPACES):
+                parent.remove(child)
+        for key in [key for key in parent.attrib if key.startswith(EDITOR_NAMESPACES)]:
+            del parent.attrib[key]
+
+
+def _layer_key(position, element):
+    return element.get('id') or f"#{position}"
+
+
+def layer_hashes(root):
+    """{layer id: hash} for every top-level child, in document order."""
+    hashes = {'(root)': _digest(*(f"{key}={root.get(key)}" for key in ROOT_ATTRIBUTES))}
+    for position, child in enumerate(root):
+        hashes[_layer_key(position, child)] = _digest(ET.tostring(child))
+    return hashes
+
+
+def cue_signature(root):
+    """
+    Hash of everything the index depends on: root size, each cue / animation
+    element with its ancestors' transforms, and the elements they point at.
+    """
+    parts = [f"{key}={root.get(key)}" for key in ROOT_ATTRIBUTES]
+    by_id = {}
+    wanted = set()
+
+    def walk(element, transforms):
+        element_id = element.get('id')
+        if element_id:
+            by_id[element_id] = element
+        transform = element.get('transform')
+        if transform:
+            transforms = transforms + (transform,)
+        for key in ('id', 'data-id'):
+            value = element.get(key)
+            result = analyse_id(value) if value else None
+            if result is None:
+                continue
+            parts.append(_digest(' '.join(transforms), ET.tostring(element)))
+            wanted.update(target for _, target in id_references(result))
+            for node in element.iter():
+                href = href_of(node.attrib)
+                if href and href.startswith('#'):
+                    wanted.add(href[1:])
+            return  # descendants are part of the serialization above
+        for child in element:
+            walk(child, transforms)
+
+    for child in root:
+        walk(child, ())
+    for target in sorted(wanted):
+        element = by_id.get(target)
+        parts.append(f"{target}:" + (_digest(ET.tostring(element)) if element is not None else 'missing'))
+    return _digest(*parts)
+
+
+def _write_tree(root, path):
+    temp_path = f"{path}.tmp"
+    ET.ElementTree(root).write(temp_path, encoding='utf-8', xml_declaration=True)
+    os.replace(temp_path, path)
+    return path
+
+
+def inkscape_plain(master_path, output_path):
+    """Plain SVG export through the Inkscape CLI (the old convert_to_plain_svg.sh)."""
+    temp_path = f"{output_path}.tmp.svg"
+    subprocess.run(['inkscape', f'--export-plain-svg={temp_path}', master_path],
+                   check=True, capture_output=True)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def load_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get('version') == BUILD_VERSION else {}
+
+
+def save_state(path, state):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(state, version=BUILD_VERSION), f, indent=1)
+    os.replace(temp_path, path)
+
+
+class ScoreBuild:
+    """One master → published score pipeline, with its build state."""
+
+    def __init__(self, master_path, published_path, rehearsal=False, inkscape=False, tiles=False,
+                 tile_width=None, precision=None, compress=True, work_dir=None):
+        from score_index import default_output_path as index_path
+        from cue_timeline import default_output_path as timeline_path
+        from score_tiles import default_output_dir
+
+        self.master_path = master_path
+        self.published_path = published_path
+        self.rehearsal = rehearsal
+        self.inkscape = inkscape
+        self.tiles = tiles
+        self.tile_width = tile_width
+        self.precision = precision
+        self.compress = compress and not rehearsal
+        self.work_dir = work_dir or default_work_dir(master_path)
+        name = os.path.splitext(os.path.basename(published_path))[0]
+        self.plain_path = os.path.join(self.work_dir, f"{name}.plain.svg")
+        self.state_path = os.path.join(self.work_dir, f"{name}.build.json")
+        self.log_path = os.path.join(self.work_dir, f"{name}.build.log")
+        self.index_path = index_path(published_path)
+        self.timeline_path = timeline_path(self.index_path)
+        self.tiles_dir = default_output_dir(published_path)
+        os.makedirs(self.work_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(published_path)), exist_ok=True)
+        self.state = load_state(self.state_path)
+
+    def _outputs(self, stage):
+        return {
+            'plain': [self.published_path] if self.rehearsal else [self.plain_path],
+            'optimize': [] if self.rehearsal else [self.published_path],
+            'index': [self.index_path],
+            'timeline': [self.timeline_path],
+            'tiles': [os.path.join(self.tiles_dir, 'manifest.json')] if self.tiles else [],
+        }[stage]
+
+    def _needed(self, stage, key, force):
+        if force or self.state.get(stage) != key:
+            return True
+        return not all(os.path.exists(path) for path in self._outputs(stage))
+
+    def build(self, force=False):
+        """Run whatever stages the master's changes call for. Returns the log entry."""
+        started = time.perf_counter()
+        timings = dict.fromkeys(STAGES)
+        mode = 'rehearsal' if self.rehearsal else f"optimize:{self.precision}"
+
+        _register_namespaces(self.master_path)
+        tree = ET.parse(self.master_path)
+        root = tree.getroot()
+        strip_editor_data(root)
+        layers = layer_hashes(root)
+        previous = self.state.get('layers', {})
+        changed = [key for key in layers if previous.get(key) != layers[key]]
+        changed += [key for key in previous if key not in layers]
+        content = _digest(*(f"{key}:{value}" for key, value in layers.items()))
+        cues = cue_signature(root)
+        parsed = time.perf_counter() - started
+
+        def run(stage, key, action):
+            if not self._needed(stage, key, force):
+                return False
+            t = time.perf_counter()
+            action()
+            timings[stage] = round(time.perf_counter() - t, 3)
+            self.state[stage] = key
+            save_state(self.state_path, self.state)
+            return True
+
+        plain_key = _digest(content, mode, self.inkscape)
+        plain_target = self.published_path if self.rehearsal else self.plain_path
+        def build_plain():
+            if self.inkscape:
+                inkscape_plain(self.master_path, plain_target)
+            else:
+                _write_tree(root, plain_target)
+            if self.rehearsal:
+                # Compressed copies of the last optimized build would be served instead
+                for suffix in ('.gz', '.br'):
+                    if os.path.exists(plain_target + suffix):
+                        os.remove(plain_target + suffix)
+                # The published file is no longer the optimized one, nor what the tiles were cut from
+                for stage in ('optimize', 'tiles'):
+                    self.state.pop(stage, None)
+
+        run('plain', plain_key, build_plain)
+        del tree, root
+
+        if not self.rehearsal:
+            from svg_optimize import DEFAULT_PRECISION, optimize_svg
+            precision = DEFAULT_PRECISION if self.precision is None else self.precision
+            run('optimize', plain_key, lambda: optimize_svg(
+                self.plain_path, self.published_path, precision=precision, compress=self.compress))
+
+        index = None
+
+        def build_index():
+            nonlocal index
+            from score_index import build_index, write_index
+            index = build_index(self.published_path)
+            write_index(index, self.index_path)
+            if index['errors']:
+                logging.warning(f"{len(index['errors'])} invalid ids, see {self.index_path}")
+
+        def build_timeline():
+            from cue_timeline import CueTimeline, load_index, write_timeline
+            data = index if index is not None else load_index(self.index_path)
+            write_timeline(CueTimeline.from_index(data), self.timeline_path, source=os.path.basename(self.published_path))
+
+        index_key = _digest(cues, mode)
+        run('index', index_key, build_index)
+        run('timeline', index_key, build_timeline)
+
+        if self.tiles:
+            def build_tiles():
+                from cue_timeline import load_index
+                from score_tiles import DEFAULT_TILE_WIDTH, split_score
+                split_score(self.published_path, self.tiles_dir, tile_width=self.tile_width or DEFAULT_TILE_WIDTH,
+                            compress=self.compress, index=index if index is not None else load_index(self.index_path))
+            run('tiles', _digest(plain_key, self.tile_width), build_tiles)
+
+        self.state['layers'] = layers
+        save_state(self.state_path, self.state)
+        entry = {
+            'time': round(time.time(), 3),
+            'changed': changed,
+            'parse': round(parsed, 3),
+            'stages': timings,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        return entry
+
+
+def default_work_dir(master_path):
+    return os.path.join(os.path.dirname(os.path.abspath(master_path)), '.score_build')
+
+
+def _format_entry(entry):
+    ran = [f"{stage} {seconds:.2f}s" for stage, seconds in entry['stages'].items() if seconds is not None]
+    changed = entry['changed']
+    shown = ', '.join(changed[:5]) + (' ...' if len(changed) > 5 else '')
+    return (f"{len(changed)} layers changed{' (' + shown + ')' if changed else ''}; "
+            f"{', '.join(ran) if ran else 'nothing to rebuild'} — {entry['seconds']:.2f}s")
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(builder, interval, settle):
+    """Rebuild whenever the master changes and then stays unchanged for `settle` seconds."""
+    logging.info(f"watching {builder.master_path}")
+    last_built = _signature(builder.master_path)  # main() has just built it
+    while True:
+        signature = _signature(builder.master_path)
+        if signature is not None and signature != last_built:
+            time.sleep(settle)
+            if _signature(builder.master_path) != signature:
+                continue  # still being written
+            try:
+                logging.info(_format_entry(builder.build()))
+            except (ET.ParseError, OSError, subprocess.CalledProcessError) as e:
+                logging.error(f"build failed: {e}")
+            last_built = signature
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild a published score from its Inkscape master.")
+    parser.add_argument('master', help="Inkscape master SVG")
+    parser.add_argument('published', help="Published score SVG (e.g. public/svg/score.svg)")
+    parser.add_argument('--watch', action='store_true', help="Keep running and rebuild on every save")
+    parser.add_argument('--interval', type=float, default=0.5, help="Seconds between checks in --watch mode")
+    parser.add_argument('--settle', type=float, default=0.3, help="Seconds the master must stay unchanged before a build")
+    parser.add_argument('--rehearsal', action='store_true', help="Skip optimization and compression for fast updates")
+    parser.add_argument('--inkscape', action='store_true', help="Use the Inkscape CLI for the plain SVG export")
+    parser.add_argument('--tiles', action='store_true', help="Also split the score into tiles (score_tiles.py)")
+    parser.add_argument('--tile-width', type=float, default=None, help="Tile width in playhead units")
+    parser.add_argument('--precision', type=int, default=None, help="Decimal places kept by svg_optimize.py")
+    parser.add_argument('--no-compress', action='store_true', help="Do not write .gz / .br copies")
+    parser.add_argument('--work-dir', default=None, help="Build state and intermediates (default: .score_build/ next to the master)")
+    parser.add_argument('--force', action='store_true', help="Run every stage once, changed or not")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    builder = ScoreBuild(args.master, args.published, rehearsal=args.rehearsal, inkscape=args.inkscape,
+                         tiles=args.tiles, tile_width=args.tile_width, precision=args.precision,
+                         compress=not args.no_compress, work_dir=args.work_dir)
+    logging.info(_format_entry(builder.build(force=args.force)))
+    if args.watch:
+        try:
+            watch(builder, args.interval, args.settle)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
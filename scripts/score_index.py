@@ -0,0 +1,375 @@
+# Score ID Linter and Indexer
+#
+# Streams a plain SVG score (public/svg/*.svg) in a single iterparse pass and
+# writes a compact JSON index of every id the client cares about — cues,
+# rehearsal marks, anchors, note-* annotations, rotate/scale/obj2path
+# animations and their paths — with bounding boxes in document units and the
+# parsed parameters.  Every cue and animation id is validated against the
+# mini-syntax in cue_syntax.py, so a malformed cue fails here instead of on
+# stage.
+#
+# Finished elements are discarded as the parse goes and geometry is only kept
+# for ids that end up in the index, so memory stays flat no matter how large
+# the score is.  A second streaming pass runs only when a <use> clone or a
+# traverse target points at an element the first pass did not keep.
+#
+# Usage:
+# python score_index.py <score.svg> [-o index.json] [--strict] [--quiet]
+#
+# The index is written next to the score as <score>.index.json by default.
+# Exit status is 1 if any id is invalid (or, with --strict, if there are any
+# warnings such as legacy snake-case cues that never trigger).
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+try:
+    from lxml import etree
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as etree
+    HAVE_LXML = False
+
+from cue_syntax import analyse_id, id_references
+from svg_geometry import (
+    IDENTITY, NUMBER_RE, element_bbox, href_of, invert, local_name, multiply,
+    parse_transform, text_bbox, text_position, transform_bbox, translate, union, INKSCAPE_NS,
+)
+
+INDEX_VERSION = 1
+PRECISION = 2
+
+# Containers whose children are not drawn in place
+NON_RENDERING = {
+    'defs', 'symbol', 'clipPath', 'mask', 'marker', 'pattern', 'linearGradient',
+    'radialGradient', 'filter', 'metadata', 'namedview', 'title', 'desc', 'style', 'script',
+}
+
+INKSCAPE_GROUPMODE = f'{{{INKSCAPE_NS}}}groupmode'
+INKSCAPE_LABEL = f'{{{INKSCAPE_NS}}}label'
+
+
+def iterparse(source):
+    if HAVE_LXML:
+        return etree.iterparse(source, events=('start', 'end'), huge_tree=True, remove_comments=True)
+    return etree.iterparse(source, events=('start', 'end'))
+
+
+def _round(bbox):
+    return [round(v, PRECISION) for v in bbox] if bbox else None
+
+
+class Frame:
+    """Bookkeeping for one open element during the streaming pass."""
+
+    __slots__ = (
+        'element', 'tag', 'matrix', 'parent_matrix', 'bbox', 'id', 'entry', 'layer', 'hidden', 'text_position',
+        'keep',
+    )
+
+    def __init__(self, element, tag, matrix, parent_matrix, layer, hidden):
+        self.element = element
+        self.tag = tag
+        self.matrix = matrix
+        self.parent_matrix = parent_matrix
+        self.bbox = None
+        self.id = element.get('id')
+        self.entry = None
+        self.layer = layer
+        self.hidden = hidden
+        self.text_position = None
+        self.keep = False
+
+
+class ScoreIndexer:
+    """
+    Streaming indexer. Call run(source) to get the index dict.
+
+    Geometry is only remembered for ids the index needs (indexed ids, <defs>
+    content and ids an earlier <use> asked for), so memory follows the size
+    of the index rather than the size of the score.  References that are
+    still unresolved after the pass (a <use> of an earlier element, a
+    traverse target) are looked up in one more streaming pass.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.errors = []
+        self.warnings = []
+        self.counts = {}
+        self.root_attributes = {}
+        # id → (bbox in root space, parent matrix); used to resolve <use> clones
+        self.geometry = {}
+        # (entry or None, use id, href, matrix, retained ancestor ids)
+        self.pending_uses = []
+        # Retained ids: indexed, inside <defs>, or referenced
+        self.known_ids = set()
+        self.wanted = set()
+        self.registering = True
+        self.elements_seen = 0
+
+    def run(self, source):
+        self._stream(source)
+        missing = self._unresolved_references()
+        if missing:
+            self.registering = False
+            self.wanted = missing
+            self._stream(source)
+        self._resolve_uses()
+        self._check_references()
+        return self.index()
+
+    def _stream(self, source):
+        stack = []
+        for event, element in iterparse(source):
+            if event == 'start':
+                stack.append(self._start(element, stack))
+            else:
+                frame = stack.pop()
+                self._end(frame, stack)
+                # Drop the finished subtree so memory does not grow with the file
+                element.clear()
+                if stack:
+                    stack[-1].element.remove(element)
+
+    # -- streaming events ---------------------------------------------------
+
+    def _start(self, element, stack):
+        tag = local_name(element.tag)
+        if not stack:
+            if self.registering:
+                self.root_attributes = dict(element.attrib)
+            return Frame(element, tag, IDENTITY, IDENTITY, None, False)
+
+        parent = stack[-1]
+        matrix = multiply(parent.matrix, parse_transform(element.get('transform')))
+        layer = parent.layer
+        if tag == 'g' and element.get(INKSCAPE_GROUPMODE) == 'layer':
+            layer = element.get(INKSCAPE_LABEL) or element.get('id')
+        hidden = parent.hidden or tag in NON_RENDERING
+        frame = Frame(element, tag, matrix, parent.matrix, layer, hidden)
+        if tag in ('text', 'tspan'):
+            # Nested tspans without x/y continue at the enclosing text's position
+            frame.text_position = text_position(element.attrib, parent.text_position)
+
+        if not self.registering:
+            frame.keep = frame.id in self.wanted
+            if frame.keep:
+                self.known_ids.add(frame.id)
+            return frame
+
+        self.elements_seen += 1
+        if frame.id or element.get('data-id'):
+            self._register_id(frame, element.get('data-id'))
+        if tag == 'use':
+            x = float((NUMBER_RE.match(element.get('x', '0')) or [0])[0])
+            y = float((NUMBER_RE.match(element.get('y', '0')) or [0])[0])
+            href = (href_of(element.attrib) or '').lstrip('#')
+            if href:
+                ancestors = [f.id for f in stack if f.keep]
+                self.pending_uses.append((frame.entry, frame.id, href, multiply(matrix, translate(x, y)), ancestors))
+                if href not in self.geometry:
+                    self.wanted.add(href)
+        return frame
+
+    def _end(self, frame, stack):
+        element = frame.element
+        if frame.text_position is not None:
+            own = text_bbox(frame.text_position, element.text) if (element.text or '').strip() else None
+        elif frame.tag != 'use':
+            own = element_bbox(frame.tag, element.attrib)
+        else:
+            own = None
+        frame.bbox = union(frame.bbox, transform_bbox(frame.matrix, own))
+
+        if frame.keep:
+            self.geometry[frame.id] = (frame.bbox, frame.parent_matrix)
+        if frame.entry is not None:
+            frame.entry['bbox'] = frame.bbox
+
+        if stack and frame.tag not in NON_RENDERING:
+            parent = stack[-1]
+            parent.bbox = union(parent.bbox, frame.bbox)
+
+    # -- ids ----------------------------------------------------------------
+
+    def _register_id(self, frame, data_id=None):
+        # Triggerable objects keep their cue/animation name in data-id (README,
+        # "Cue Targeting"); the DOM id is still what the client looks up.
+        element_id = frame.id
+        name = data_id or element_id
+        result = analyse_id(name)
+        frame.keep = bool(element_id) and (result is not None or frame.hidden or element_id in self.wanted)
+        if frame.keep:
+            if element_id in self.known_ids:
+                self.errors.append({'id': element_id, 'message': "duplicate id"})
+            self.known_ids.add(element_id)
+        if result is None:
+            return
+
+        kind = result['kind']
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        entry = {'id': element_id, 'kind': kind, 'type': result['type'], 'tag': frame.tag}
+        if data_id:
+            entry['data_id'] = data_id
+        if result.get('params'):
+            entry['params'] = result['params']
+        if frame.layer:
+            entry['layer'] = frame.layer
+        if frame.hidden:
+            entry['defs'] = True
+        if 'suggestion' in result:
+            entry['suggestion'] = result['suggestion']
+        frame.entry = entry
+        self.entries.append(entry)
+
+        source = {'id': element_id or name, 'data_id': data_id} if data_id else {'id': name}
+        if 'error' in result:
+            self.errors.append(dict(source, message=result['error']))
+        if 'warning' in result:
+            warning = dict(source, message=result['warning'])
+            if 'suggestion' in result:
+                warning['suggestion'] = result['suggestion']
+            self.warnings.append(warning)
+
+    # -- post-pass resolution -----------------------------------------------
+
+    def _references(self):
+        """(entry, label, target id) for every id-valued parameter."""
+        for entry in self.entries:
+            for label, target in id_references(entry):
+                if not self._is_mark(target):
+                    yield entry, label, target
+
+    def _unresolved_references(self):
+        missing = {href for _, _, href, _, _ in self.pending_uses if href not in self.geometry}
+        missing.update(target for _, _, target in self._references() if target not in self.known_ids)
+        return missing
+
+    def _local_bbox(self, element_id):
+        """Bbox of a referenced element in its parent's coordinate system."""
+        record = self.geometry.get(element_id)
+        if record is None or record[0] is None:
+            return None
+        bbox, parent_matrix = record
+        inverse = invert(parent_matrix)
+        return transform_bbox(inverse, bbox) if inverse else bbox
+
+    def _resolve_uses(self):
+        """Give <use> clones the bbox of what they reference (document order)."""
+        ancestors_by_id = {}
+        for entry, use_id, href, matrix, ancestors in self.pending_uses:
+            local = self._local_bbox(href)
+            if local is None:
+                if href not in self.known_ids:
+                    self.errors.append({'id': use_id or href, 'message': f"<use> references missing id #{href}"})
+                continue
+            bbox = transform_bbox(matrix, local)
+            if entry is not None:
+                entry['bbox'] = union(entry.get('bbox'), bbox)
+            if use_id:
+                self._grow(use_id, bbox)
+            for ancestor in ancestors:
+                ancestors_by_id.setdefault(ancestor, []).append(bbox)
+
+        if not ancestors_by_id:
+            return
+        for entry in self.entries:
+            for bbox in ancestors_by_id.get(entry['id'], ()):
+                entry['bbox'] = union(entry.get('bbox'), bbox)
+        for element_id, boxes in ancestors_by_id.items():
+            for bbox in boxes:
+                self._grow(element_id, bbox)
+
+    def _grow(self, element_id, bbox):
+        record = self.geometry.get(element_id)
+        if record is not None:
+            self.geometry[element_id] = (union(record[0], bbox), record[1])
+
+    def _check_references(self):
+        """Animation paths, traverse targets and repeat anchors must exist."""
+        for entry, label, target in self._references():
+            if target not in self.known_ids:
+                self.errors.append({'id': entry['id'], 'message': f"{label} #{target} not found"})
+
+    def _is_mark(self, name):
+        # cueRepeat also accepts rehearsal letters (rehearsal_A → "A")
+        return f"rehearsal_{name}" in self.known_ids
+
+    # -- output -------------------------------------------------------------
+
+    def index(self):
+        for entry in self.entries:
+            bbox = entry.pop('bbox', None)
+            if bbox is not None:
+                entry['x'] = round(bbox[0], PRECISION)
+                entry['bbox'] = _round(bbox)
+        entries = sorted(self.entries, key=lambda e: (e.get('x', float('inf')), e['id'] or ''))
+
+        view_box = self.root_attributes.get('viewBox')
+        return {
+            'version': INDEX_VERSION,
+            'viewBox': [float(v) for v in NUMBER_RE.findall(view_box)] if view_box else None,
+            'width': self.root_attributes.get('width'),
+            'height': self.root_attributes.get('height'),
+            'elements_scanned': self.elements_seen,
+            'counts': dict(sorted(self.counts.items())),
+            'elements': entries,
+            'errors': self.errors,
+            'warnings': self.warnings,
+        }
+
+
+def build_index(svg_path):
+    """Index one score. Returns the index dict."""
+    index = ScoreIndexer().run(svg_path)
+    index['source'] = os.path.basename(svg_path)
+    return index
+
+
+def write_index(index, output_path):
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def default_output_path(svg_path):
+    return f"{os.path.splitext(svg_path)[0]}.index.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate cue/animation ids and index a score SVG.")
+    parser.add_argument('svg', help="Plain SVG score")
+    parser.add_argument('-o', '--output', default=None, help="Index path (default: <score>.index.json)")
+    parser.add_argument('--strict', action='store_true', help="Treat warnings as errors")
+    parser.add_argument('--quiet', action='store_true', help="Only print errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format='%(message)s')
+
+    index = build_index(args.svg)
+    output_path = write_index(index, args.output or default_output_path(args.svg))
+
+    for problem in index['errors']:
+        logging.error(f"ERROR   {problem['id']}: {problem['message']}")
+    for problem in index['warnings']:
+        hint = f" → {problem['suggestion']}" if 'suggestion' in problem else ''
+        logging.info(f"warning {problem['id']}: {problem['message']}{hint}")
+
+    counts = ', '.join(f"{count} {kind}" for kind, count in index['counts'].items())
+    logging.info(
+        f"{index['source']}: {index['elements_scanned']} elements, {counts or 'no indexed ids'}; "
+        f"{len(index['errors'])} errors, {len(index['warnings'])} warnings → {output_path}"
+    )
+
+    failed = index['errors'] or (args.strict and index['warnings'])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# Score Tile Splitter
+#
+# Slices a plain SVG score along the x axis into fixed-width tile documents,
+# so a client of a scrolling score only has to parse the one or two tiles
+# around the playhead instead of the whole multi-megabyte file.
+#
+# Every tile keeps the score's coordinate system: only the root viewBox and
+# width change, so tile i drawn at left = i * tileWidth lines up exactly with
+# the original.  An element goes into every tile its bounding box touches;
+# elements crossing a tile edge are simply clipped by each tile's viewBox.
+#
+#   - groups without a cue / animation id are split: each tile gets a
+#     shallow copy holding only the children it needs
+#   - anything carrying a cue / animation id (see cue_syntax.py) is copied
+#     whole, as is any element a <use>, an obj2path animation or a traverse
+#     cue points at; those targets also go into every tile of the element
+#     that references them, so ids resolve inside the tile
+#   - <defs> entries, clip paths, gradients, markers ... are copied into each
+#     tile that references them (directly or through other defs)
+#
+# The manifest lists the tiles and, for every cue / animation id, its kind,
+# playhead x and the tiles holding it, so the client can lazy-load tiles as
+# the playhead moves and jump to any cue.
+#
+# Usage:
+# python score_tiles.py <score.svg> [-o out_dir] [--tile-width 4000] [--compress]
+#
+# Output (default <score>.tiles/):
+#   tile-000.svg, tile-001.svg ...
+#   manifest.json
+#     {"version": 1, "scoreWidth": 60000, "tileWidth": 4000, "scale": 3.78,
+#      "tiles": [{"file": "tile-000.svg", "x": 0, "width": 4000, "bytes": ...}],
+#      "ids": {"cuePause(5)": {"kind": "cue", "type": "cuePause", "x": 812.3, "tiles": [0]}}}
+#   Positions are playhead units (the SVG width attribute, window.scoreWidth).
+
+import argparse
+import copy
+import filecmp
+import glob
+import json
+import logging
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from cue_syntax import analyse_id, id_references
+from cue_timeline import score_scale
+from score_index import build_index
+from svg_geometry import (
+    IDENTITY, NUMBER_RE, SVG_NS, element_bbox, href_of, local_name, multiply,
+    parse_transform, text_bbox, text_position, transform_bbox, translate, union,
+)
+
+TILES_VERSION = 1
+DEFAULT_TILE_WIDTH = 4000  # playhead units
+
+CONTAINERS = {'g', 'a', 'switch'}
+# Referenced resources, copied into each tile's <defs> on demand
+RESOURCES = {'clipPath', 'mask', 'marker', 'pattern', 'symbol', 'linearGradient',
+             'radialGradient', 'filter'}
+# Copied into every tile
+GLOBAL_ELEMENTS = {'style', 'script'}
+SKIPPED_ELEMENTS = {'metadata', 'namedview', 'title', 'desc'}
+
+URL_REF_RE = re.compile(r'url\(\s*[\'"]?#([^)\'"\s]+)')
+
+
+def _references(element):
+    """Ids an element's own attributes point at (url(#..) and href)."""
+    refs = set()
+    for key, value in element.attrib.items():
+        if local_name(key) == 'href' and value.startswith('#'):
+            refs.add(value[1:])
+        elif 'url(' in value:
+            refs.update(URL_REF_RE.findall(value))
+    return refs
+
+
+def _convention(element):
+    """analyse_id result for the element's id or data-id, or None."""
+    for key in ('id', 'data-id'):
+        value = element.get(key)
+        if value:
+            result = analyse_id(value)
+            if result is not None:
+                return result
+    return None
+
+
+def _bits(mask):
+    tiles = []
+    index = 0
+    while mask:
+        if mask & 1:
+            tiles.append(index)
+        mask >>= 1
+        index += 1
+    return tiles
+
+
+class TileSplitter:
+    """Assigns every drawable element of a parsed score to x-axis tiles."""
+
+    def __init__(self, root, tile_width, origin_x, count):
+        self.root = root
+        self.tile_width = tile_width  # document units
+        self.origin_x = origin_x
+        self.count = count
+
+        self.parents = {child: parent for parent in root.iter() for child in parent}
+        self.ids = {}
+        self.resources = {}     # id → top-level resource element
+        self.resource_order = {}
+        for element in root.iter():
+            element_id = element.get('id')
+            if element_id:
+                self.ids.setdefault(element_id, element)
+
+        self.referenced = set()  # rendered elements something points at
+        self.dependencies = []   # (referring element, target element)
+        self.units = {}          # unit element → tile bitmask
+        self.unit_of = {}        # element inside a unit → unit
+        self.containers = {}     # split container → tile bitmask
+        self.local_bboxes = {}
+
+    # -- analysis -----------------------------------------------------------
+
+    def run(self):
+        self._collect_resources(self.root, in_defs=False)
+        self._collect_dependencies()
+        self._assign(self.root, IDENTITY)
+        for referrer, target in self.dependencies:
+            source = self.unit_of.get(referrer)
+            unit = self._unit_containing(target)
+            if source is not None and unit is not None:
+                self.units[unit] |= self.units[source]
+        self._container_mask(self.root)
+        return self
+
+    def _collect_resources(self, element, in_defs):
+        for child in element:
+            tag = local_name(child.tag)
+            if in_defs or tag in RESOURCES:
+                self._add_resource(child)
+            elif tag == 'defs':
+                self._collect_resources(child, in_defs=True)
+            elif tag not in SKIPPED_ELEMENTS:
+                self._collect_resources(child, in_defs=False)
+
+    def _add_resource(self, element):
+        self.resource_order[element] = len(self.resource_order)
+        for inner in element.iter():
+            element_id = inner.get('id')
+            if element_id:
+                self.resources.setdefault(element_id, element)
+
+    def _collect_dependencies(self):
+        for element in self.root.iter():
+            targets = []
+            if local_name(element.tag) == 'use':
+                href = href_of(element.attrib)
+                if href and href.startswith('#'):
+                    targets.append(href[1:])
+            result = _convention(element)
+            if result is not None:
+                targets.extend(target for _, target in id_references(result))
+            for target_id in targets:
+                target = self.ids.get(target_id)
+                if target is not None and target_id not in self.resources:
+                    self.referenced.add(target)
+                    self.dependencies.append((element, target))
+
+    def _is_unit(self, element, tag):
+        return (
+            tag not in CONTAINERS
+            or element in self.referenced
+            or _convention(element) is not None
+        )
+
+    def _assign(self, element, matrix):
+        for child in element:
+            tag = local_name(child.tag)
+            if tag in SKIPPED_ELEMENTS or tag in GLOBAL_ELEMENTS or tag == 'defs' or child in self.resource_order:
+                continue
+            if self._is_unit(child, tag):
+                self.units[child] = self._mask(self._bbox(child, matrix))
+                for inner in child.iter():
+                    self.unit_of[inner] = child
+            else:
+                self._assign(child, multiply(matrix, parse_transform(child.get('transform'))))
+
+    def _unit_containing(self, element):
+        while element is not None and element not in self.units:
+            element = self.parents.get(element)
+        return element
+
+    def _container_mask(self, element):
+        mask = 0
+        for child in element:
+            if child in self.units:
+                mask |= self.units[child]
+            elif local_name(child.tag) in CONTAINERS and child not in self.resource_order:
+                mask |= self._container_mask(child)
+        self.containers[element] = mask
+        return mask
+
+    def _mask(self, bbox):
+        if bbox is None:
+            return 1  # no geometry (e.g. an empty anchor group): first tile
+        first = math.floor((bbox[0] - self.origin_x) / self.tile_width)
+        last = math.floor((bbox[2] - self.origin_x) / self.tile_width)
+        first = min(max(first, 0), self.count - 1)
+        last = min(max(last, 0), self.count - 1)
+        return ((1 << (last - first + 1)) - 1) << first
+
+    # -- geometry -----------------------------------------------------------
+
+    def _bbox(self, element, matrix, text=None):
+        """Bounding box of `element` in document units, given its parent's matrix."""
+        tag = local_name(element.tag)
+        if tag in SKIPPED_ELEMENTS or tag in GLOBAL_ELEMENTS or tag in RESOURCES or tag == 'defs':
+            return None
+        matrix = multiply(matrix, parse_transform(element.get('transform')))
+
+        if tag == 'use':
+            href = href_of(element.attrib) or ''
+            local = self._local_bbox(self.ids.get(href[1:]))
+            offset = translate(_float(element.get('x')), _float(element.get('y')))
+            return transform_bbox(multiply(matrix, offset), local)
+
+        if tag in ('text', 'tspan'):
+            position = text_position(element.attrib, text)
+            bbox = None
+            if element.text and element.text.strip():
+                bbox = transform_bbox(matrix, text_bbox(position, element.text))
+            for child in element:
+                bbox = union(bbox, self._bbox(child, matrix, position))
+            return bbox
+
+        bbox = transform_bbox(matrix, element_bbox(tag, element.attrib))
+        for child in element:
+            bbox = union(bbox, self._bbox(child, matrix))
+        return bbox
+
+    def _local_bbox(self, target):
+        """Bbox of a <use> target in its own coordinates (with its own transform)."""
+        if target is None:
+            return None
+        if target not in self.local_bboxes:
+            self.local_bboxes[target] = None  # guards against reference cycles
+            if local_name(target.tag) == 'symbol':
+                bbox = None
+                for child in target:
+                    bbox = union(bbox, self._bbox(child, IDENTITY))
+            else:
+                bbox = self._bbox(target, IDENTITY)
+            self.local_bboxes[target] = bbox
+        return self.local_bboxes[target]
+
+    # -- tile documents -----------------------------------------------------
+
+    def tile(self, index, view_box, width):
+        """Build the element tree of tile `index`."""
+        root = ET.Element(self.root.tag, dict(self.root.attrib))
+        root.text = '\n'
+        root.set('width', _fmt(width))
+        root.set('viewBox', ' '.join(_fmt(v) for v in view_box))
+
+        defs = ET.SubElement(root, f'{{{SVG_NS}}}defs')
+        defs.tail = '\n'
+        refs = set()
+        copied = set()
+        bit = 1 << index
+        for child in self.root:
+            self._copy(child, bit, root, refs, copied)
+
+        for resource in self._resources_for(refs):
+            # Resources inside a copied unit are already in the tile
+            if self.unit_of.get(resource) not in copied:
+                defs.append(copy.deepcopy(resource))
+        if not len(defs):
+            root.remove(defs)
+        return root
+
+    def _copy(self, element, bit, parent, refs, copied):
+        tag = local_name(element.tag)
+        if tag in GLOBAL_ELEMENTS:
+            parent.append(copy.deepcopy(element))
+        elif element in self.units:
+            if self.units[element] & bit:
+                parent.append(copy.deepcopy(element))
+                copied.add(element)
+                for inner in element.iter():
+                    refs.update(_references(inner))
+        elif self.containers.get(element, 0) & bit and element not in self.resource_order:
+            shallow = ET.SubElement(parent, element.tag, dict(element.attrib))
+            shallow.text = element.text
+            shallow.tail = element.tail
+            refs.update(_references(element))
+            for child in element:
+                self._copy(child, bit, shallow, refs, copied)
+
+    def _resources_for(self, refs):
+        """Resources referenced by a tile, following references between them."""
+        needed = set()
+        pending = list(refs)
+        while pending:
+            resource = self.resources.get(pending.pop())
+            if resource is None or resource in needed:
+                continue
+            needed.add(resource)
+            for inner in resource.iter():
+                pending.extend(_references(inner))
+        return sorted(needed, key=self.resource_order.get)
+
+
+def _float(value):
+    match = NUMBER_RE.match((value or '').strip())
+    return float(match.group(0)) if match else 0.0
+
+
+def _fmt(value):
+    text = f"{value:.4f}".rstrip('0').rstrip('.')
+    return '0' if text in ('-0', '') else text
+
+
+def _register_namespaces(svg_path):
+    """Keep the score's namespace prefixes (and SVG as the default) on output."""
+    for _, (prefix, uri) in ET.iterparse(svg_path, events=('start-ns',)):
+        if prefix and uri != SVG_NS:
+            ET.register_namespace(prefix, uri)
+    ET.register_namespace('', SVG_NS)
+
+
+def _write_tree(root, path):
+    """Write atomically; an identical existing file is left alone. Returns (bytes, changed)."""
+    temp_path = f"{path}.tmp"
+    ET.ElementTree(root).write(temp_path, encoding='utf-8', xml_declaration=True)
+    if os.path.exists(path) and filecmp.cmp(temp_path, path, shallow=False):
+        os.remove(temp_path)
+        return os.path.getsize(path), False
+    os.replace(temp_path, path)
+    return os.path.getsize(path), True
+
+
+def split_score(svg_path, output_dir, tile_width=DEFAULT_TILE_WIDTH, compress=False, index=None):
+    """
+    Write the tiles and manifest.json for one score. Returns the manifest dict.
+    Pass the score's index if it is already built; tiles whose content did not
+    change are not rewritten (their mtime and compressed copies are kept).
+    """
+    if index is None:
+        index = build_index(svg_path)
+    scale, origin_x, score_width = score_scale(index)
+    view_box = index.get('viewBox') or [0.0, 0.0, float(score_width or 0), 0.0]
+    if score_width is None:
+        score_width = view_box[2]
+
+    _register_namespaces(svg_path)
+    root = ET.parse(svg_path).getroot()
+
+    count = max(1, math.ceil(score_width / tile_width))
+    splitter = TileSplitter(root, tile_width / scale, origin_x, count).run()
+
+    os.makedirs(output_dir, exist_ok=True)
+    tiles = []
+    rewritten = 0
+    for i in range(count):
+        x = i * tile_width
+        width = min(tile_width, score_width - x)
+        tile_view_box = (origin_x + x / scale, view_box[1], width / scale, view_box[3])
+        name = f"tile-{i:03d}.svg"
+        path = os.path.join(output_dir, name)
+        size, changed = _write_tree(splitter.tile(i, tile_view_box, width), path)
+        if compress and (changed or not os.path.exists(f"{path}.gz")):
+            from svg_optimize import precompress
+            precompress(path)
+        if changed:
+            rewritten += 1
+        tiles.append({'file': name, 'x': x, 'width': round(width, 2), 'bytes': size})
+
+    # Tiles left over from an earlier run with more tiles
+    written = {tile['file'] for tile in tiles}
+    for stale in glob.glob(os.path.join(output_dir, 'tile-*.svg*')):
+        if os.path.basename(stale).split('.svg')[0] + '.svg' not in written:
+            os.remove(stale)
+
+    ids = {}
+    for key, mask in _convention_masks(splitter):
+        ids[key] = ids.get(key, 0) | mask
+    entries = {}
+    for entry in index['elements']:
+        key = entry['id'] or entry.get('data_id')
+        if entry.get('defs') or key not in ids:
+            continue
+        x = entry.get('x')
+        entries[key] = {
+            'kind': entry['kind'],
+            'type': entry['type'],
+            'x': round((x - origin_x) * scale, 2) if x is not None else None,
+            'tiles': _bits(ids[key]),
+        }
+
+    manifest = {
+        'version': TILES_VERSION,
+        'source': os.path.basename(svg_path),
+        'scoreWidth': score_width,
+        'height': root.get('height'),
+        'scale': round(scale, 6),
+        'tileWidth': tile_width,
+        'viewBox': view_box,
+        'tiles': tiles,
+        'ids': entries,
+    }
+    logging.debug(f"{rewritten} of {count} tiles changed")
+    temp_path = os.path.join(output_dir, 'manifest.json.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(temp_path, os.path.join(output_dir, 'manifest.json'))
+    return manifest
+
+
+def _convention_masks(splitter):
+    """(id, tile mask) for every cue / animation id inside a copied unit."""
+    for unit, mask in splitter.units.items():
+        for element in unit.iter():
+            if _convention(element) is not None:
+                yield element.get('id') or element.get('data-id'), mask
+
+
+def default_output_dir(svg_path):
+    return f"{os.path.splitext(svg_path)[0]}.tiles"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a scrolling score into x-axis tiles for lazy loading.")
+    parser.add_argument('score', help="Plain SVG score (ideally after svg_optimize.py)")
+    parser.add_argument('-o', '--output-dir', default=None, help="Output directory (default: <score>.tiles/)")
+    parser.add_argument('--tile-width', type=float, default=DEFAULT_TILE_WIDTH,
+                        help=f"Tile width in playhead units (default {DEFAULT_TILE_WIDTH})")
+    parser.add_argument('--compress', action='store_true', help="Also write .gz / .br copies of each tile")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    output_dir = args.output_dir or default_output_dir(args.score)
+    manifest = split_score(args.score, output_dir, tile_width=args.tile_width, compress=args.compress)
+    sizes = [tile['bytes'] for tile in manifest['tiles']]
+    logging.info(f"{len(sizes)} tiles of {args.tile_width:g} → {output_dir} "
+                 f"(largest {max(sizes):,} bytes, {len(manifest['ids'])} ids)")
+
+
+if __name__ == "__main__":
+    main()
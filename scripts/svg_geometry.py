@@ -0,0 +1,334 @@
+# SVG Geometry Helpers for the score build tools
+#
+# Affine transforms, path-data scanning and approximate bounding boxes for the
+# plain SVG scores in public/svg/.  Bounding boxes are conservative: curve
+# control points are included, so a box may be slightly larger than the
+# rendered shape but never smaller.  That is what the index, timeline and
+# tiling tools need (x-positions and "does this element touch this tile").
+#
+# Matrices are (a, b, c, d, e, f) tuples as in SVG matrix(); bboxes are
+# (x0, y0, x1, y1) tuples or None for elements without geometry.
+
+import math
+import re
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+INKSCAPE_NS = 'http://www.inkscape.org/namespaces/inkscape'
+SODIPODI_NS = 'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd'
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_COMMAND_RE = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]')
+
+# Number of coordinates consumed per repetition of each path command
+PATH_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+TEXT_WIDTH_FACTOR = 0.6  # rough glyph advance as a fraction of font-size
+DEFAULT_FONT_SIZE = 16.0
+
+
+def local_name(tag):
+    """'{http://www.w3.org/2000/svg}path' → 'path'."""
+    if not isinstance(tag, str):
+        return ''
+    return tag.rsplit('}', 1)[-1]
+
+
+def href_of(attrib):
+    return attrib.get(f'{{{XLINK_NS}}}href') or attrib.get('href')
+
+
+# ---------------------------------------------------------------------------
+# Transforms
+# ---------------------------------------------------------------------------
+
+def multiply(m1, m2):
+    """Compose two matrices: apply m2 first, then m1."""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def invert(matrix):
+    a, b, c, d, e, f = matrix
+    det = a * d - b * c
+    if abs(det) < 1e-12:
+        return None
+    return (d / det, -b / det, -c / det, a / det, (c * f - d * e) / det, (b * e - a * f) / det)
+
+
+def translate(tx, ty=0.0):
+    return (1.0, 0.0, 0.0, 1.0, tx, ty)
+
+
+def parse_transform(text):
+    """Parse an SVG transform attribute into a single matrix."""
+    matrix = IDENTITY
+    if not text:
+        return matrix
+    for name, raw_args in _TRANSFORM_RE.findall(text):
+        args = [float(v) for v in NUMBER_RE.findall(raw_args)]
+        if not args:
+            continue
+        if name == 'matrix' and len(args) == 6:
+            step = tuple(args)
+        elif name == 'translate':
+            step = translate(args[0], args[1] if len(args) > 1 else 0.0)
+        elif name == 'scale':
+            step = (args[0], 0.0, 0.0, args[1] if len(args) > 1 else args[0], 0.0, 0.0)
+        elif name == 'rotate':
+            angle = math.radians(args[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(args) == 3:
+                step = multiply(multiply(translate(args[1], args[2]), step), translate(-args[1], -args[2]))
+        elif name == 'skewX':
+            step = (1.0, 0.0, math.tan(math.radians(args[0])), 1.0, 0.0, 0.0)
+        elif name == 'skewY':
+            step = (1.0, math.tan(math.radians(args[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def apply(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def transform_bbox(matrix, bbox):
+    """Bounding box of `bbox` after `matrix` (exact for the four corners)."""
+    if bbox is None:
+        return None
+    x0, y0, x1, y1 = bbox
+    points = [apply(matrix, x, y) for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))]
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def bbox_of_points(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    if not xs:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+# ---------------------------------------------------------------------------
+# Path data
+# ---------------------------------------------------------------------------
+
+def tokenize_path(d):
+    """
+    Split path data into (command, [numbers]) segments with implicit
+    repetitions expanded, e.g. 'm0 0 10 10' → ('m', [0, 0]), ('l', [10, 10]).
+    Arc flags written without separators ('a1 1 0 011 1') are handled.
+    """
+    segments = []
+    pos = 0
+    length = len(d)
+    command = None
+
+    while pos < length:
+        match = _COMMAND_RE.search(d, pos)
+        end = match.start() if match else length
+        if command is not None:
+            segments.extend(_expand_segment(command, d[pos:end]))
+        if not match:
+            break
+        command = match.group(0)
+        pos = match.end()
+        if command in 'Zz':
+            segments.append((command, []))
+            command = None
+    return segments
+
+
+def _expand_segment(command, text):
+    upper = command.upper()
+    arity = PATH_ARITY[upper]
+    numbers = _arc_numbers(text) if upper == 'A' else [float(v) for v in NUMBER_RE.findall(text)]
+    if arity == 0:
+        return [(command, [])]
+
+    segments = []
+    for i in range(0, len(numbers) - arity + 1, arity):
+        args = numbers[i:i + arity]
+        if segments:
+            # Extra coordinate pairs after a moveto are implicit linetos
+            if command == 'M':
+                command = 'L'
+            elif command == 'm':
+                command = 'l'
+        segments.append((command, args))
+    return segments
+
+
+def _arc_numbers(text):
+    numbers = []
+    pos = 0
+    index = 0
+    while pos < len(text):
+        char = text[pos]
+        if char in ' ,\t\r\n':
+            pos += 1
+            continue
+        if index % 7 in (3, 4) and char in '01':
+            numbers.append(float(char))
+            pos += 1
+        else:
+            match = NUMBER_RE.match(text, pos)
+            if not match:
+                break
+            numbers.append(float(match.group(0)))
+            pos = match.end()
+        index += 1
+    return numbers
+
+
+def path_points(d):
+    """Absolute end and control points of a path (for bounding boxes)."""
+    points = []
+    x = y = 0.0
+    start_x = start_y = 0.0
+
+    for command, args in tokenize_path(d):
+        upper = command.upper()
+        relative = command != upper
+
+        if upper == 'Z':
+            x, y = start_x, start_y
+            continue
+        if upper == 'H':
+            x = x + args[0] if relative else args[0]
+            points.append((x, y))
+            continue
+        if upper == 'V':
+            y = y + args[0] if relative else args[0]
+            points.append((x, y))
+            continue
+        if upper == 'A':
+            rx, ry = abs(args[0]), abs(args[1])
+            end_x = x + args[5] if relative else args[5]
+            end_y = y + args[6] if relative else args[6]
+            # Conservative: the arc stays within its radii of either endpoint
+            for px, py in ((x, y), (end_x, end_y)):
+                points.append((px - rx, py - ry))
+                points.append((px + rx, py + ry))
+            x, y = end_x, end_y
+            continue
+
+        coords = [(args[i], args[i + 1]) for i in range(0, len(args), 2)]
+        if relative:
+            coords = [(x + cx, y + cy) for cx, cy in coords]
+        points.extend(coords)
+        x, y = coords[-1]
+        if upper == 'M':
+            start_x, start_y = x, y
+
+    return points
+
+
+# ---------------------------------------------------------------------------
+# Element bounding boxes
+# ---------------------------------------------------------------------------
+
+def _float(attrib, key, default=0.0):
+    value = attrib.get(key)
+    if value is None:
+        return default
+    match = NUMBER_RE.match(value.strip())
+    return float(match.group(0)) if match else default
+
+
+def _font_size(attrib):
+    size = _float(attrib, 'font-size', 0.0)
+    if size:
+        return size
+    style = attrib.get('style', '')
+    match = re.search(r'font-size\s*:\s*([-+\d.eE]+)', style)
+    return float(match.group(1)) if match else None
+
+
+def text_position(attrib, inherited=None):
+    """
+    (x, y, font_size) of a text or tspan element.  Positions and sizes not
+    set on the element come from `inherited` (the enclosing text's values).
+    """
+    x, y, size = inherited or (0.0, 0.0, None)
+    if 'x' in attrib:
+        x = _float(attrib, 'x')
+    if 'y' in attrib:
+        y = _float(attrib, 'y')
+    own_size = _font_size(attrib)
+    return x, y, own_size or size or DEFAULT_FONT_SIZE
+
+
+def text_bbox(position, text):
+    """Rough box for `text` set at `position` (glyph metrics are not known)."""
+    x, y, size = position
+    width = len((text or '').strip()) * size * TEXT_WIDTH_FACTOR
+    return (x, y - size, x + width, y)
+
+
+def element_bbox(tag, attrib, text=None):
+    """
+    Bounding box of a single element in its own user space (before its own
+    `transform`).  Returns None for containers and non-geometric elements.
+    """
+    if tag == 'path':
+        d = attrib.get('d')
+        return bbox_of_points(path_points(d)) if d else None
+
+    if tag in ('rect', 'image', 'use', 'foreignObject'):
+        x, y = _float(attrib, 'x'), _float(attrib, 'y')
+        width, height = _float(attrib, 'width'), _float(attrib, 'height')
+        if tag == 'use' and not (width or height):
+            return (x, y, x, y)
+        return (x, y, x + width, y + height)
+
+    if tag == 'circle':
+        cx, cy, r = _float(attrib, 'cx'), _float(attrib, 'cy'), _float(attrib, 'r')
+        return (cx - r, cy - r, cx + r, cy + r)
+
+    if tag == 'ellipse':
+        cx, cy = _float(attrib, 'cx'), _float(attrib, 'cy')
+        rx, ry = _float(attrib, 'rx'), _float(attrib, 'ry')
+        return (cx - rx, cy - ry, cx + rx, cy + ry)
+
+    if tag == 'line':
+        return bbox_of_points([
+            (_float(attrib, 'x1'), _float(attrib, 'y1')),
+            (_float(attrib, 'x2'), _float(attrib, 'y2')),
+        ])
+
+    if tag in ('polyline', 'polygon'):
+        values = [float(v) for v in NUMBER_RE.findall(attrib.get('points', ''))]
+        return bbox_of_points(list(zip(values[0::2], values[1::2])))
+
+    if tag in ('text', 'tspan'):
+        if 'x' not in attrib and 'y' not in attrib and not text:
+            return None
+        return text_bbox(text_position(attrib), text)
+
+    return None
@@ -0,0 +1,739 @@
+# SVG Score Optimizer
+#
+# Shrinks a plain SVG score (the output of convert_to_plain_svg.sh) so phones
+# on the performance network load it quickly.  Two streaming (SAX) passes:
+#
+#   1. analysis — which ids are referenced (url(#..), href, cue/animation
+#      parameters), which <defs> entries are reachable, and which path shapes
+#      repeat (noteheads, clefs, accidentals ...)
+#   2. rewrite  — drops inkscape:/sodipodi: attributes and elements, editor
+#      metadata and unused defs; drops unreferenced auto-generated ids
+#      (path1234, g567 ...); rounds coordinates; rewrites path data in compact
+#      relative form; replaces repeated shapes with <use> of a shared glyph
+#
+# Every id matching the cue / animation conventions (see cue_syntax.py) is
+# kept, as is every referenced id, so score_index.py reports the same cues on
+# the optimized file.
+#
+# Shared glyphs are written to <defs class="glyphs"> at the end of the file.
+# app.js turns other <use> elements into rotating clones; it leaves uses of
+# these glyphs alone.  Coordinates are rounded relative to the running rounded
+# position, so errors never accumulate along a path.
+#
+# The output is also written precompressed (.gz, and .br when the brotli
+# module is installed); server.js serves those to browsers that accept them.
+#
+# Usage:
+# python svg_optimize.py <score.svg> [-o out.svg] [--precision 2] [--no-dedupe] [--no-compress] [--json]
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import xml.sax
+from xml.sax.saxutils import escape, quoteattr
+
+from cue_syntax import analyse_id, id_references, kind_of
+from svg_geometry import NUMBER_RE, tokenize_path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_PRECISION = 2
+
+EDITOR_PREFIXES = ('inkscape:', 'sodipodi:')
+EDITOR_ELEMENTS = {'metadata'}
+EDITOR_NAMESPACES = {'xmlns:inkscape', 'xmlns:sodipodi'}
+
+# Character data is kept verbatim inside these
+VERBATIM_ELEMENTS = {'text', 'style', 'script', 'title', 'desc'}
+# Content of these is not rendered in place, so it is never replaced by glyphs
+NON_RENDERED_ELEMENTS = {'defs', 'clipPath', 'mask', 'marker', 'pattern', 'symbol'}
+# <defs> children that matter without being referenced
+LIVE_DEFS = {'style', 'script'}
+
+SHAPE_ELEMENTS = {'path', 'rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon',
+                  'text', 'tspan', 'image', 'use'}
+COORDINATE_ATTRIBUTES = {'x', 'y', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'dx', 'dy', 'points'}
+SIZE_ATTRIBUTES = {'width', 'height', 'r', 'rx', 'ry'}
+TRANSFORM_ATTRIBUTES = {'transform', 'gradientTransform', 'patternTransform'}
+CONTENT_UNITS = ('clipPathUnits', 'maskContentUnits', 'patternContentUnits')
+
+# Ids Inkscape generates on its own (kept only when something references them)
+AUTO_ID_RE = re.compile(
+    r'^(?:path|g|rect|text|tspan|circle|ellipse|line|polyline|polygon|image|'
+    r'clipPath|mask|linearGradient|radialGradient|stop|pattern|filter|fe[A-Za-z]+|'
+    r'marker|defs|svg|layer|namedview|flowRoot|flowRegion|flowPara|symbol|a|switch)'
+    r'\d+(?:-\d+)*$'
+)
+URL_REF_RE = re.compile(r'url\(\s*[\'"]?#([^)\'"\s]+)')
+NUMBER_LIST_RE = re.compile(r'^[\s,]*(?:[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[\s,]*)+$')
+TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+
+GLYPH_PREFIX = 'glyph-'
+MIN_GLYPH_LENGTH = 48  # shorter path data is cheaper inline than as <use>
+
+CATEGORIES = ('editor', 'ids', 'precision', 'defs', 'dedupe', 'formatting')
+
+
+# ---------------------------------------------------------------------------
+# Number and path formatting
+# ---------------------------------------------------------------------------
+
+def _num(value, precision):
+    """Shortest fixed-point text: 0.50 → .5, -0.0 → 0."""
+    text = f"{value:.{precision}f}"
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+
+class _PathText:
+    """Accumulates path data, omitting repeated commands and separators."""
+
+    def __init__(self):
+        self.parts = []
+        self.command = None
+        self.last = None
+
+    def add_command(self, letter):
+        implicit = letter == self.command and letter != 'm' or (self.command == 'm' and letter == 'l')
+        if not implicit:
+            self.parts.append(letter)
+            self.last = None
+        self.command = letter
+
+    def add_number(self, text):
+        if self.last is not None and not (text[0] == '-' or (text[0] == '.' and '.' in self.last)):
+            self.parts.append(' ')
+        self.parts.append(text)
+        self.last = text
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+def compact_path(d, precision, origin=(0.0, 0.0)):
+    """
+    Rewrite path data as relative commands rounded to `precision` decimals,
+    with coordinates taken relative to `origin`.  Each relative step is
+    measured from the previous *rounded* point, so every point stays within
+    half a unit of the last decimal.  Returns None for unparseable data.
+    """
+    segments = tokenize_path(d)
+    if not segments or segments[0][0] not in 'Mm':
+        return None
+
+    scale = 10 ** precision
+    ox, oy = origin
+    out = _PathText()
+
+    def snap(px, py):
+        return round((px - ox) * scale), round((py - oy) * scale)
+
+    def step(delta):
+        out.add_number(_num(delta / scale, precision))
+
+    x = y = start_x = start_y = 0.0     # exact current point / subpath start
+    rx = ry = start_rx = start_ry = 0   # rounded, in units of 1/scale
+
+    for command, args in segments:
+        upper = command.upper()
+        relative = command != upper
+
+        if upper == 'Z':
+            out.add_command('z')
+            x, y, rx, ry = start_x, start_y, start_rx, start_ry
+            continue
+
+        if upper == 'H':
+            x = x + args[0] if relative else args[0]
+            nx = snap(x, y)[0]
+            out.add_command('h')
+            step(nx - rx)
+            rx = nx
+            continue
+
+        if upper == 'V':
+            y = y + args[0] if relative else args[0]
+            ny = snap(x, y)[1]
+            out.add_command('v')
+            step(ny - ry)
+            ry = ny
+            continue
+
+        if upper == 'A':
+            end_x = x + args[5] if relative else args[5]
+            end_y = y + args[6] if relative else args[6]
+            nx, ny = snap(end_x, end_y)
+            out.add_command('a')
+            for value in args[:3]:
+                out.add_number(_num(value, precision))
+            out.add_number('1' if args[3] else '0')
+            out.add_number('1' if args[4] else '0')
+            step(nx - rx)
+            step(ny - ry)
+            x, y, rx, ry = end_x, end_y, nx, ny
+            continue
+
+        points = [(args[i], args[i + 1]) for i in range(0, len(args), 2)]
+        if relative:
+            points = [(x + px, y + py) for px, py in points]
+        snapped = [snap(px, py) for px, py in points]
+        nx, ny = snapped[-1]
+
+        if upper == 'L' and ny == ry and nx != rx:
+            out.add_command('h')
+            step(nx - rx)
+        elif upper == 'L' and nx == rx and ny != ry:
+            out.add_command('v')
+            step(ny - ry)
+        else:
+            out.add_command(command.lower())
+            for px, py in snapped:
+                step(px - rx)
+                step(py - ry)
+
+        x, y = points[-1]
+        rx, ry = nx, ny
+        if upper == 'M':
+            start_x, start_y, start_rx, start_ry = x, y, rx, ry
+
+    return out.text()
+
+
+def glyph_form(d, precision):
+    """(path data relative to its first point, x, y) for shape deduplication."""
+    segments = tokenize_path(d)
+    if not segments or segments[0][0] not in 'Mm':
+        return None
+    x, y = segments[0][1][:2]
+    canonical = compact_path(d, precision, origin=(x, y))
+    return canonical, _num(x, precision), _num(y, precision)
+
+
+def _round_list(value, precision, keep_nonzero=False):
+    if not NUMBER_LIST_RE.match(value):
+        return value  # units, percentages, keywords
+    rounded = []
+    for number in NUMBER_RE.findall(value):
+        text = _num(float(number), precision)
+        if keep_nonzero and text == '0' and float(number) != 0:
+            text = number
+        rounded.append(text)
+    return ' '.join(rounded)
+
+
+def _round_transform(value, precision):
+    if TRANSFORM_RE.sub('', value).strip(' ,\t\n'):
+        return value
+    fine = precision + 4  # scale, rotation and skew factors multiply coordinates
+    functions = []
+    for name, raw_args in TRANSFORM_RE.findall(value):
+        args = [float(v) for v in NUMBER_RE.findall(raw_args)]
+        if name == 'matrix':
+            places = [fine] * 4 + [precision] * 2
+        elif name == 'translate':
+            places = [precision] * len(args)
+        elif name == 'rotate':
+            places = [fine] + [precision] * (len(args) - 1)
+        else:
+            places = [fine] * len(args)
+        functions.append(f"{name}({','.join(_num(v, p) for v, p in zip(args, places))})")
+    return ' '.join(functions)
+
+
+def _size(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _glyph_digest(canonical):
+    return hashlib.blake2b(canonical.encode('ascii'), digest_size=8).digest()
+
+
+# ---------------------------------------------------------------------------
+# Shared SAX plumbing
+# ---------------------------------------------------------------------------
+
+class _Frame:
+    __slots__ = ('tag', 'drop', 'def_key', 'def_entry', 'verbatim', 'exact', 'rendered',
+                 'children', 'attrs', 'glyph')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.drop = None        # byte category of a dropped subtree
+        self.def_key = None     # which <defs> entry this element belongs to
+        self.def_entry = False  # direct child of <defs>
+        self.verbatim = False
+        self.exact = False      # objectBoundingBox content: never rounded
+        self.rendered = True
+        self.children = False
+        self.attrs = None
+        self.glyph = None
+
+
+class _ScoreHandler(xml.sax.handler.ContentHandler):
+    """Element stack shared by the analysis and rewrite passes."""
+
+    def __init__(self, precision, dedupe):
+        super().__init__()
+        self.precision = precision
+        self.dedupe = dedupe
+        self.stack = []
+        self.def_count = 0
+
+    def startElement(self, name, attrs):
+        attrs = dict(attrs.items())
+        parent = self.stack[-1] if self.stack else None
+        frame = _Frame(name)
+
+        if parent is not None:
+            parent.children = True
+            frame.drop = parent.drop
+            frame.def_key = parent.def_key
+            frame.verbatim = parent.verbatim
+            frame.exact = parent.exact
+            frame.rendered = parent.rendered
+        if frame.drop is None and (name.startswith(EDITOR_PREFIXES) or name in EDITOR_ELEMENTS):
+            frame.drop = 'editor'
+        if frame.drop is None and parent is not None and parent.tag == 'defs':
+            frame.def_key = self.def_count
+            frame.def_entry = True
+            self.def_count += 1
+        frame.verbatim = frame.verbatim or name in VERBATIM_ELEMENTS
+        frame.exact = frame.exact or any(attrs.get(key) == 'objectBoundingBox' for key in CONTENT_UNITS)
+        frame.rendered = frame.rendered and name not in NON_RENDERED_ELEMENTS
+
+        if self.dedupe and name == 'path' and frame.drop is None and self._glyph_context(frame, attrs):
+            form = glyph_form(attrs['d'], self.precision)
+            if form and len(form[0]) >= MIN_GLYPH_LENGTH:
+                frame.glyph = (_glyph_digest(form[0]),) + form
+
+        self.stack.append(frame)
+        self.start(frame, attrs, parent)
+
+    def endElement(self, name):
+        frame = self.stack.pop()
+        self.end(frame)
+
+    @staticmethod
+    def _glyph_context(frame, attrs):
+        # vector-effect is not inherited, so it would not reach the glyph through <use>
+        return (frame.rendered and not frame.exact and bool(attrs.get('d')) and 'data-id' not in attrs
+                and 'vector-effect' not in attrs and 'vector-effect' not in attrs.get('style', ''))
+
+    def start(self, frame, attrs, parent):
+        raise NotImplementedError
+
+    def end(self, frame):
+        raise NotImplementedError
+
+
+# ---------------------------------------------------------------------------
+# Pass 1: references, reachable defs, repeated shapes
+# ---------------------------------------------------------------------------
+
+class _Analysis(_ScoreHandler):
+
+    def __init__(self, precision, dedupe):
+        super().__init__(precision, dedupe)
+        self.referenced = set()
+        self.root_refs = set()
+        self.def_refs = {}          # def key → ids it references
+        self.def_ids = {}           # id → def key
+        self.live_defs = set()      # entries holding convention ids
+        self.used_prefixes = set()
+        self.glyph_counts = {}
+        self.glyph_maybe = []       # (digest, id): counts if the id turns out unreferenced
+        self.glyph_ids = set()      # existing ids that look like ours
+
+    def start(self, frame, attrs, parent):
+        if frame.drop:
+            return
+        if ':' in frame.tag:
+            self.used_prefixes.add(frame.tag.split(':', 1)[0])
+
+        refs = set()
+        for key, value in attrs.items():
+            if ':' in key and not key.startswith('xmlns'):
+                self.used_prefixes.add(key.split(':', 1)[0])
+            if key.startswith(EDITOR_PREFIXES):
+                continue
+            if key in ('href', 'xlink:href') and value.startswith('#'):
+                refs.add(value[1:])
+            elif 'url(' in value:
+                refs.update(URL_REF_RE.findall(value))
+
+        convention = False
+        for key in ('id', 'data-id'):
+            value = attrs.get(key)
+            if not value:
+                continue
+            result = analyse_id(value)
+            if result is not None:
+                convention = True
+                refs.update(target for _, target in id_references(result))
+        element_id = attrs.get('id')
+        if element_id:
+            if frame.def_key is not None:
+                self.def_ids[element_id] = frame.def_key
+            if element_id.startswith(GLYPH_PREFIX):
+                self.glyph_ids.add(element_id)
+        if convention and frame.def_key is not None:
+            self.live_defs.add(frame.def_key)
+        if frame.def_key is not None and frame.def_entry and frame.tag in LIVE_DEFS:
+            self.live_defs.add(frame.def_key)
+        self._add_refs(frame, refs)
+
+        if frame.glyph and element_id and (kind_of(element_id) or not AUTO_ID_RE.match(element_id)):
+            frame.glyph = None
+        elif frame.glyph and element_id:
+            self.glyph_maybe.append((frame.glyph[0], element_id))
+            frame.glyph = None
+
+    def _add_refs(self, frame, refs):
+        if not refs:
+            return
+        self.referenced.update(refs)
+        if frame.def_key is None:
+            self.root_refs.update(refs)
+        else:
+            self.def_refs.setdefault(frame.def_key, set()).update(refs)
+
+    def characters(self, content):
+        frame = self.stack[-1] if self.stack else None
+        if frame is not None and not frame.drop and frame.tag == 'style' and 'url(' in content:
+            self._add_refs(frame, set(URL_REF_RE.findall(content)))
+
+    def end(self, frame):
+        if frame.glyph and not frame.children:
+            digest = frame.glyph[0]
+            self.glyph_counts[digest] = self.glyph_counts.get(digest, 0) + 1
+
+    def finish(self):
+        """Resolve deferred decisions once the whole file has been seen."""
+        for digest, element_id in self.glyph_maybe:
+            if element_id not in self.referenced:
+                self.glyph_counts[digest] = self.glyph_counts.get(digest, 0) + 1
+        self.glyph_maybe = []
+        self.glyph_counts = {digest: n for digest, n in self.glyph_counts.items() if n > 1}
+
+        # Defs reachable from the drawing, following references between defs
+        pending = [self.def_ids[i] for i in self.root_refs if i in self.def_ids]
+        pending.extend(self.live_defs)
+        live = set()
+        while pending:
+            key = pending.pop()
+            if key in live:
+                continue
+            live.add(key)
+            for target in self.def_refs.get(key, ()):
+                if target in self.def_ids:
+                    pending.append(self.def_ids[target])
+        self.live_defs = live
+
+
+# ---------------------------------------------------------------------------
+# Pass 2: rewrite
+# ---------------------------------------------------------------------------
+
+class _Rewriter(_ScoreHandler):
+
+    def __init__(self, out, analysis, precision, dedupe):
+        super().__init__(precision, dedupe)
+        self.out = out
+        self.analysis = analysis
+        self.saved = dict.fromkeys(CATEGORIES, 0)
+        self.pending = None
+        self.glyphs = {}        # digest → glyph id
+        self.glyph_defs = []    # (glyph id, path data)
+        self.glyph_uses = 0
+
+    # -- SAX events ---------------------------------------------------------
+
+    def start(self, frame, attrs, parent):
+        if frame.drop is None and frame.def_entry and frame.def_key not in self.analysis.live_defs:
+            frame.drop = 'defs'
+        if frame.drop:
+            self.saved[frame.drop] += _size(self._tag(frame.tag, attrs, '>'))
+            return
+
+        self._flush()
+        if parent is None:
+            self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            self.out.write(self._tag(frame.tag, self._clean_root(attrs), '>'))
+            return
+        frame.attrs = self._clean(frame, attrs)
+        self.pending = frame
+
+    def end(self, frame):
+        if frame.drop:
+            self.saved[frame.drop] += _size(f"</{frame.tag}>")
+            return
+        if len(self.stack) == 0:
+            self._flush()
+            self._write_glyphs()
+            self.out.write(f"</{frame.tag}>\n")
+            return
+        if self.pending is frame:
+            self.pending = None
+            self.out.write(self._closed(frame))
+        else:
+            self.out.write(f"</{frame.tag}>")
+
+    def characters(self, content):
+        frame = self.stack[-1] if self.stack else None
+        if frame is None:
+            return
+        if frame.drop:
+            self.saved[frame.drop] += _size(escape(content))
+            return
+        if frame.verbatim or content.strip():
+            self._flush()
+            self.out.write(escape(content))
+
+    # -- attributes ---------------------------------------------------------
+
+    def _clean_root(self, attrs):
+        cleaned = {}
+        for key, value in attrs.items():
+            prefix = key.split(':', 1)[1] if key.startswith('xmlns:') else None
+            if (key.startswith(EDITOR_PREFIXES) or key in EDITOR_NAMESPACES
+                    or (prefix and prefix not in self.analysis.used_prefixes)):
+                self.saved['editor'] += _size(f" {key}={quoteattr(value)}")
+            elif key == 'id' and self._droppable_id(value, attrs):
+                self.saved['ids'] += _size(f" {key}={quoteattr(value)}")
+            else:
+                cleaned[key] = value
+        return cleaned
+
+    def _clean(self, frame, attrs):
+        precision = self.precision
+        shape = frame.tag in SHAPE_ELEMENTS and not frame.exact
+        cleaned = {}
+        for key, value in attrs.items():
+            if key.startswith(EDITOR_PREFIXES):
+                self.saved['editor'] += _size(f" {key}={quoteattr(value)}")
+                continue
+            if key == 'id' and self._droppable_id(value, attrs):
+                self.saved['ids'] += _size(f" {key}={quoteattr(value)}")
+                continue
+
+            new_value = value
+            if key == 'style':
+                new_value = ';'.join(
+                    prop for prop in value.split(';')
+                    if prop.strip() and not prop.strip().startswith('-inkscape-')
+                )
+                self.saved['editor'] += _size(value) - _size(new_value)
+                if not new_value:
+                    self.saved['editor'] += _size(' style=""')
+                    continue
+                value = new_value
+            elif key == 'd' and frame.tag == 'path' and not frame.exact:
+                new_value = compact_path(value, precision) or value
+            elif shape and key in COORDINATE_ATTRIBUTES:
+                new_value = _round_list(value, precision)
+            elif shape and key in SIZE_ATTRIBUTES:
+                new_value = _round_list(value, precision, keep_nonzero=True)
+            elif key in TRANSFORM_ATTRIBUTES and not frame.exact:
+                new_value = _round_transform(value, precision)
+            self.saved['precision'] += _size(value) - _size(new_value)
+            cleaned[key] = new_value
+        return cleaned
+
+    def _droppable_id(self, element_id, attrs):
+        return (
+            element_id not in self.analysis.referenced
+            and kind_of(element_id) is None
+            and AUTO_ID_RE.match(element_id) is not None
+            and 'data-id' not in attrs
+        )
+
+    # -- output -------------------------------------------------------------
+
+    @staticmethod
+    def _tag(tag, attrs, close):
+        rendered = ''.join(f" {key}={quoteattr(value)}" for key, value in attrs.items())
+        return f"<{tag}{rendered}{close}"
+
+    def _flush(self):
+        if self.pending is not None:
+            self.out.write(self._tag(self.pending.tag, self.pending.attrs, '>'))
+            self.pending = None
+
+    def _closed(self, frame):
+        """Self-closing element, or a <use> of a shared glyph."""
+        text = self._tag(frame.tag, frame.attrs, '/>')
+        glyph = frame.glyph
+        if glyph is None or 'id' in frame.attrs or glyph[0] not in self.analysis.glyph_counts:
+            return text
+
+        digest, canonical, x, y = glyph
+        glyph_id = self.glyphs.get(digest)
+        if glyph_id is None:
+            glyph_id = self._new_glyph_id(digest)
+            self.glyphs[digest] = glyph_id
+            self.glyph_defs.append((glyph_id, canonical))
+        use_attrs = {'href': f"#{glyph_id}"}
+        if x != '0':
+            use_attrs['x'] = x
+        if y != '0':
+            use_attrs['y'] = y
+        use_attrs.update((key, value) for key, value in frame.attrs.items() if key != 'd')
+        use = self._tag('use', use_attrs, '/>')
+        self.saved['dedupe'] += _size(text) - _size(use)
+        self.glyph_uses += 1
+        return use
+
+    def _new_glyph_id(self, digest):
+        # Content-derived, so identical shapes share an id across scores
+        base = GLYPH_PREFIX + digest.hex()[:10]
+        glyph_id, n = base, 0
+        while glyph_id in self.analysis.glyph_ids or glyph_id in self.glyphs.values():
+            n += 1
+            glyph_id = f"{base}-{n}"
+        return glyph_id
+
+    def _write_glyphs(self):
+        if not self.glyph_defs:
+            return
+        block = '<defs class="glyphs">' + ''.join(
+            f'<path id="{glyph_id}" d="{d}"/>' for glyph_id, d in self.glyph_defs
+        ) + '</defs>'
+        self.saved['dedupe'] -= _size(block)
+        self.out.write(block)
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def _parse(path, handler):
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, False)
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setContentHandler(handler)
+    parser.parse(path)
+
+
+def _write_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+
+def precompress(path):
+    """Write <path>.gz (and <path>.br if brotli is installed). Returns {encoding: bytes}."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    sizes = {}
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    _write_atomic(f"{path}.gz", compressed)
+    sizes['gzip'] = len(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        _write_atomic(f"{path}.br", compressed)
+        sizes['br'] = len(compressed)
+    else:
+        logging.debug("brotli not installed, skipping .br")
+    return sizes
+
+
+def optimize_svg(input_path, output_path, precision=DEFAULT_PRECISION, dedupe=True, compress=True):
+    """
+    Optimize `input_path` into `output_path` (may be the same file).
+    Returns a report: sizes, bytes saved per category, glyph counts.
+    """
+    analysis = _Analysis(precision, dedupe)
+    _parse(input_path, analysis)
+    analysis.finish()
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as out:
+        rewriter = _Rewriter(out, analysis, precision, dedupe)
+        _parse(input_path, rewriter)
+    input_size = os.path.getsize(input_path)
+    os.replace(temp_path, output_path)
+    output_size = os.path.getsize(output_path)
+
+    saved = rewriter.saved
+    # Whatever the measured steps don't explain: indentation, comments, quoting
+    saved['formatting'] = input_size - output_size - sum(v for k, v in saved.items() if k != 'formatting')
+
+    report = {
+        'source': os.path.basename(input_path),
+        'input_bytes': input_size,
+        'output_bytes': output_size,
+        'saved': saved,
+        'glyphs': len(rewriter.glyph_defs),
+        'glyph_uses': rewriter.glyph_uses,
+        'precision': precision,
+    }
+    if compress:
+        report['compressed_bytes'] = precompress(output_path)
+    return report
+
+
+def default_output_path(path):
+    base, ext = os.path.splitext(path)
+    return f"{base}.min{ext or '.svg'}"
+
+
+def _log_report(report, output_path):
+    input_size = report['input_bytes']
+
+    def share(n):
+        return f"{100.0 * n / input_size:5.1f}%" if input_size else '  -'
+
+    logging.info(f"{report['source']}: {input_size:,} → {report['output_bytes']:,} bytes "
+                 f"({share(input_size - report['output_bytes']).strip()} smaller) → {output_path}")
+    for category in CATEGORIES:
+        logging.info(f"  {category:<11} {report['saved'][category]:>12,}  {share(report['saved'][category])}")
+    if report['glyphs']:
+        logging.info(f"  {report['glyph_uses']} shapes now use {report['glyphs']} shared glyphs")
+    for encoding, size in report.get('compressed_bytes', {}).items():
+        logging.info(f"  {encoding:<11} {size:>12,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink a plain SVG score for fast client load.")
+    parser.add_argument('score', help="Plain SVG score (output of convert_to_plain_svg.sh)")
+    parser.add_argument('-o', '--output', default=None, help="Output path (default: <score>.min.svg)")
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION,
+                        help=f"Decimal places kept in coordinates (default {DEFAULT_PRECISION})")
+    parser.add_argument('--no-dedupe', action='store_true', help="Do not replace repeated shapes with <use>")
+    parser.add_argument('--no-compress', action='store_true', help="Skip the .gz / .br copies")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    output_path = args.output or default_output_path(args.score)
+    report = optimize_svg(
+        args.score, output_path,
+        precision=args.precision,
+        dedupe=not args.no_dedupe,
+        compress=not args.no_compress,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _log_report(report, output_path)
+
+
+if __name__ == "__main__":
+    main()
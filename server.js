@@ -69,12 +69,38 @@ app.get('/config', (req, res) => {
 // Server Launch 
 // ---------------------------------------------
 
+const fs = require('fs');
+const path = require('path');
+
+// Precompressed scores written by scripts/svg_optimize.py (score.svg.br / score.svg.gz),
+// used only while they are at least as new as the .svg itself
+const publicDir = path.join(__dirname, 'public');
+app.get(/\.svg$/, (req, res, next) => {
+  let file;
+  try {
+    file = path.join(publicDir, decodeURIComponent(req.path));
+  } catch (err) {
+    return next(); // malformed %-escape: leave it to express.static
+  }
+  if (!file.startsWith(publicDir + path.sep)) return next();
+  const accepted = req.headers['accept-encoding'] || '';
+  for (const [encoding, ext] of [['br', '.br'], ['gzip', '.gz']]) {
+    if (!accepted.includes(encoding)) continue;
+    try {
+      if (fs.statSync(file + ext).mtimeMs < fs.statSync(file).mtimeMs) continue;
+    } catch (err) {
+      continue;
+    }
+    res.set({ 'Content-Encoding': encoding, 'Content-Type': 'image/svg+xml', 'Vary': 'Accept-Encoding' });
+    return res.sendFile(file + ext);
+  }
+  next();
+});
 
 app.use(express.static('public'));
 // app.use(express.static('dist'));
 
 // serve the docs ////////////////////////
-const path = require('path');
 app.use('/webdocs', express.static(path.join(__dirname, 'webdocs/site')));
 
 const server = app.listen(port, () => {
@@ -269,6 +295,132 @@ let repeatStateMap = {}; // cueId → { currentCount, count, active, ... }
 // ✅ Declare a set to track triggered cues
 let triggeredCues = new Set();
 
+// ---------------------------------------------
+// Generator Service Client (ly/genserver.py)
+// ---------------------------------------------
+
+// Unix socket path or TCP port of a running genserver.py, e.g. --generator=ly/o/genserver.sock
+const net = require('net');
+const generatorAddress = argv['generator'] || process.env.GENERATOR_SOCKET || null;
+const GENERATOR_TIMEOUT_MS = 120000;
+
+let generatorSocket = null;
+let generatorBuffer = '';
+let generatorNextId = 1;
+const generatorPending = new Map(); // request id → { resolve, reject, timer }
+
+function connectGenerator() {
+  const target = /^\d+$/.test(String(generatorAddress))
+    ? { port: Number(generatorAddress), host: '127.0.0.1' }
+    : { path: generatorAddress };
+  const socket = net.createConnection(target);
+  socket.setEncoding('utf8');
+
+  socket.on('data', (chunk) => {
+    generatorBuffer += chunk;
+    let newline;
+    while ((newline = generatorBuffer.indexOf('\n')) >= 0) {
+      const line = generatorBuffer.slice(0, newline);
+      generatorBuffer = generatorBuffer.slice(newline + 1);
+      if (!line.trim()) continue;
+      let reply;
+      try {
+        reply = JSON.parse(line);
+      } catch (err) {
+        console.warn('[GENERATOR] Unparseable reply ignored.');
+        continue;
+      }
+      const pending = generatorPending.get(reply.id);
+      if (!pending) continue;
+      generatorPending.delete(reply.id);
+      clearTimeout(pending.timer);
+      pending.resolve(reply);
+    }
+  });
+
+  const fail = (err) => {
+    if (generatorSocket === socket) generatorSocket = null;
+    generatorBuffer = '';
+    for (const [id, pending] of generatorPending) {
+      clearTimeout(pending.timer);
+      pending.reject(err || new Error('generator connection closed'));
+      generatorPending.delete(id);
+    }
+  };
+  socket.on('error', (err) => {
+    console.warn(`[GENERATOR] ${err.message}`);
+    fail(err);
+  });
+  socket.on('close', () => fail());
+  return socket;
+}
+
+// Sends one request to genserver.py; resolves with its JSON reply
+function requestGenerator(request) {
+  if (!generatorAddress) {
+    return Promise.reject(new Error('no generator configured (start with --generator=<socket|port>)'));
+  }
+  if (!generatorSocket) generatorSocket = connectGenerator();
+  const id = generatorNextId++;
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      generatorPending.delete(id);
+      reject(new Error('generator request timed out'));
+    }, GENERATOR_TIMEOUT_MS);
+    generatorPending.set(id, { resolve, reject, timer });
+    generatorSocket.write(JSON.stringify({ ...request, id }) + '\n');
+  });
+}
+
+// ---------------------------------------------
+// Live Generated Staves (cueGenerate, OSC /generate/next)
+// ---------------------------------------------
+
+// Every client passing a cueGenerate cue asks for it; only the first request per cue goes through
+const GENERATE_DEDUPE_MS = 2000;
+const recentGenerateCues = new Map(); // cueId → timestamp
+
+// Asks genserver.py for the next variant of `stream` and broadcasts the fragment to every client
+function requestNextVariant(stream, params, source) {
+  const startedAt = Date.now();
+  const request = { op: 'next', stream, inline: true };
+  if (params) request.params = params;
+
+  requestGenerator(request)
+    .then((reply) => {
+      if (!reply.ok) {
+        console.warn(`[GENERATOR] next '${stream}' failed: ${reply.error}`);
+        return;
+      }
+      const message = JSON.stringify({
+        type: 'generated_staff',
+        stream: reply.stream,
+        index: reply.index,
+        name: reply.name,
+        staves: reply.staves,
+        row: reply.row,
+        svg: reply.svg
+      });
+      wss.clients.forEach((client) => {
+        if (client.readyState === WebSocket.OPEN) {
+          client.send(message);
+        }
+      });
+      console.log(`[GENERATOR] ${reply.name} (${source}) sent in ${Date.now() - startedAt} ms${reply.ready ? ' [prefetched]' : ''}`);
+    })
+    .catch((err) => console.warn(`[GENERATOR] ${err.message}`));
+}
+
+// OSC: /generate/next [stream]  and  /generate/close [stream]
+oscPort.on("message", (oscMsg) => {
+  const stream = oscMsg.args && oscMsg.args.length ? String(oscMsg.args[0]) : 'default';
+  if (oscMsg.address === '/generate/next') {
+    requestNextVariant(stream, null, 'osc');
+  } else if (oscMsg.address === '/generate/close') {
+    requestGenerator({ op: 'close', stream }).catch((err) => console.warn(`[GENERATOR] ${err.message}`));
+  }
+});
+
 wss.on('connection', (ws, req) => {
   const clientName = generateRandomName();
   clientNames.set(ws, clientName);
@@ -399,6 +551,45 @@ case "osc_rotate":
         break;
 
 
+      /**
+       * 🎼 Asks ly/genserver.py for new material.
+       * - data.params uses the noteheads.py / batch.py job vocabulary
+       * - the reply (inline SVG by default) goes back to the requesting client only
+       */
+      case "generate_fragment": {
+        const requestId = data.requestId || null;
+        requestGenerator({ op: 'generate', params: data.params || {}, inline: data.inline !== false })
+          .then((reply) => {
+            const { id, ...result } = reply;
+            if (ws.readyState === WebSocket.OPEN) {
+              ws.send(JSON.stringify({ type: 'generated_fragment', requestId, ...result }));
+            }
+          })
+          .catch((err) => {
+            console.warn(`[GENERATOR] ${err.message}`);
+            if (ws.readyState === WebSocket.OPEN) {
+              ws.send(JSON.stringify({ type: 'generated_fragment', requestId, ok: false, error: err.message }));
+            }
+          });
+        break;
+      }
+
+      /**
+       * 🎼 A client reached a cueGenerate cue: request the next live variant.
+       * - repeated requests for the same cue within GENERATE_DEDUPE_MS are dropped
+       * - the result is broadcast to all clients as `generated_staff`
+       */
+      case "generate_next": {
+        const cueKey = data.cueId || `stream:${data.stream}`;
+        const now = Date.now();
+        if (data.cueId && now - (recentGenerateCues.get(cueKey) || 0) < GENERATE_DEDUPE_MS) {
+          break;
+        }
+        recentGenerateCues.set(cueKey, now);
+        requestNextVariant(String(data.stream || 'default'), data.params, data.cueId || 'client');
+        break;
+      }
+
       case "get_repeat_state":
         ws.send(JSON.stringify({
           type: "repeat_state_map",